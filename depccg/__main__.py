@@ -1,20 +1,28 @@
 import sys
 import logging
+from collections import Counter
 
 import depccg.parsing
-from depccg.types import Token
+from depccg.types import Token, ParseStatus
 from depccg.cat import Category
 from depccg.printer import print_
 from depccg.instance_models import load_model
 from depccg.argparse import parse_args
 from depccg.lang import set_global_language_to
+from depccg.utils import read_partial_tree
 from depccg.annotator import (
     english_annotator, japanese_annotator, annotate_XX
 )
 from depccg.allennlp.utils import read_params
+from depccg.pipeline import Deduplicator, read_chunks, run_pipeline
 
 logger = logging.getLogger(__name__)
 
+# formats in which the outputs for chunks can be concatenated
+_streamable_formats = [
+    'auto', 'auto_extended', 'conll', 'deriv', 'ja', 'ptb', 'ccg2lambda'
+]
+
 
 def get_annotator(args):
     if args.lang == 'en':
@@ -78,74 +86,221 @@ def main(args):
         use_beta=not args.disable_beta,
         max_length=args.max_length,
         max_step=args.max_step,
+        max_agenda_size=args.max_agenda_size,
+        timeout=args.timeout,
+        span_beam=args.span_beam,
+        fallback=args.fallback,
+        heuristic=args.heuristic,
         processes=args.num_processes,
+        num_threads=args.num_threads,
+        native_grammar=args.native_grammar,
+        combinator_cache=args.combinator_cache,
     )
 
-    if args.input is not None:
-        input_type = open(args.input)
-    elif not sys.stdin.isatty():
-        input_type = sys.stdin
-    else:
-        # reading from keyboard
-        input_type = None
-        sys.stdout.flush()
-        sys.stderr.flush()
-        logging.getLogger().setLevel(logging.CRITICAL)
-
     categories = None
-    while True:
-        fin = [
-            line for line in map(str.strip, input_type or [input()])
-            if len(line) > 0
-        ]
-        if len(fin) == 0:
-            break
+    category_filter = None
+    pool = None
+    stats_file = None
+    progress = None if args.silent else depccg.parsing.ProgressBar(desc='parsing')
+    num_read = 0
+    if args.stats_output is not None:
+        stats_file = open(args.stats_output, 'w')
+    deduplicator = None
+    if args.dedup:
+        # the results depend on the input format only through the tokens
+        deduplicator = Deduplicator(
+            config=(
+                args.lang,
+                args.model,
+                args.root_cats,
+                args.disable_seen_rules,
+                args.disable_category_dictionary,
+                tuple(sorted(kwargs.items())),
+            ),
+            cache_size=args.result_cache_size,
+        )
 
+    def annotate(fin):
         if args.input_format == 'POSandNERtagged':
-            doc = [
+            return [
                 [
                     Token.of_piped(token)
                     for token in sent.split(' ')
                 ] for sent in fin
-            ]
+            ], None
 
-        else:
-            doc = annotator_fun(
-                [
-                    [word for word in sentence.split(' ')]
-                    for sentence in fin
-                    if len(sentence) > 0
-                ],
-                tokenize=args.tokenize,
+        if args.input_format == 'partial':
+            # the spans are given in the indices of the words as they are
+            words, constraints = zip(
+                *(read_partial_tree(sentence) for sentence in fin if len(sentence) > 0)
             )
+            return annotator_fun(list(words), tokenize=False), list(constraints)
+
+        return annotator_fun(
+            [
+                [word for word in sentence.split(' ')]
+                for sentence in fin
+                if len(sentence) > 0
+            ],
+            tokenize=args.tokenize,
+        ), None
+
+    def dedup(inputs):
+        doc, constraints = inputs
+        if deduplicator is None:
+            return doc, constraints, None
+        plan = deduplicator.split(doc, constraints)
+        if len(plan.indices) < len(doc):
+            logger.info(
+                f'{len(doc) - len(plan.indices)} of {len(doc)} sentences are duplicates'
+            )
+        return (
+            [doc[index] for index in plan.indices],
+            None if constraints is None else [constraints[index] for index in plan.indices],
+            plan,
+        )
 
+    def init_categories(categories_):
+        nonlocal categories, category_filter
+        categories = [
+            Category.parse(category) for category in categories_
+        ]
+        if category_dict is not None:
+            category_filter = depccg.parsing.CategoryFilter(
+                categories, category_dict
+            )
+
+    def supertag(inputs):
+        doc, constraints, plan = inputs
+        if len(doc) == 0:
+            return doc, [], constraints, plan
         logger.info("supertagging")
         score_result, categories_ = supertagger.predict_doc(
             [[token.word for token in sentence] for sentence in doc]
         )
         if categories is None:
-            categories = [
-                Category.parse(category) for category in categories_
-            ]
+            init_categories(categories_)
 
-        if category_dict is not None:
+        if category_filter is not None:
             doc, score_result = depccg.parsing.apply_category_filters(
                 doc,
                 score_result,
                 categories,
-                category_dict,
+                category_filter,
             )
+        return doc, score_result, constraints, plan
 
+    def parse(inputs):
+        nonlocal num_read
+        doc, score_result, constraints, plan = inputs
+        first_index = num_read + 1
+        num_read += len(doc) if plan is None else len(plan.keys)
+        if len(doc) == 0:
+            return [] if plan is None else deduplicator.merge(plan, [])
         logger.info("parsing")
-        results = depccg.parsing.run(
+        results, statuses, *stats = depccg.parsing.run(
             doc,
             score_result,
             categories,
             root_categories,
             apply_binary_rules,
             apply_unary_rules,
+            pool=pool,
+            return_status=True,
+            constraints=constraints,
+            return_stats=stats_file is not None,
+            progress=progress,
             **kwargs,
         )
+        if stats_file is not None:
+            # indexed by the IDs of the sentences in the output
+            depccg.parsing.write_stats(
+                stats_file,
+                stats[0],
+                doc,
+                start_index=first_index,
+                indices=None if plan is None else plan.indices,
+            )
+            stats_file.flush()
+        failures = Counter(
+            status.name for status in statuses if status != ParseStatus.SUCCESS
+        )
+        if len(failures) > 0:
+            logger.info(
+                f'failed to parse {sum(failures.values())} sentences: {dict(failures)}'
+            )
+        if plan is not None:
+            results = deduplicator.merge(plan, results)
+        return results
+
+    def log_dedup_stats():
+        if deduplicator is not None:
+            logger.info(f'deduplication: {deduplicator.stats}')
+
+    if args.input is not None:
+        input_type = open(args.input)
+    elif not sys.stdin.isatty():
+        input_type = sys.stdin
+    else:
+        # reading from keyboard
+        input_type = None
+        sys.stdout.flush()
+        sys.stderr.flush()
+        logging.getLogger().setLevel(logging.CRITICAL)
+
+    if args.stream and input_type is not None:
+        if args.format not in _streamable_formats:
+            raise RuntimeError(
+                f'"{args.format}" output format is not supported in --stream mode'
+            )
+
+        # the category set is fixed by the model; the workers (and their caches)
+        # are started here, not in a pipeline thread, and kept alive across chunks
+        init_categories(supertagger.cats)
+        pool = depccg.parsing.ParserPool(
+            categories,
+            root_categories,
+            apply_binary_rules,
+            apply_unary_rules,
+            **kwargs,
+        )
+
+        start_index = 1
+        try:
+            for results in run_pipeline(
+                read_chunks(input_type, args.chunk_size),
+                [annotate, dedup, supertag, parse],
+                queue_size=args.queue_size,
+            ):
+                print_(
+                    results,
+                    format=args.format,
+                    semantic_templates=semantic_templates,
+                    start_index=start_index,
+                    end='',
+                )
+                sys.stdout.flush()
+                start_index += len(results)
+        finally:
+            pool.close()
+            if stats_file is not None:
+                stats_file.close()
+        log_dedup_stats()
+        if start_index > 1:
+            print()
+        return
+
+    while True:
+        fin = [
+            line for line in map(str.strip, input_type or [input()])
+            if len(line) > 0
+        ]
+        if len(fin) == 0:
+            break
+
+        # the sentences of each input are printed with the IDs from 1
+        num_read = 0
+        results = parse(supertag(dedup(annotate(fin))))
 
         print_(
             results,
@@ -156,8 +311,11 @@ def main(args):
         if input_type is None:
             sys.stdout.flush()
         else:
+            log_dedup_stats()
             break
 
+    if stats_file is not None:
+        stats_file.close()
 
 if __name__ == '__main__':
     # disable lengthy allennlp logs
@@ -1,4 +1,5 @@
 from typing import Dict, Any, List, Optional
+import weakref
 
 import numpy
 from allennlp.common.util import JsonDict
@@ -38,6 +39,24 @@ class ParserPredictor(SupertaggerPredictor):
             disable_seen_rules
         )
         self.parsing_kwargs = parsing_kwargs or {}
+        self.category_filter = None
+        self.parser_pool = None
+        self._pool_finalizer = None
+
+    def close(self) -> None:
+        """stop the worker processes of the parser pool, if they have been started.
+        otherwise they are stopped when the predictor is garbage-collected or at exit.
+        """
+        if self._pool_finalizer is not None:
+            self._pool_finalizer()
+            self._pool_finalizer = None
+            self.parser_pool = None
+
+    def __enter__(self) -> 'ParserPredictor':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
 
     def _make_json(self, output_dicts: List[Dict[str, Any]]) -> List[JsonDict]:
 
@@ -66,12 +85,32 @@ class ParserPredictor(SupertaggerPredictor):
             score_results.append(ScoringResult(tag_scores, dep_scores))
 
         if self.category_dict is not None:
+            if self.category_filter is None:
+                self.category_filter = depccg.parsing.CategoryFilter(
+                    categories, self.category_dict
+                )
             doc, score_results = depccg.parsing.apply_category_filters(
                 doc,
                 score_results,
                 categories,
-                self.category_dict,
+                self.category_filter,
+            )
+
+        if self.parser_pool is None:
+            # workers are kept alive across batches to reuse their combinator caches
+            self.parser_pool = depccg.parsing.ParserPool(
+                categories,
+                self.root_categories,
+                self.apply_binary_rules,
+                self.apply_unary_rules,
+                **{
+                    key: value
+                    for key, value in self.parsing_kwargs.items()
+                    if key != 'max_chunk_size'
+                },
             )
+            # the finalizer refers only to the pool, so that the predictor can be collected
+            self._pool_finalizer = weakref.finalize(self, self.parser_pool.terminate)
 
         results = depccg.parsing.run(
             doc,
@@ -80,6 +119,7 @@ class ParserPredictor(SupertaggerPredictor):
             self.root_categories,
             self.apply_binary_rules,
             self.apply_unary_rules,
+            pool=self.parser_pool,
             **self.parsing_kwargs,
         )
 
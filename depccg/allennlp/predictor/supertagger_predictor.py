@@ -27,14 +27,20 @@ class SupertaggerPredictor(Predictor):
         outputs = self._model.forward_on_instances(instances)
         return self._make_json(outputs)
 
-    def _make_json(self, output_dicts: List[Dict[str, Any]]) -> List[JsonDict]:
+    @property
+    def all_categories(self) -> List[str]:
+        """the category strings in the order of the tag scores, following the paddings."""
         all_categories = self._model.vocab.get_index_to_token_vocabulary("head_tags")
         all_categories = [token for _, token in sorted(all_categories.items())]
-        categories, paddings = all_categories[2:], all_categories[:2]
         assert all(
             padding in [DEFAULT_PADDING_TOKEN, DEFAULT_OOV_TOKEN]
-            for padding in paddings
+            for padding in all_categories[:2]
         )
+        return all_categories
+
+    def _make_json(self, output_dicts: List[Dict[str, Any]]) -> List[JsonDict]:
+        all_categories = self.all_categories
+        categories = all_categories[2:]
         for output_dict in output_dicts:
             length = len(output_dict["words"].split(" "))
             output_dict["categories"] = categories
@@ -24,6 +24,11 @@ class AllennlpSupertagger(object):
         self.predictor = predictor
         self.dataset_reader = predictor._dataset_reader
 
+    @property
+    def cats(self) -> List[str]:
+        """the categories in the order of the tag scores returned by `predict_doc`."""
+        return self.predictor.all_categories[2:]
+
     def predict_doc(
         self,
         splitted,
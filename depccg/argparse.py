@@ -1,5 +1,6 @@
 import argparse
 from depccg.instance_models import download, AVAILABLE_MODEL_VARIANTS
+from depccg.grammar.cache import build_combinator_cache
 from depccg.annotator import (
     english_annotator, japanese_annotator
 )
@@ -20,6 +21,12 @@ def add_common_parser_arguments(parser, main_fun):
         default=4,
         type=int,
         help='number of processes used for parsing')
+    parser.add_argument(
+        '--num-threads',
+        default=1,
+        type=int,
+        help=('number of threads parsing sentences in each process'
+              ' (use with "--num-processes 1" to parse in a single process)'))
     parser.add_argument(
         '-i',
         '--input',
@@ -49,9 +56,10 @@ def add_common_parser_arguments(parser, main_fun):
         '-I',
         '--input-format',
         default='raw',
-        choices=['raw', 'POSandNERtagged'],
+        choices=['raw', 'POSandNERtagged', 'partial'],
         # choices=['raw', 'POSandNERtagged', 'json', 'partial'],
-        help='input format')
+        help=('input format ("partial" reads partially annotated sentences, '
+              'e.g., "<S[dcl] <NP John > S[dcl]\\NP|runs >", which the parses obey)'))
     parser.add_argument(
         '--unary-penalty',
         default=0.1,
@@ -92,6 +100,77 @@ def add_common_parser_arguments(parser, main_fun):
         type=int,
         help=('give up parsing when the number of times'
               ' of popping agenda items exceeds this value'))
+    parser.add_argument(
+        '--max-agenda-size',
+        default=None,
+        type=int,
+        help=('give up parsing when the number of items in the agenda'
+              ' exceeds this value'))
+    parser.add_argument(
+        '--timeout',
+        default=None,
+        type=float,
+        help='give up parsing a sentence after this many seconds')
+    parser.add_argument(
+        '--span-beam',
+        default=None,
+        type=int,
+        help=('keep at most this number of the most probable items'
+              ' for each span in the chart'))
+    parser.add_argument(
+        '--fallback',
+        default=None,
+        choices=['fragments', 'supertags'],
+        help=('output the fragments in the chart or the most probable supertags'
+              ' for a sentence that fails to be parsed, instead of "FAILED"'))
+    parser.add_argument(
+        '--heuristic',
+        default='default',
+        choices=['default', 'tight'],
+        help=('estimate of the scores outside an item used in the A* search'
+              ' ("tight" takes the dependency structure into account)'))
+    parser.add_argument(
+        '--native-grammar',
+        action='store_true',
+        help=('apply combinatory rules implemented in C++'
+              ' instead of the ones in Python'))
+    parser.add_argument(
+        '--combinator-cache',
+        default=None,
+        help=('directory of precomputed results of combinatory rules,'
+              ' which is created by the "build-cache" command'))
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help=('read the input in chunks and output the results of each chunk'
+              ' as soon as it is parsed, overlapping supertagging and parsing'))
+    parser.add_argument(
+        '--chunk-size',
+        default=1000,
+        type=int,
+        help='number of sentences read at a time in --stream mode')
+    parser.add_argument(
+        '--queue-size',
+        default=2,
+        type=int,
+        help=('maximum number of chunks waiting between'
+              ' the stages of --stream mode'))
+    parser.add_argument(
+        '--stats-output',
+        default=None,
+        help=('file to write the statistics of the search for each parsed sentence'
+              ' in JSON lines (e.g., to find slow inputs or to tune --beta)'))
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help=('supertag and parse only the first copy of duplicate sentences in the input'
+              ' and reuse its results for the others'))
+    parser.add_argument(
+        '--result-cache-size',
+        default=0,
+        type=int,
+        help=('number of sentences whose results are kept across chunks'
+              ' (or inputs from the keyboard) to reuse for their duplicates in --dedup mode'))
     parser.add_argument(
         '--semantic-templates',
         help='semantic templates used in "ccg2lambda" format output')
@@ -112,6 +191,21 @@ def add_common_parser_arguments(parser, main_fun):
         func=lambda args: download(args.lang, args.VARIANT)
     )
 
+    cache_parser = subparsers.add_parser('build-cache')
+    cache_parser.add_argument(
+        'OUTPUT',
+        help='directory to save the precomputed results of combinatory rules')
+
+    cache_parser.set_defaults(
+        func=lambda args: build_combinator_cache(
+            args.OUTPUT,
+            args.lang,
+            variant=args.model,
+            config_path=args.config,
+            disable_seen_rules=args.disable_seen_rules,
+        )
+    )
+
 
 def parse_args(main_fun):
     parser = argparse.ArgumentParser('depccg')
@@ -1,6 +1,9 @@
-from typing import Optional, Callable, Tuple, TypeVar, Iterator
-from dataclasses import dataclass
+from typing import Optional, Callable, Tuple, TypeVar, Iterator, Any
+from dataclasses import dataclass, fields
+from functools import cached_property, lru_cache
+from weakref import WeakValueDictionary
 import re
+import threading
 
 X = TypeVar('X')
 Pair = Tuple[X, X]
@@ -106,7 +109,35 @@ class TernaryFeature(Feature):
         return any(v.startswith('X') for v in self.values())
 
 
-class Category(object):
+# categories in use, keyed by their class and constructor arguments
+_interned: 'WeakValueDictionary[Tuple[Any, ...], Category]' = WeakValueDictionary()
+_interning_lock = threading.Lock()
+# the number of the recently parsed strings whose categories are kept
+PARSE_CACHE_SIZE = 65536
+
+
+class _Interned(type):
+    """Metaclass that makes structurally equal categories the same object
+    (so that the equality of categories is mostly an identity check).
+    The table holds the categories weakly, so that those no longer used are released.
+    """
+
+    def __call__(cls, *args, **kwargs):
+        key = (cls, *args)
+        if len(kwargs) == 0:
+            category = _interned.get(key)
+            if category is not None:
+                return category
+        category = super().__call__(*args, **kwargs)
+        # WeakValueDictionary.setdefault is not atomic
+        with _interning_lock:
+            category = _interned.setdefault((cls, *category._fields()), category)
+            if len(kwargs) == 0:
+                _interned[key] = category
+        return category
+
+
+class Category(object, metaclass=_Interned):
     @property
     def is_functor(self):
         return not self.is_atomic
@@ -118,6 +149,24 @@ class Category(object):
     def __repr__(self) -> str:
         return str(self)
 
+    def __str__(self) -> str:
+        # `_str` is computed once by each subclass
+        return self._str
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    @cached_property
+    def _hash(self) -> int:
+        return hash(self._fields())
+
+    def _fields(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, field.name) for field in fields(self))
+
+    def __reduce__(self):
+        # unpickled (or copied) categories are interned again
+        return type(self), self._fields()
+
     def __truediv__(self, other: 'Category') -> 'Category':
         return Functor(self, '/', other)
 
@@ -126,6 +175,10 @@ class Category(object):
 
     @classmethod
     def parse(cls, text: str) -> 'Category':
+        return _parse_cached(text)
+
+    @classmethod
+    def _parse(cls, text: str) -> 'Category':
         tokens = cat_split.sub(r' \1 ', text)
         buffer = list(reversed([i for i in tokens.split(' ') if i != '']))
         stack = []
@@ -181,17 +234,23 @@ class Atom(Category):
     base: str
     feature: Feature = UnaryFeature()
 
-    def __str__(self) -> str:
+    @cached_property
+    def _str(self) -> str:
         feature = str(self.feature)
         if len(feature) == 0:
             return self.base
         return f'{self.base}[{feature}]'
 
+    __hash__ = Category.__hash__
+
     def __eq__(self, other: object) -> bool:
-        if isinstance(other, str):
+        if self is other:
+            return True
+        elif isinstance(other, str):
             return str(self) == other
-        elif not isinstance(other, Atom):
+        elif not isinstance(other, Atom) or hash(self) != hash(other):
             return False
+        # reached only when either is not interned (e.g., unpickled by older versions)
         return (
             self.base == other.base
             and self.feature == other.feature
@@ -227,18 +286,24 @@ class Functor(Category):
     slash: str
     right: Category
 
-    def __str__(self) -> str:
+    @cached_property
+    def _str(self) -> str:
         def _str(cat):
             if isinstance(cat, Functor):
                 return f'({cat})'
             return str(cat)
         return _str(self.left) + self.slash + _str(self.right)
 
+    __hash__ = Category.__hash__
+
     def __eq__(self, other: object) -> bool:
-        if isinstance(other, str):
+        if self is other:
+            return True
+        elif isinstance(other, str):
             return str(self) == other
-        elif not isinstance(other, Functor):
+        elif not isinstance(other, Functor) or hash(self) != hash(other):
             return False
+        # reached only when either is not interned (e.g., unpickled by older versions)
         return (
             self.left == other.left
             and self.slash == other.slash
@@ -277,3 +342,8 @@ class Functor(Category):
             self.left.clear_features(*args),
             self.right.clear_features(*args)
         )
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_cached(text: str) -> Category:
+    return Category._parse(text)
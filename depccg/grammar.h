@@ -0,0 +1,784 @@
+#pragma once
+
+#include <string>
+#include <vector>
+#include <map>
+#include <unordered_map>
+#include <unordered_set>
+#include <utility>
+#include <stdexcept>
+#include <climits>
+
+#include "parsing.h"
+
+// native implementation of the combinators in depccg/grammar/{en,ja}.py.
+// every rule here must produce exactly the same results as its Python counterpart,
+// including the behavior of depccg.unification.Unification.
+
+namespace grammar
+{
+
+    struct feature
+    {
+        std::string text;
+        // non-empty iff the feature is a TernaryFeature (e.g., "case=nc,mod=nm,fin=f")
+        std::vector<std::pair<std::string, std::string>> items;
+
+        bool is_ternary() const { return !items.empty(); }
+
+        bool is_variable() const
+        {
+            if (!is_ternary())
+                return text == "X";
+            for (auto &kv : items)
+                if (kv.second.size() > 0 && kv.second[0] == 'X')
+                    return true;
+            return false;
+        }
+
+        bool is_ignorable() const
+        {
+            return !is_ternary() && (text.empty() || text == "nb");
+        }
+    };
+
+    struct category
+    {
+        bool atomic;
+        std::string base;
+        unsigned feature;
+        unsigned left;
+        char slash;
+        unsigned right;
+        unsigned nargs;
+        std::string str;
+    };
+
+    // interns categories and features so that structural equality becomes id equality
+    class category_table
+    {
+    public:
+        category_table() { feature_of(""); }
+
+        unsigned feature_of(const std::string &text)
+        {
+            auto it = feature_ids_.find(text);
+            if (it != feature_ids_.end())
+                return it->second;
+
+            feature f;
+            f.text = text;
+            if (text.find('=') != std::string::npos && text.find(',') != std::string::npos)
+            {
+                std::size_t start = 0;
+                while (start <= text.size())
+                {
+                    std::size_t end = text.find(',', start);
+                    if (end == std::string::npos)
+                        end = text.size();
+                    std::string kv = text.substr(start, end - start);
+                    std::size_t eq = kv.find('=');
+                    if (eq == std::string::npos)
+                        throw std::runtime_error("failed to parse feature: " + text);
+                    f.items.emplace_back(kv.substr(0, eq), kv.substr(eq + 1));
+                    start = end + 1;
+                }
+            }
+            unsigned id = features_.size();
+            features_.push_back(f);
+            feature_ids_.emplace(text, id);
+            return id;
+        }
+
+        unsigned atom(const std::string &base, unsigned feature_id)
+        {
+            const std::string &text = features_[feature_id].text;
+            std::string str = text.empty() ? base : base + "[" + text + "]";
+            auto it = ids_.find(str);
+            if (it != ids_.end())
+                return it->second;
+            return add({true, base, feature_id, 0, 0, 0, 0, str});
+        }
+
+        unsigned functor(unsigned left, char slash, unsigned right)
+        {
+            std::string str = wrap(left) + slash + wrap(right);
+            auto it = ids_.find(str);
+            if (it != ids_.end())
+                return it->second;
+            return add({false, "", 0, left, slash, right, 1 + categories_[left].nargs, str});
+        }
+
+        unsigned parse(const std::string &text)
+        {
+            auto it = ids_.find(text);
+            if (it != ids_.end())
+                return it->second;
+            std::size_t pos = 0;
+            unsigned result = parse_functor(text, pos);
+            if (pos != text.size())
+                throw std::runtime_error("failed to parse category: " + text);
+            return result;
+        }
+
+        const category &operator[](unsigned id) const { return categories_[id]; }
+
+        const feature &feature_at(unsigned id) const { return features_[id]; }
+
+        // Category.__xor__: equality ignoring features
+        bool same_shape(unsigned x, unsigned y) const
+        {
+            const category &cx = categories_[x], &cy = categories_[y];
+            if (cx.atomic != cy.atomic)
+                return false;
+            if (cx.atomic)
+                return cx.base == cy.base;
+            return cx.slash == cy.slash && same_shape(cx.left, cy.left) && same_shape(cx.right, cy.right);
+        }
+
+        unsigned clear_features(unsigned x, const std::unordered_set<std::string> &targets)
+        {
+            const category &c = categories_[x];
+            if (c.atomic)
+            {
+                const feature &f = features_[c.feature];
+                if (!f.is_ternary() && targets.count(f.text))
+                    return atom(c.base, 0);
+                return x;
+            }
+            unsigned left = c.left, right = c.right;
+            char slash = c.slash;
+            return functor(clear_features(left, targets), slash, clear_features(right, targets));
+        }
+
+    private:
+        std::string wrap(unsigned id) const
+        {
+            const category &c = categories_[id];
+            return c.atomic ? c.str : "(" + c.str + ")";
+        }
+
+        unsigned add(const category &c)
+        {
+            unsigned id = categories_.size();
+            categories_.push_back(c);
+            ids_.emplace(c.str, id);
+            return id;
+        }
+
+        static bool is_special(char c)
+        {
+            return c == '(' || c == ')' || c == '[' || c == ']' || c == '/' || c == '\\' || c == '|';
+        }
+
+        unsigned parse_functor(const std::string &text, std::size_t &pos)
+        {
+            unsigned result = parse_term(text, pos);
+            while (pos < text.size() && (text[pos] == '/' || text[pos] == '\\' || text[pos] == '|'))
+            {
+                char slash = text[pos++];
+                result = functor(result, slash, parse_term(text, pos));
+            }
+            return result;
+        }
+
+        unsigned parse_term(const std::string &text, std::size_t &pos)
+        {
+            if (pos < text.size() && text[pos] == '(')
+            {
+                pos++;
+                unsigned result = parse_functor(text, pos);
+                if (pos >= text.size() || text[pos] != ')')
+                    throw std::runtime_error("failed to parse category: " + text);
+                pos++;
+                return result;
+            }
+            std::size_t start = pos;
+            while (pos < text.size() && !is_special(text[pos]))
+                pos++;
+            if (start == pos)
+                throw std::runtime_error("failed to parse category: " + text);
+            std::string base = text.substr(start, pos - start);
+            unsigned feature_id = 0;
+            if (pos < text.size() && text[pos] == '[')
+            {
+                std::size_t end = text.find(']', pos);
+                if (end == std::string::npos)
+                    throw std::runtime_error("failed to parse category: " + text);
+                feature_id = feature_of(text.substr(pos + 1, end - pos - 1));
+                pos = end + 1;
+            }
+            return atom(base, feature_id);
+        }
+
+        std::vector<category> categories_;
+        std::unordered_map<std::string, unsigned> ids_;
+        std::vector<feature> features_;
+        std::unordered_map<std::string, unsigned> feature_ids_;
+    };
+
+    // UnaryFeature.unifies and TernaryFeature.unifies
+    inline bool unifies(const feature &x, const feature &y)
+    {
+        if (!x.is_ternary())
+            return x.is_variable() || x.is_ignorable() || (!y.is_ternary() && x.text == y.text);
+
+        if (x.text == y.text)
+            return true;
+        if (x.items.size() != y.items.size())
+            return false;
+        for (unsigned i = 0; i < x.items.size(); i++)
+        {
+            if (x.items[i].first != y.items[i].first)
+                return false;
+            const std::string &v1 = x.items[i].second, &v2 = y.items[i].second;
+            if (!(v1 == v2 || (v1.size() > 0 && v1[0] == 'X')))
+                return false;
+        }
+        return true;
+    }
+
+    // port of depccg.unification.Unification
+    class unification
+    {
+    public:
+        unification(category_table &table, unsigned meta_x, unsigned meta_y)
+            : table_(table), meta_x_(meta_x), meta_y_(meta_y) {}
+
+        bool operator()(unsigned x, unsigned y)
+        {
+            std::map<std::string, unsigned> x_features, y_features;
+            if (!(scan(meta_x_, x, x_features) && scan(meta_y_, y, y_features)))
+                return false;
+
+            // the Python version iterates over a set here; the order only matters
+            // when one variable feature is instantiated to two different values.
+            for (auto &var : x_features)
+            {
+                auto it = y_features.find(var.first);
+                if (it == y_features.end())
+                    continue;
+                const feature &x_feature = table_.feature_at(var.second);
+                const feature &y_feature = table_.feature_at(it->second);
+                if (unifies(x_feature, y_feature))
+                {
+                    if (x_feature.is_variable())
+                        mapping_[var.second] = it->second;
+                }
+                else if (unifies(y_feature, x_feature))
+                {
+                    if (y_feature.is_variable())
+                        mapping_[it->second] = var.second;
+                }
+                else
+                    return false;
+            }
+            return true;
+        }
+
+        unsigned operator[](const std::string &key) { return instantiate(cats_.at(key)); }
+
+    private:
+        unsigned instantiate(unsigned x)
+        {
+            const category &c = table_[x];
+            if (c.atomic)
+            {
+                auto it = mapping_.find(c.feature);
+                if (it != mapping_.end())
+                    return table_.atom(c.base, it->second);
+                return x;
+            }
+            unsigned left = c.left, right = c.right;
+            char slash = c.slash;
+            return table_.functor(instantiate(left), slash, instantiate(right));
+        }
+
+        unsigned scan_deep(unsigned t, const std::string &var, unsigned index, std::map<std::string, unsigned> &results)
+        {
+            const category &c = table_[t];
+            if (!c.atomic)
+            {
+                index = scan_deep(c.left, var, index, results);
+                return scan_deep(c.right, var, index, results);
+            }
+            results[var + std::to_string(index)] = c.feature;
+            return index + 1;
+        }
+
+        bool scan(unsigned s, unsigned t, std::map<std::string, unsigned> &results)
+        {
+            const category &cs = table_[s], &ct = table_[t];
+            if (cs.atomic)
+            {
+                auto it = cats_.find(cs.base);
+                if (it != cats_.end() && !table_.same_shape(t, it->second))
+                    return false;
+                cats_[cs.base] = t;
+            }
+
+            if (!cs.atomic && !ct.atomic && (cs.slash == ct.slash || cs.slash == '|' || ct.slash == '|'))
+                return scan(cs.left, ct.left, results) && scan(cs.right, ct.right, results);
+            else if (cs.atomic && !ct.atomic)
+            {
+                scan_deep(t, cs.base, 0, results);
+                return true;
+            }
+            else if (cs.atomic && ct.atomic)
+            {
+                results[cs.base] = ct.feature;
+                return true;
+            }
+            return false;
+        }
+
+        category_table &table_;
+        unsigned meta_x_, meta_y_;
+        std::map<std::string, unsigned> cats_;
+        std::map<unsigned, unsigned> mapping_;
+    };
+
+    struct rule_result
+    {
+        unsigned cat;
+        const char *op_string;
+        const char *op_symbol;
+    };
+
+    class grammar
+    {
+    public:
+        virtual ~grammar() {}
+
+        // register a category given in its string form and returns its (parser-level) id.
+        // categories are numbered in the order they are first seen.
+        unsigned intern(const std::string &text) { return id_of(table_.parse(text)); }
+
+        std::string to_string(unsigned id) const { return table_[nodes_.at(id)].str; }
+
+        unsigned size() const { return nodes_.size(); }
+
+        void add_seen_rule(const std::string &x, const std::string &y)
+        {
+            seen_rules_.emplace(key(table_.parse(x), table_.parse(y)));
+        }
+
+        void add_unary_rule(const std::string &x, const std::string &y)
+        {
+            unary_rules_[table_.parse(x)].push_back(table_.parse(y));
+        }
+
+        void apply_binary_rules(unsigned x, unsigned y, std::vector<combinator_result> *results)
+        {
+            std::vector<rule_result> rule_results;
+            binary_rules(nodes_.at(x), nodes_.at(y), rule_results);
+            for (auto &result : rule_results)
+                results->push_back(
+                    {id_of(result.cat), (unsigned)results->size(), head_is_left(), result.op_string, result.op_symbol});
+        }
+
+        void apply_unary_rules(unsigned x, std::vector<combinator_result> *results)
+        {
+            unsigned node = nodes_.at(x);
+            auto it = unary_rules_.find(node);
+            if (it == unary_rules_.end())
+                return;
+            for (unsigned result : it->second)
+            {
+                std::string op_string, op_symbol;
+                unary_rule_symbol(node, result, op_string, op_symbol);
+                results->push_back({id_of(result), (unsigned)results->size(), true, op_string, op_symbol});
+            }
+        }
+
+        bool use_seen_rules;
+
+    protected:
+        grammar() : use_seen_rules(false) {}
+
+        virtual void binary_rules(unsigned x, unsigned y, std::vector<rule_result> &results) = 0;
+
+        virtual void unary_rule_symbol(unsigned x, unsigned result, std::string &op_string, std::string &op_symbol) = 0;
+
+        virtual bool head_is_left() const = 0;
+
+        static unsigned long long key(unsigned x, unsigned y)
+        {
+            return ((unsigned long long)x << 32) | y;
+        }
+
+        bool is_seen(unsigned x, unsigned y) const
+        {
+            return !use_seen_rules || seen_rules_.count(key(x, y)) > 0;
+        }
+
+        bool is_modifier(unsigned x) const
+        {
+            const category &c = table_[x];
+            return !c.atomic && c.left == c.right;
+        }
+
+        bool is(unsigned x, const char *text) const { return table_[x].str == text; }
+
+        category_table table_;
+
+    private:
+        unsigned id_of(unsigned node)
+        {
+            auto it = ids_.find(node);
+            if (it != ids_.end())
+                return it->second;
+            unsigned id = nodes_.size();
+            nodes_.push_back(node);
+            ids_.emplace(node, id);
+            return id;
+        }
+
+        std::vector<unsigned> nodes_;
+        std::unordered_map<unsigned, unsigned> ids_;
+        std::unordered_set<unsigned long long> seen_rules_;
+        std::unordered_map<unsigned, std::vector<unsigned>> unary_rules_;
+    };
+
+    class english_grammar : public grammar
+    {
+    public:
+        english_grammar()
+            : nb_({"nb"}), x_and_nb_({"X", "nb"})
+        {
+            b_ = table_.parse("b");
+            a_fwd_b_ = table_.parse("a/b");
+            a_bwd_b_ = table_.parse("a\\b");
+            b_fwd_c_ = table_.parse("b/c");
+            b_fwd_c_any_d_ = table_.parse("(b/c)|d");
+            s_np_bwd_ = table_.parse("(S\\NP)\\(S\\NP)");
+            s_np_fwd_ = table_.parse("(S\\NP)/(S\\NP)");
+        }
+
+    protected:
+        bool head_is_left() const { return true; }
+
+        bool is_punct(unsigned x) const
+        {
+            const category &c = table_[x];
+            if (!c.atomic)
+                return false;
+            char first = c.base[0];
+            bool is_letter = (first >= 'a' && first <= 'z') || (first >= 'A' && first <= 'Z');
+            return !is_letter || c.base == "LRB" || c.base == "RRB" || c.base == "LQU" || c.base == "RQU";
+        }
+
+        bool is_type_raised(unsigned x) const
+        {
+            const category &c = table_[x];
+            if (c.atomic)
+                return false;
+            const category &right = table_[c.right];
+            return !right.atomic && right.left == c.left;
+        }
+
+        void binary_rules(unsigned x, unsigned y, std::vector<rule_result> &results)
+        {
+            if (use_seen_rules && !is_seen(table_.clear_features(x, x_and_nb_), table_.clear_features(y, x_and_nb_)))
+                return;
+
+            x = table_.clear_features(x, nb_);
+            y = table_.clear_features(y, nb_);
+
+            {
+                // forward application
+                unification uni(table_, a_fwd_b_, b_);
+                if (uni(x, y))
+                    results.push_back({is_modifier(x) ? y : uni["a"], "fa", ">"});
+            }
+            {
+                // backward application
+                if (is(x, "S[dcl]") && is(y, "S[em]\\S[em]"))
+                    results.push_back({x, "ba", "<"});
+                else
+                {
+                    unification uni(table_, b_, a_bwd_b_);
+                    if (uni(x, y))
+                        results.push_back({is_modifier(y) ? x : uni["a"], "ba", "<"});
+                }
+            }
+            {
+                // forward composition
+                unification uni(table_, a_fwd_b_, b_fwd_c_);
+                if (uni(x, y))
+                    results.push_back(
+                        {is_modifier(x) ? y : table_.functor(uni["a"], '/', uni["c"]), "fc", ">B"});
+            }
+            {
+                // backward composition
+                unification uni(table_, b_fwd_c_, a_bwd_b_);
+                if (uni(x, y) && !is_n_or_np(uni["b"]))
+                    results.push_back(
+                        {is_modifier(y) ? x : table_.functor(uni["a"], '/', uni["c"]), "bx", "<B"});
+            }
+            {
+                // generalized forward composition
+                unification uni(table_, a_fwd_b_, b_fwd_c_any_d_);
+                if (uni(x, y))
+                {
+                    unsigned result = y;
+                    char y_slash = table_[y].slash;
+                    if (!is_modifier(x))
+                        result = table_.functor(table_.functor(uni["a"], '/', uni["c"]), y_slash, uni["d"]);
+                    results.push_back({result, "gfc", ">B"});
+                }
+            }
+            {
+                // generalized backward composition
+                unification uni(table_, b_fwd_c_any_d_, a_fwd_b_);
+                if (uni(x, y) && !is_n_or_np(uni["b"]))
+                {
+                    unsigned result = x;
+                    char x_slash = table_[x].slash;
+                    if (!is_modifier(y))
+                        result = table_.functor(table_.functor(uni["a"], '/', uni["c"]), x_slash, uni["d"]);
+                    results.push_back({result, "gbx", "<B"});
+                }
+            }
+            // conjunction
+            if (!is_punct(y) && !is_type_raised(y) && (is(x, ",") || is(x, ";") || is(x, "conj")))
+                results.push_back({table_.functor(y, '\\', y), "conj", "<Φ>"});
+            // conjunction2
+            if (is(x, "conj") && is(y, "NP\\NP"))
+                results.push_back({y, "conj", "<Φ>"});
+            // remove_punctuation1
+            if (is_punct(x))
+                results.push_back({y, "lp", "<lp>"});
+            // remove_punctuation2
+            if (is_punct(y))
+                results.push_back({x, "rp", "<rp>"});
+            // remove_punctuation_left
+            if (is(x, "LQU") || is(x, "LRB"))
+                results.push_back({table_.functor(y, '\\', y), "lp", "<lp>"});
+            // comma_vp_to_adv
+            if (is(x, ",") && (is(y, "S[ng]\\NP") || is(y, "S[pss]\\NP")))
+                results.push_back({s_np_bwd_, "lp", "<*>"});
+            // parenthetical_direct_speech
+            if (is(x, ",") && is(y, "S[dcl]/S[dcl]"))
+                results.push_back({s_np_fwd_, "lp", "<*>"});
+        }
+
+        void unary_rule_symbol(unsigned x, unsigned result, std::string &op_string, std::string &op_symbol)
+        {
+            const category &c = table_[x];
+            bool type_raised = c.atomic && (c.base == "NP" || c.base == "PP") && is_type_raised(result);
+            op_string = type_raised ? "tr" : "lex";
+            op_symbol = "<un>";
+        }
+
+    private:
+        bool is_n_or_np(unsigned x) const { return is(x, "N") || is(x, "NP"); }
+
+        std::unordered_set<std::string> nb_, x_and_nb_;
+        unsigned b_, a_fwd_b_, a_bwd_b_, b_fwd_c_, b_fwd_c_any_d_, s_np_bwd_, s_np_fwd_;
+    };
+
+    class japanese_grammar : public grammar
+    {
+    public:
+        japanese_grammar()
+        {
+            b_ = table_.parse("b");
+            a_fwd_b_ = table_.parse("a/b");
+            a_bwd_b_ = table_.parse("a\\b");
+            b_fwd_c_ = table_.parse("b/c");
+            b_bwd_c_ = table_.parse("b\\c");
+            b_bwd_c_d_ = table_.parse("(b\\c)|d");
+            b_bwd_c_d_e_ = table_.parse("((b\\c)|d)|e");
+            b_bwd_c_d_e_f_ = table_.parse("(((b\\c)|d)|e)|f");
+            const char *roots[] = {
+                "NP[case=nc,mod=nm,fin=f]",
+                "NP[case=nc,mod=nm,fin=t]",
+                "S[mod=nm,form=attr,fin=t]",
+                "S[mod=nm,form=base,fin=f]",
+                "S[mod=nm,form=base,fin=t]",
+                "S[mod=nm,form=cont,fin=f]",
+                "S[mod=nm,form=cont,fin=t]",
+                "S[mod=nm,form=da,fin=f]",
+                "S[mod=nm,form=da,fin=t]",
+                "S[mod=nm,form=hyp,fin=t]",
+                "S[mod=nm,form=imp,fin=f]",
+                "S[mod=nm,form=imp,fin=t]",
+                "S[mod=nm,form=r,fin=t]",
+                "S[mod=nm,form=s,fin=t]",
+                "S[mod=nm,form=stem,fin=f]",
+                "S[mod=nm,form=stem,fin=t]"};
+            for (const char *root : roots)
+                possible_root_categories_.insert(table_.parse(root));
+        }
+
+    protected:
+        bool head_is_left() const { return false; }
+
+        unsigned backslash(unsigned x, unsigned y) { return table_.functor(x, '\\', y); }
+
+        void binary_rules(unsigned x, unsigned y, std::vector<rule_result> &results)
+        {
+            if (!is_seen(x, y))
+                return;
+
+            // table_ may grow while building results, so no references into it are kept here
+            char x_slash = table_[x].slash, y_slash = table_[y].slash;
+            {
+                unification uni(table_, a_fwd_b_, b_);
+                if (uni(x, y))
+                    results.push_back({is_modifier(x) ? y : uni["a"], "fa", ">"});
+            }
+            {
+                unification uni(table_, b_, a_bwd_b_);
+                if (uni(x, y))
+                    results.push_back({is_modifier(y) ? x : uni["a"], "ba", "<"});
+            }
+            {
+                unification uni(table_, a_fwd_b_, b_fwd_c_);
+                if (uni(x, y))
+                    results.push_back(
+                        {is_modifier(x) ? y : table_.functor(uni["a"], '/', uni["c"]), "fc", ">B"});
+            }
+            {
+                unification uni(table_, b_bwd_c_, a_bwd_b_);
+                if (uni(x, y))
+                    results.push_back({is_modifier(y) ? x : backslash(uni["a"], uni["c"]), "bx", "<B1"});
+            }
+            {
+                unification uni(table_, b_bwd_c_d_, a_bwd_b_);
+                if (uni(x, y))
+                {
+                    unsigned result = x;
+                    if (!is_modifier(y))
+                        result = table_.functor(backslash(uni["a"], uni["c"]), x_slash, uni["d"]);
+                    results.push_back({result, "bx", "<B2"});
+                }
+            }
+            {
+                unification uni(table_, b_bwd_c_d_e_, a_bwd_b_);
+                if (uni(x, y))
+                {
+                    unsigned result = x;
+                    if (!is_modifier(y))
+                    {
+                        char left_slash = table_[table_[x].left].slash;
+                        result = table_.functor(
+                            table_.functor(backslash(uni["a"], uni["c"]), left_slash, uni["d"]),
+                            x_slash,
+                            uni["e"]);
+                    }
+                    results.push_back({result, "bx", "<B3"});
+                }
+            }
+            {
+                unification uni(table_, b_bwd_c_d_e_f_, a_bwd_b_);
+                if (uni(x, y))
+                {
+                    unsigned result = x;
+                    if (!is_modifier(y))
+                    {
+                        unsigned left = table_[x].left;
+                        char left_slash = table_[left].slash;
+                        char left_left_slash = table_[table_[left].left].slash;
+                        result = table_.functor(
+                            table_.functor(
+                                table_.functor(backslash(uni["a"], uni["c"]), left_left_slash, uni["d"]),
+                                left_slash,
+                                uni["e"]),
+                            x_slash,
+                            uni["f"]);
+                    }
+                    results.push_back({result, "bx", "<B4"});
+                }
+            }
+            {
+                unification uni(table_, a_fwd_b_, b_bwd_c_);
+                if (uni(x, y))
+                    results.push_back(
+                        {is_modifier(x) ? y : table_.functor(uni["a"], '/', uni["c"]), "fx", ">Bx1"});
+            }
+            {
+                unification uni(table_, a_fwd_b_, b_bwd_c_d_);
+                if (uni(x, y))
+                {
+                    unsigned result = y;
+                    if (!is_modifier(x))
+                        result = table_.functor(backslash(uni["a"], uni["c"]), y_slash, uni["d"]);
+                    results.push_back({result, "fx", ">Bx2"});
+                }
+            }
+            {
+                unification uni(table_, a_fwd_b_, b_bwd_c_d_e_);
+                if (uni(x, y))
+                {
+                    unsigned result = y;
+                    if (!is_modifier(x))
+                    {
+                        char left_slash = table_[table_[y].left].slash;
+                        result = table_.functor(
+                            table_.functor(backslash(uni["a"], uni["c"]), left_slash, uni["d"]),
+                            y_slash,
+                            uni["e"]);
+                    }
+                    results.push_back({result, "fx", ">Bx3"});
+                }
+            }
+            // conjoin
+            if (possible_root_categories_.count(x) && possible_root_categories_.count(y))
+                results.push_back({y, "other", "SSEQ"});
+        }
+
+        void unary_rule_symbol(unsigned x, unsigned, std::string &op_string, std::string &op_symbol)
+        {
+            unsigned head = x;
+            while (!table_[head].atomic)
+                head = table_[head].left;
+            const feature &f = table_.feature_at(table_[head].feature);
+            op_string = "OTHER";
+            for (auto &kv : f.items)
+            {
+                if (kv.first == "mod" && kv.second == "adn")
+                {
+                    op_string = "ADNint";
+                    break;
+                }
+            }
+            if (op_string == "OTHER")
+            {
+                for (auto &kv : f.items)
+                    if (kv.first == "mod" && kv.second == "adv")
+                        op_string = "ADV0";
+            }
+            op_symbol = op_string;
+        }
+
+    private:
+        unsigned b_, a_fwd_b_, a_bwd_b_, b_fwd_c_, b_bwd_c_, b_bwd_c_d_, b_bwd_c_d_e_, b_bwd_c_d_e_f_;
+        std::unordered_set<unsigned> possible_root_categories_;
+    };
+
+    inline grammar *make_grammar(const std::string &lang)
+    {
+        if (lang == "en")
+            return new english_grammar();
+        else if (lang == "ja")
+            return new japanese_grammar();
+        throw std::runtime_error("unsupported language for the native grammar: " + lang);
+    }
+
+    // this has the same signature as scaffold_type, so that parse_sentence
+    // can call the native grammar without going through Python.
+    // the exceptions are not caught here but propagate out of parse_sentence with
+    // their messages, and are raised as RuntimeError by Cython (`except +`).
+    inline int apply_rules(void *grammar_ptr, unsigned x, unsigned y, std::vector<combinator_result> *results)
+    {
+        grammar *g = static_cast<grammar *>(grammar_ptr);
+        if (y == UINT_MAX)
+            g->apply_unary_rules(x, results);
+        else
+            g->apply_binary_rules(x, y, results);
+        return 0;
+    }
+
+} // namespace grammar
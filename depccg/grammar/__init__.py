@@ -1,11 +1,19 @@
-from typing import Callable, List, TypeVar, Tuple, Set, Dict
+from typing import Callable, List, TypeVar, Tuple, Set, Dict, NamedTuple, Optional
+from functools import partial
 from depccg.types import Combinator, CombinatorResult
 from depccg.cat import Category
+from depccg.grammar import en, ja
 
 X = TypeVar('X')
 Pair = Tuple[X, X]
 
 
+class GrammarSpec(NamedTuple):
+    lang: str
+    seen_rules: Optional[List[Pair[str]]]
+    unary_rules: List[Pair[str]]
+
+
 def apply_rules(
     left: Category,
     right: Category,
@@ -43,3 +51,86 @@ def guess_combinator_by_triplet(
         op_symbol="<unk>",
         head_is_left=True
     )
+
+
+def grammar_spec_of(
+    binary_fun: Callable[..., List[CombinatorResult]],
+    unary_fun: Callable[..., List[CombinatorResult]],
+) -> GrammarSpec:
+    """extract the language and the rule sets from the rule functions
+    created in `depccg.allennlp.utils.read_params`, i.e., `functools.partial`
+    objects of `en` or `ja`'s `apply_binary_rules` and `apply_unary_rules`.
+    the result consists only of strings, so that it is cheap to send to other processes.
+
+    Args:
+        binary_fun: apply_binary_rules with `seen_rules` bound
+        unary_fun: apply_unary_rules with `unary_rules` bound
+
+    Raises:
+        RuntimeError: if the functions are not the ones of the builtin grammars
+
+    Returns:
+        GrammarSpec: language name, seen rules (None if not used) and unary rules
+    """
+    for lang, module in (('en', en), ('ja', ja)):
+        if (
+            isinstance(binary_fun, partial)
+            and binary_fun.func is module.apply_binary_rules
+            and isinstance(unary_fun, partial)
+            and unary_fun.func is module.apply_unary_rules
+        ):
+            break
+    else:
+        raise RuntimeError(
+            'the native grammar is only available for the rules '
+            'of depccg.grammar.en and depccg.grammar.ja'
+        )
+
+    seen_rules = binary_fun.keywords.get('seen_rules')
+    if seen_rules is not None:
+        seen_rules = [(str(x), str(y)) for x, y in seen_rules]
+
+    unary_rules = [
+        (str(x), str(y))
+        for x, results in unary_fun.keywords['unary_rules'].items()
+        for y in results
+    ]
+
+    return GrammarSpec(lang, seen_rules, unary_rules)
+
+
+def seen_rule_classes(
+    spec: GrammarSpec,
+    categories: List[Category],
+) -> Optional[Tuple[List[int], List[int], List[Pair[int]]]]:
+    """classify `categories` by their forms compared with the seen rules of `spec`
+    (`seen_rule_key` of the grammar), for the index of the pairs that can combine.
+
+    Args:
+        spec: the grammar, whose seen rules are used
+        categories: the categories to be classified
+
+    Returns:
+        the classes of the categories on the left and on the right sides of the rules
+        (-1 if not on the side of any rule), and the pairs of the classes of the rules,
+        where two categories can combine only if the pair of their classes is in them.
+        None if the seen rules are not used.
+    """
+    if spec.seen_rules is None:
+        return None
+
+    module = {'en': en, 'ja': ja}[spec.lang]
+    lefts, rights = {}, {}
+    pairs = [
+        (
+            lefts.setdefault(Category.parse(x), len(lefts)),
+            rights.setdefault(Category.parse(y), len(rights)),
+        )
+        for x, y in spec.seen_rules
+    ]
+    keys = [module.seen_rule_key(cat) for cat in categories]
+    return (
+        [lefts.get(key, -1) for key in keys],
+        [rights.get(key, -1) for key in keys],
+        pairs,
+    )
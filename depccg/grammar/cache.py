@@ -0,0 +1,274 @@
+from typing import Callable, List, Tuple, Dict, Optional, Any
+from pathlib import Path
+import hashlib
+import json
+import math
+import logging
+import numpy
+
+from depccg.cat import Category
+from depccg.types import CombinatorResult
+from depccg.grammar import GrammarSpec, grammar_spec_of
+
+logger = logging.getLogger(__name__)
+
+UNARY = numpy.iinfo(numpy.uint32).max
+
+KEY_DTYPE = numpy.dtype(
+    [('left', '<u4'), ('right', '<u4'), ('start', '<u4'), ('end', '<u4')]
+)
+
+RESULT_DTYPE = numpy.dtype(
+    [('cat', '<u4'), ('op', '<u4'), ('head_is_left', 'u1')]
+)
+
+
+def grammar_fingerprint(spec: GrammarSpec, categories: List[Category]) -> str:
+    """digest of the grammar (language, seen rules and unary rules) and the categories,
+    which tells if a CombinatorCache is built for them. The order of the rules and
+    the categories does not matter.
+    """
+    content = [
+        spec.lang,
+        None if spec.seen_rules is None else sorted(map(list, spec.seen_rules)),
+        sorted(map(list, spec.unary_rules)),
+        sorted({str(cat) for cat in categories}),
+    ]
+    return hashlib.sha1(json.dumps(content).encode('utf-8')).hexdigest()
+
+
+def grammar_fingerprint_of(
+    categories: List[Category],
+    apply_binary_rules: Callable[[Category, Category], List[CombinatorResult]],
+    apply_unary_rules: Callable[[Category], List[CombinatorResult]],
+) -> Optional[str]:
+    """`grammar_fingerprint` of the rule functions (see `grammar_spec_of`),
+    or None if they are not the ones of the builtin grammars.
+    """
+    try:
+        spec = grammar_spec_of(apply_binary_rules, apply_unary_rules)
+    except RuntimeError:
+        return None
+    return grammar_fingerprint(spec, categories)
+
+
+class CombinatorCache(object):
+    """A table from (left, right) category pairs to the results of combinators,
+    which is loaded into the C++ cache of `depccg._parsing` before parsing.
+    Unary rule results are stored with `right` being `UNARY`.
+
+    Categories are kept as strings on disk, so that the table can be used with
+    any category list (the ids are remapped when it is loaded), and the arrays
+    are saved as .npy files that can be memory-mapped and shared among processes.
+
+    Args:
+        categories: category strings indexed by the ids used in `keys` and `results`
+        ops: pairs of (op_string, op_symbol) indexed by `results['op']`
+        keys: array of KEY_DTYPE, where results[start:end] are the results of (left, right)
+        results: array of RESULT_DTYPE
+        meta: information on the grammar the table is built with
+        fingerprint: `grammar_fingerprint` of the grammar and the categories the table
+            is built with, or None if the rules are not the ones of the builtin grammars
+    """
+
+    def __init__(
+        self,
+        categories: List[str],
+        ops: List[Tuple[str, str]],
+        keys: numpy.ndarray,
+        results: numpy.ndarray,
+        meta: Optional[Dict[str, Any]] = None,
+        fingerprint: Optional[str] = None,
+    ) -> None:
+        self.categories = categories
+        self.ops = ops
+        self.keys = keys
+        self.results = results
+        self.meta = meta or {}
+        self.fingerprint = fingerprint
+        self._category_ids = {cat: index for index, cat in enumerate(categories)}
+        # the rows are those of the pairs of the first `_num_pairs` categories in order,
+        # followed by the unary rules of each category (see `build`)
+        num_binary = len(keys) - int(numpy.count_nonzero(keys['right'] == UNARY))
+        self._num_pairs = math.isqrt(num_binary)
+        if self._num_pairs ** 2 != num_binary:
+            raise RuntimeError('the combinator cache has a broken layout.')
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(
+        cls,
+        categories: List[Category],
+        apply_binary_rules: Callable[[Category, Category], List[CombinatorResult]],
+        apply_unary_rules: Callable[[Category], List[CombinatorResult]],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> 'CombinatorCache':
+        """compute the results of the rules on all the pairs of `categories`,
+        and unary rules on them and on all the categories that the binary rules produce.
+        """
+        category_list = [str(cat) for cat in categories]
+        category_ids = {cat: index for index, cat in enumerate(category_list)}
+        op_ids = {}
+        keys, results = [], []
+
+        def add_entries(left, right, rule_results):
+            start = len(results)
+            for result in rule_results:
+                cat = str(result.cat)
+                if cat not in category_ids:
+                    category_ids[cat] = len(category_list)
+                    category_list.append(cat)
+                op = (result.op_string, result.op_symbol)
+                if op not in op_ids:
+                    op_ids[op] = len(op_ids)
+                results.append(
+                    (category_ids[cat], op_ids[op], result.head_is_left)
+                )
+            keys.append((left, right, start, len(results)))
+
+        num_categories = len(categories)
+        for x_id, x in enumerate(categories):
+            for y_id, y in enumerate(categories):
+                add_entries(x_id, y_id, apply_binary_rules(x, y))
+            if x_id % 50 == 0:
+                logger.info(f'{x_id}/{num_categories} categories done')
+
+        cat_id = 0
+        while cat_id < len(category_list):
+            add_entries(
+                cat_id,
+                UNARY,
+                apply_unary_rules(Category.parse(category_list[cat_id]))
+            )
+            cat_id += 1
+
+        return cls(
+            category_list,
+            sorted(op_ids, key=op_ids.get),
+            numpy.array(keys, dtype=KEY_DTYPE),
+            numpy.array(results, dtype=RESULT_DTYPE),
+            meta,
+            grammar_fingerprint_of(categories, apply_binary_rules, apply_unary_rules),
+        )
+
+    def save(self, path: str) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        numpy.save(path / 'keys.npy', self.keys)
+        numpy.save(path / 'results.npy', self.results)
+        with open(path / 'meta.json', 'w') as f:
+            json.dump(
+                {
+                    'categories': self.categories,
+                    'ops': self.ops,
+                    'meta': self.meta,
+                    'fingerprint': self.fingerprint,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'CombinatorCache':
+        path = Path(path)
+        mmap_mode = 'r' if mmap else None
+        with open(path / 'meta.json') as f:
+            meta = json.load(f)
+        return cls(
+            meta['categories'],
+            [tuple(op) for op in meta['ops']],
+            numpy.load(path / 'keys.npy', mmap_mode=mmap_mode),
+            numpy.load(path / 'results.npy', mmap_mode=mmap_mode),
+            meta['meta'],
+            meta.get('fingerprint'),
+        )
+
+    def verify(self, fingerprint: Optional[str]) -> None:
+        """check that the table is built for the grammar and the categories
+        whose `grammar_fingerprint` is `fingerprint`.
+
+        Raises:
+            RuntimeError: if the fingerprints differ, e.g., the table is built with
+            other rules, or before the fingerprints were recorded, or if `fingerprint`
+            is None, since the rules other than the builtin grammars' cannot be verified
+        """
+        if fingerprint is None:
+            raise RuntimeError(
+                'the combinator cache is only available for the rules of '
+                'depccg.grammar.en and depccg.grammar.ja.'
+            )
+        if self.fingerprint != fingerprint:
+            raise RuntimeError(
+                'the combinator cache is built for a different grammar or category set '
+                '(rebuild it with `build_combinator_cache`).'
+            )
+
+    def get(
+        self, x: Category, y: Optional[Category] = None
+    ) -> Optional[List[CombinatorResult]]:
+        """look up the results of a binary (or unary if `y` is None) rule application.
+        None is returned if the pair is not in the table.
+        """
+        left = self._category_ids.get(str(x))
+        if left is None:
+            return None
+        if y is None:
+            right = UNARY
+            row = self._num_pairs ** 2 + left
+        else:
+            right = self._category_ids.get(str(y))
+            if right is None or left >= self._num_pairs or right >= self._num_pairs:
+                return None
+            row = left * self._num_pairs + right
+
+        if row >= len(self.keys):
+            return None
+        key_left, key_right, start, end = self.keys[row]
+        if key_left != left or key_right != right:
+            return None
+        return [
+            CombinatorResult(
+                cat=Category.parse(self.categories[cat]),
+                op_string=self.ops[op][0],
+                op_symbol=self.ops[op][1],
+                head_is_left=bool(head_is_left),
+            )
+            for cat, op, head_is_left in self.results[start:end]
+        ]
+
+
+def build_combinator_cache(
+    output: str,
+    lang: str,
+    variant: Optional[str] = None,
+    config_path: Optional[str] = None,
+    disable_seen_rules: bool = False,
+) -> None:
+    """precompute the combinator cache for the supertag set (`targets`) and the seen rules
+    in the config of a model shipped with depccg (or `config_path`), and save it to `output`.
+    """
+    from depccg.allennlp.utils import read_params
+    from depccg.instance_models import MODELS
+    from depccg.lang import set_global_language_to
+
+    set_global_language_to(lang)
+    if config_path is None:
+        config_path = MODELS[f'{lang}[{variant}]' if variant else lang].config
+
+    apply_binary_rules, apply_unary_rules, _, categories = read_params(
+        config_path,
+        disable_category_dictionary=True,
+        disable_seen_rules=disable_seen_rules,
+    )
+    cache = CombinatorCache.build(
+        categories,
+        apply_binary_rules,
+        apply_unary_rules,
+        meta={
+            'lang': lang,
+            'seen_rules': not disable_seen_rules,
+        },
+    )
+    cache.save(output)
+    logger.info(f'saved {len(cache)} entries to {output}')
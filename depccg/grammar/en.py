@@ -1,12 +1,22 @@
 from typing import Optional, List, TypeVar, Tuple, Set, Dict
 from string import ascii_letters
 from depccg.cat import Category
-from depccg.unification import Unification
+from depccg.unification import UnificationPattern
 from depccg.types import Combinator, CombinatorResult
 
 X = TypeVar('X')
 Pair = Tuple[X, X]
 
+_FORWARD_APPLICATION = UnificationPattern("a/b", "b")
+_BACKWARD_APPLICATION = UnificationPattern("b", "a\\b")
+_FORWARD_COMPOSITION = UnificationPattern("a/b", "b/c")
+_BACKWARD_COMPOSITION = UnificationPattern("b/c", "a\\b")
+_GENERALIZED_FORWARD_COMPOSITION = UnificationPattern("a/b", "(b/c)|d")
+_GENERALIZED_BACKWARD_COMPOSITION = UnificationPattern("(b/c)|d", "a/b")
+
+_VP_MODIFIER_BACKWARD = Category.parse("(S\\NP)\\(S\\NP)")
+_VP_MODIFIER_FORWARD = Category.parse("(S\\NP)/(S\\NP)")
+
 
 def _match(x: Category, y: Category) -> bool:
     if x.is_functor and y.is_functor:
@@ -43,8 +53,8 @@ def _is_type_raised(x: Category) -> bool:
 
 
 def forward_application(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "b")
-    if uni(x, y):
+    uni = _FORWARD_APPLICATION(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else uni['a']
         return CombinatorResult(
             cat=result,
@@ -59,8 +69,8 @@ def backward_application(x: Category, y: Category) -> Optional[CombinatorResult]
     if x == 'S[dcl]' and y == 'S[em]\\S[em]':
         result = x
     else:
-        uni = Unification("b", "a\\b")
-        if uni(x, y):
+        uni = _BACKWARD_APPLICATION(x, y)
+        if uni is not None:
             result = x if _is_modifier(y) else uni['a']
         else:
             return None
@@ -74,8 +84,8 @@ def backward_application(x: Category, y: Category) -> Optional[CombinatorResult]
 
 
 def forward_composition(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "b/c")
-    if uni(x, y):
+    uni = _FORWARD_COMPOSITION(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else uni['a'] / uni['c']
         return CombinatorResult(
             cat=result,
@@ -87,8 +97,8 @@ def forward_composition(x: Category, y: Category) -> Optional[CombinatorResult]:
 
 
 def backward_composition(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("b/c", "a\\b")
-    if uni(x, y):
+    uni = _BACKWARD_COMPOSITION(x, y)
+    if uni is not None:
         if str(uni["b"]) in ("N", "NP"):
             return None
         result = x if _is_modifier(y) else uni['a'] / uni['c']
@@ -102,8 +112,8 @@ def backward_composition(x: Category, y: Category) -> Optional[CombinatorResult]
 
 
 def generalized_forward_composition(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "(b/c)|d")
-    if uni(x, y):
+    uni = _GENERALIZED_FORWARD_COMPOSITION(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else y.functor(
             (uni['a'] / uni['c']), uni['d'])
         return CombinatorResult(
@@ -116,8 +126,8 @@ def generalized_forward_composition(x: Category, y: Category) -> Optional[Combin
 
 
 def generalized_backward_composition(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("(b/c)|d", "a/b")
-    if uni(x, y):
+    uni = _GENERALIZED_BACKWARD_COMPOSITION(x, y)
+    if uni is not None:
         if str(uni["b"]) in ("N", "NP"):
             return None
         result = x if _is_modifier(y) else x.functor(
@@ -198,7 +208,7 @@ def remove_punctuation_left(x: Category, y: Category) -> Optional[CombinatorResu
 
 def comma_vp_to_adv(x: Category, y: Category) -> Optional[CombinatorResult]:
     if x == "," and y in ("S[ng]\\NP", "S[pss]\\NP"):
-        result = Category.parse("(S\\NP)\\(S\\NP)")
+        result = _VP_MODIFIER_BACKWARD
         return CombinatorResult(
             cat=result,
             op_string="lp",
@@ -210,7 +220,7 @@ def comma_vp_to_adv(x: Category, y: Category) -> Optional[CombinatorResult]:
 
 def parenthetical_direct_speech(x: Category, y: Category) -> Optional[CombinatorResult]:
     if x == "," and y == "S[dcl]/S[dcl]":
-        result = Category.parse("(S\\NP)/(S\\NP)")
+        result = _VP_MODIFIER_FORWARD
         return CombinatorResult(
             cat=result,
             op_string="lp",
@@ -237,15 +247,18 @@ combinators: List[Combinator] = [
 ]
 
 
+def seen_rule_key(x: Category) -> Category:
+    """the form of a category compared with the seen rules"""
+    return x.clear_features('X', 'nb')
+
+
 def apply_binary_rules(
     x: Category,
     y: Category,
     seen_rules: Optional[Set[Pair[Category]]] = None,
 ) -> List[CombinatorResult]:
     key = (x.clear_features('nb'), y.clear_features('nb'))
-    seen_key = (
-        x.clear_features('X', 'nb'), y.clear_features('X', 'nb')
-    )
+    seen_key = (seen_rule_key(x), seen_rule_key(y))
     results = []
     if seen_rules is None or seen_key in seen_rules:
         for combinator in combinators:
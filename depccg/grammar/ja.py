@@ -1,19 +1,30 @@
 from typing import Optional, List, Dict, Set, TypeVar, Tuple
 from depccg.cat import Category
-from depccg.unification import Unification
+from depccg.unification import UnificationPattern
 from depccg.types import Combinator, CombinatorResult
 
 X = TypeVar('X')
 Pair = Tuple[X, X]
 
+_FORWARD_APPLICATION = UnificationPattern("a/b", "b")
+_BACKWARD_APPLICATION = UnificationPattern("b", "a\\b")
+_FORWARD_COMPOSITION = UnificationPattern("a/b", "b/c")
+_GENERALIZED_BACKWARD_COMPOSITION1 = UnificationPattern("b\\c", "a\\b")
+_GENERALIZED_BACKWARD_COMPOSITION2 = UnificationPattern("(b\\c)|d", "a\\b")
+_GENERALIZED_BACKWARD_COMPOSITION3 = UnificationPattern("((b\\c)|d)|e", "a\\b")
+_GENERALIZED_BACKWARD_COMPOSITION4 = UnificationPattern("(((b\\c)|d)|e)|f", "a\\b")
+_GENERALIZED_FORWARD_COMPOSITION1 = UnificationPattern("a/b", "b\\c")
+_GENERALIZED_FORWARD_COMPOSITION2 = UnificationPattern("a/b", "(b\\c)|d")
+_GENERALIZED_FORWARD_COMPOSITION3 = UnificationPattern("a/b", "((b\\c)|d)|e")
+
 
 def _is_modifier(x: Category) -> bool:
     return x.is_functor and x.left == x.right
 
 
 def forward_application(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "b")
-    if uni(x, y):
+    uni = _FORWARD_APPLICATION(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else uni['a']
         return CombinatorResult(
             cat=result,
@@ -25,8 +36,8 @@ def forward_application(x: Category, y: Category) -> Optional[CombinatorResult]:
 
 
 def backward_application(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("b", "a\\b")
-    if uni(x, y):
+    uni = _BACKWARD_APPLICATION(x, y)
+    if uni is not None:
         result = x if _is_modifier(y) else uni['a']
         return CombinatorResult(
             cat=result,
@@ -38,8 +49,8 @@ def backward_application(x: Category, y: Category) -> Optional[CombinatorResult]
 
 
 def forward_composition(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "b/c")
-    if uni(x, y):
+    uni = _FORWARD_COMPOSITION(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else uni['a'] / uni['c']
         return CombinatorResult(
             cat=result,
@@ -51,8 +62,8 @@ def forward_composition(x: Category, y: Category) -> Optional[CombinatorResult]:
 
 
 def generalized_backward_composition1(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("b\\c", "a\\b")
-    if uni(x, y):
+    uni = _GENERALIZED_BACKWARD_COMPOSITION1(x, y)
+    if uni is not None:
         result = x if _is_modifier(y) else uni['a'] | uni['c']
         return CombinatorResult(
             cat=result,
@@ -64,8 +75,8 @@ def generalized_backward_composition1(x: Category, y: Category) -> Optional[Comb
 
 
 def generalized_backward_composition2(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("(b\\c)|d", "a\\b")
-    if uni(x, y):
+    uni = _GENERALIZED_BACKWARD_COMPOSITION2(x, y)
+    if uni is not None:
         result = x if _is_modifier(y) else x.functor(
             uni['a'] | uni['c'], uni['d'])
         return CombinatorResult(
@@ -78,8 +89,8 @@ def generalized_backward_composition2(x: Category, y: Category) -> Optional[Comb
 
 
 def generalized_backward_composition3(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("((b\\c)|d)|e", "a\\b")
-    if uni(x, y):
+    uni = _GENERALIZED_BACKWARD_COMPOSITION3(x, y)
+    if uni is not None:
         result = x if _is_modifier(y) else x.functor(
             x.left.functor(uni['a'] | uni['c'], uni['d']), uni['e']
         )
@@ -93,8 +104,8 @@ def generalized_backward_composition3(x: Category, y: Category) -> Optional[Comb
 
 
 def generalized_backward_composition4(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("(((b\\c)|d)|e)|f", "a\\b")
-    if uni(x, y):
+    uni = _GENERALIZED_BACKWARD_COMPOSITION4(x, y)
+    if uni is not None:
         result = x if _is_modifier(y) else x.functor(
             x.left.functor(
                 x.left.left.functor(uni['a'] | uni['c'], uni['d']),
@@ -112,8 +123,8 @@ def generalized_backward_composition4(x: Category, y: Category) -> Optional[Comb
 
 
 def generalized_forward_composition1(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "b\\c")
-    if uni(x, y):
+    uni = _GENERALIZED_FORWARD_COMPOSITION1(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else uni['a'] / uni['c']
         return CombinatorResult(
             cat=result,
@@ -125,8 +136,8 @@ def generalized_forward_composition1(x: Category, y: Category) -> Optional[Combi
 
 
 def generalized_forward_composition2(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "(b\\c)|d")
-    if uni(x, y):
+    uni = _GENERALIZED_FORWARD_COMPOSITION2(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else y.functor(
             uni['a'] | uni['c'], uni['d'])
         return CombinatorResult(
@@ -139,8 +150,8 @@ def generalized_forward_composition2(x: Category, y: Category) -> Optional[Combi
 
 
 def generalized_forward_composition3(x: Category, y: Category) -> Optional[CombinatorResult]:
-    uni = Unification("a/b", "((b\\c)|d)|e")
-    if uni(x, y):
+    uni = _GENERALIZED_FORWARD_COMPOSITION3(x, y)
+    if uni is not None:
         result = y if _is_modifier(x) else y.functor(y.left.functor(
             uni['a'] | uni['c'], uni['d']), uni['e']
         )
@@ -203,12 +214,17 @@ combinators: List[Combinator] = [
 ]
 
 
+def seen_rule_key(x: Category) -> Category:
+    """the form of a category compared with the seen rules"""
+    return x
+
+
 def apply_binary_rules(
     x: Category,
     y: Category,
     seen_rules: Optional[Set[Pair[Category]]] = None,
 ) -> List[CombinatorResult]:
-    key = (x, y)
+    key = (seen_rule_key(x), seen_rule_key(y))
     results = []
     if seen_rules is None or key in seen_rules:
         for combinator in combinators:
@@ -1,26 +1,26 @@
+#pragma once
+
 #include <iostream>
 #include <string>
 #include <vector>
 #include <unordered_set>
 #include <unordered_map>
 #include <queue>
-#include <list>
+#include <memory>
+#include <algorithm>
 #include <limits>
 #include <cmath>
 #include <utility>
+#include <chrono>
 #include <stdexcept>
-
-struct pair_hash
-{
-    template <class T1, class T2>
-    std::size_t operator()(const std::pair<T1, T2> &p) const
-    {
-        auto h1 = std::hash<T1>{}(p.first);
-        auto h2 = std::hash<T2>{}(p.second);
-
-        return h1 ^ h2;
-    }
-};
+#include <set>
+#include <mutex>
+#include <thread>
+#include <atomic>
+#include <exception>
+#include <tuple>
+#include <deque>
+#include <cstdint>
 
 struct combinator_result
 {
@@ -35,10 +35,232 @@ using category_id = unsigned;
 
 using scored_category = std::pair<float, category_id>;
 
-using cache_type = std::unordered_map<std::pair<unsigned, unsigned>, std::vector<combinator_result>, pair_hash>;
+// the numbers of lookups in a cache_type found or not, and of the slots examined in them
+struct cache_stats
+{
+    unsigned long hits;
+    unsigned long misses;
+    unsigned long probes;
+};
+
+// a hash table with open addressing (linear probing) from pairs of category ids to the results
+// of the combinators. the keys are packed into 64 bit integers in a flat array of slots,
+// while the results are stored apart, so their addresses never change.
+// the results of the unary rules can also be given in a table indexed by the category ids.
+class cache_type
+{
+public:
+    using key_type = std::pair<unsigned, unsigned>;
+    using results_type = std::vector<combinator_result>;
+
+    cache_type() : size_(0), slots_(16, {empty_key, 0}) {}
+
+    std::size_t size() const { return size_; }
+    std::size_t capacity() const { return slots_.size(); }
+
+    // the results for `key` or nullptr, adding the number of slots examined to `probes`
+    const results_type *find(const key_type &key, unsigned long *probes = nullptr) const
+    {
+        if (key.second == unary_key && key.first < unary_table_.size())
+        {
+            if (probes != nullptr)
+                *probes += 1;
+            return &unary_table_[key.first];
+        }
+        std::uint64_t packed = pack(key);
+        std::size_t mask = slots_.size() - 1;
+        std::size_t index = hash(packed) & mask, num_probes = 1;
+        while (slots_[index].key != packed && slots_[index].key != empty_key)
+        {
+            index = (index + 1) & mask;
+            num_probes++;
+        }
+        if (probes != nullptr)
+            *probes += num_probes;
+        return slots_[index].key == packed ? &values_[slots_[index].value] : nullptr;
+    }
+
+    // adds the results for `key` if it is not in the table, and returns the ones in it
+    const results_type *emplace(const key_type &key, const results_type &results)
+    {
+        auto found = find(key);
+        if (found != nullptr)
+            return found;
+        // kept at most half full
+        if (2 * (size_ + 1) > slots_.size())
+            rehash(2 * slots_.size());
+        values_.push_back(results);
+        insert(pack(key), values_.size() - 1);
+        size_++;
+        return &values_.back();
+    }
+
+    void reserve(std::size_t size)
+    {
+        std::size_t capacity = slots_.size();
+        while (2 * size > capacity)
+            capacity *= 2;
+        if (capacity > slots_.size())
+            rehash(capacity);
+    }
+
+    // calls `f(key, results)` for each entry in the order they were added
+    template <typename F>
+    void for_each(F f) const
+    {
+        std::vector<key_type> keys(size_);
+        for (auto &slot : slots_)
+        {
+            if (slot.key != empty_key)
+                keys[slot.value] = unpack(slot.key);
+        }
+        for (std::size_t index = 0; index < size_; index++)
+            f(keys[index], values_[index]);
+    }
+
+    // sets the results of the unary rules of the categories with the ids less than the size
+    // of `table`, which are found by an index rather than in the hash table (not in `size`)
+    void set_unary_table(const std::vector<results_type> &table)
+    {
+        unary_table_ = table;
+    }
+
+    std::size_t unary_table_size() const { return unary_table_.size(); }
+
+    cache_stats stats = {0, 0, 0};
+
+private:
+    struct slot
+    {
+        std::uint64_t key;
+        std::size_t value;
+    };
+
+    // no key has UINT_MAX as the first category
+    static constexpr std::uint64_t empty_key = std::numeric_limits<std::uint64_t>::max();
+    // the second category of the keys of unary rules
+    static constexpr unsigned unary_key = std::numeric_limits<unsigned>::max();
+
+    static std::uint64_t pack(const key_type &key)
+    {
+        return (static_cast<std::uint64_t>(key.first) << 32) | key.second;
+    }
+
+    static key_type unpack(std::uint64_t key)
+    {
+        return {static_cast<unsigned>(key >> 32), static_cast<unsigned>(key)};
+    }
+
+    // the finalizer of splitmix64
+    static std::uint64_t hash(std::uint64_t x)
+    {
+        x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+        x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+        return x ^ (x >> 31);
+    }
+
+    void insert(std::uint64_t key, std::size_t value)
+    {
+        std::size_t mask = slots_.size() - 1;
+        std::size_t index = hash(key) & mask;
+        while (slots_[index].key != empty_key)
+            index = (index + 1) & mask;
+        slots_[index] = {key, value};
+    }
+
+    void rehash(std::size_t capacity)
+    {
+        std::vector<slot> slots(capacity, {empty_key, 0});
+        slots_.swap(slots);
+        for (auto &slot : slots)
+        {
+            if (slot.key != empty_key)
+                insert(slot.key, slot.value);
+        }
+    }
+
+    std::size_t size_;
+    std::vector<slot> slots_;
+    // a deque keeps the addresses of its elements when it grows at the end
+    std::deque<results_type> values_;
+    // never changed while the sentences are parsed
+    std::vector<results_type> unary_table_;
+};
 
 typedef int (*scaffold_type)(void *callback_func, unsigned x, unsigned y, std::vector<combinator_result> *results);
 
+// the cache of combinator results used in parse_sentence, where the key is a pair of category ids
+// (the second is UINT_MAX for unary rules). when sentences are parsed in threads, the cache
+// shared by them is only read, and the results missing in it are computed once under a mutex
+// and added to `pending`, of which each thread keeps a copy in `local` to read without locking.
+class cache_view
+{
+public:
+    using key_type = cache_type::key_type;
+    using results_type = cache_type::results_type;
+
+    explicit cache_view(cache_type *cache)
+        : shared_(cache), local_(nullptr), pending_(nullptr), mutex_(nullptr), stats_(&cache->stats) {}
+
+    cache_view(
+        cache_type *cache, cache_type *local, cache_type *pending, std::mutex *mutex, cache_stats *stats)
+        : shared_(cache), local_(local), pending_(pending), mutex_(mutex), stats_(stats) {}
+
+    const results_type *find(const key_type &key) const
+    {
+        auto results = shared_->find(key, &stats_->probes);
+        if (results == nullptr && local_ != nullptr)
+            results = local_->find(key, &stats_->probes);
+        if (results != nullptr)
+            stats_->hits++;
+        else
+            stats_->misses++;
+        return results;
+    }
+
+    const results_type &at(const key_type &key) const
+    {
+        auto results = find(key);
+        if (results == nullptr)
+            throw std::out_of_range("no combinator results in the cache");
+        return *results;
+    }
+
+    // the results for `key`, which are computed by `compute(key, results)` if not cached
+    // the hits and misses are also counted in `lookups` if given
+    template <typename Compute>
+    const results_type *get(const key_type &key, Compute compute, cache_stats *lookups = nullptr)
+    {
+        auto results = find(key);
+        if (lookups != nullptr)
+            (results != nullptr ? lookups->hits : lookups->misses)++;
+        if (results != nullptr)
+            return results;
+
+        if (mutex_ == nullptr)
+        {
+            results_type computed;
+            compute(key, computed);
+            return shared_->emplace(key, computed);
+        }
+
+        std::lock_guard<std::mutex> lock(*mutex_);
+        results = pending_->find(key);
+        if (results == nullptr)
+        {
+            results_type computed;
+            compute(key, computed);
+            results = pending_->emplace(key, computed);
+        }
+        return local_->emplace(key, *results);
+    }
+
+private:
+    cache_type *shared_, *local_, *pending_;
+    std::mutex *mutex_;
+    cache_stats *stats_;
+};
+
 namespace utils
 {
     template <typename T>
@@ -87,50 +309,209 @@ namespace parsing
         return left.score() < right.score();
     };
 
+    // allocates objects in blocks of growing size, which are released all at once
+    // when the arena is destroyed. the addresses of the objects never change.
+    template <typename T>
+    class arena
+    {
+    public:
+        arena(std::size_t first_block_size = 64, std::size_t max_block_size = 65536)
+            : next_block_size_(first_block_size),
+              max_block_size_(max_block_size),
+              used_(0),
+              size_(0),
+              bytes_(0) {}
+
+        arena(const arena &) = delete;
+
+        T *create(const T &value)
+        {
+            if (blocks_.empty() || used_ == block_sizes_.back())
+                grow();
+            T *result = blocks_.back().get() + used_++;
+            *result = value;
+            size_++;
+            return result;
+        }
+
+        std::size_t size() const { return size_; }
+        std::size_t num_blocks() const { return blocks_.size(); }
+        std::size_t bytes() const { return bytes_; }
+
+    private:
+        void grow()
+        {
+            blocks_.emplace_back(new T[next_block_size_]);
+            block_sizes_.push_back(next_block_size_);
+            bytes_ += next_block_size_ * sizeof(T);
+            used_ = 0;
+            next_block_size_ = std::min(next_block_size_ * 2, max_block_size_);
+        }
+
+        std::vector<std::unique_ptr<T[]>> blocks_;
+        std::vector<std::size_t> block_sizes_;
+        std::size_t next_block_size_, max_block_size_, used_, size_, bytes_;
+    };
+
+    struct memory_stats
+    {
+        unsigned long num_items;
+        unsigned long num_blocks;
+        unsigned long chart_bytes;
+        unsigned long agenda_size;
+    };
+
+    // the statistics of the search for a sentence, which are collected if asked for
+    struct search_stats
+    {
+        unsigned long pops;
+        unsigned long pushes;
+        unsigned long peak_agenda_size;
+        cache_stats binary_lookups;
+        cache_stats unary_lookups;
+        double callback_seconds;
+        double seconds;
+        // the number of the items in the chart by the span length (minus one)
+        std::vector<unsigned long> chart_items;
+    };
+
+    // the pairs of categories that can combine by the binary rules at all (e.g., by the seen rules),
+    // where each category is mapped to its classes on the left and the right sides of the rules,
+    // and a pair can combine only if the bit of the pair of their classes is set. the categories
+    // with the ids not in the index (e.g., made by the rules after it is built) can combine with any.
+    class combinable_index
+    {
+    public:
+        combinable_index() : num_cats_(0), words_(0) {}
+
+        // `left_classes` and `right_classes` are the classes of the categories of the ids,
+        // which are UINT_MAX if the categories are not on the sides of any rules,
+        // and `pairs` are the pairs of the classes of the rules.
+        void build(
+            const std::vector<unsigned> &left_classes,
+            const std::vector<unsigned> &right_classes,
+            const std::vector<std::pair<unsigned, unsigned>> &pairs)
+        {
+            unsigned num_left_classes = 0, num_right_classes = 0;
+            for (auto &pair : pairs)
+            {
+                num_left_classes = std::max(num_left_classes, pair.first + 1);
+                num_right_classes = std::max(num_right_classes, pair.second + 1);
+            }
+            words_ = (num_right_classes + 63) / 64;
+            bits_.assign(num_left_classes * words_, 0);
+            for (auto &pair : pairs)
+                bits_[pair.first * words_ + pair.second / 64] |= std::uint64_t(1) << (pair.second % 64);
+            left_classes_ = left_classes;
+            right_classes_ = right_classes;
+            num_cats_ = std::min(left_classes.size(), right_classes.size());
+        }
+
+        bool combinable(category_id x, category_id y) const
+        {
+            if (x >= num_cats_ || y >= num_cats_)
+                return true;
+            unsigned left = left_classes_[x], right = right_classes_[y];
+            if (left == UINT_MAX || right == UINT_MAX)
+                return false;
+            return (bits_[left * words_ + right / 64] >> (right % 64)) & 1;
+        }
+
+        std::size_t size() const { return num_cats_; }
+
+    private:
+        std::size_t num_cats_, words_;
+        std::vector<unsigned> left_classes_, right_classes_;
+        std::vector<std::uint64_t> bits_;
+    };
+
     class chart
     {
     public:
         class cell
         {
         public:
-            using cell_items = std::list<cell_item>;
+            using cell_items = std::vector<cell_item *>;
+
+            // iterates over the items from the most recently added one
+            class iterator
+            {
+            public:
+                iterator(cell_items::reverse_iterator it) : it_(it) {}
+                cell_item &operator*() const { return **it_; }
+                iterator &operator++()
+                {
+                    ++it_;
+                    return *this;
+                }
+                bool operator!=(const iterator &other) const { return it_ != other.it_; }
+
+            private:
+                cell_items::reverse_iterator it_;
+            };
 
             cell() : seen(false){};
             cell(const cell &) = delete;
 
-            bool contains(category_id cat) const { return category_ids.count(cat) > 0; }
+            bool contains(category_id cat) const
+            {
+                return std::binary_search(category_ids.begin(), category_ids.end(), cat);
+            }
+
+            void add(cell_item *item)
+            {
+                auto it = std::lower_bound(category_ids.begin(), category_ids.end(), item->cat);
+                if (it == category_ids.end() || *it != item->cat)
+                    category_ids.insert(it, item->cat);
+                items.push_back(item);
+            }
 
-            cell_item &emplace(const cell_item &item)
+            cell_item *find(category_id cat)
             {
-                category_ids.emplace(item.cat);
-                items.push_front(item);
-                return items.front();
+                for (auto item : items)
+                {
+                    if (item->cat == cat)
+                        return item;
+                }
+                return nullptr;
             }
 
             unsigned size() const { return items.size(); }
-            cell_items::iterator begin() { return items.begin(); }
-            cell_items::iterator end() { return items.end(); }
+            iterator begin() { return iterator(items.rbegin()); }
+            iterator end() { return iterator(items.rend()); }
 
             void sort()
             {
-                auto compare = [](parsing::cell_item &s1, parsing::cell_item &s2)
+                auto compare = [](const parsing::cell_item *s1, const parsing::cell_item *s2)
                 {
-                    return s1.score() > s2.score();
+                    return s1->score() > s2->score();
                 };
-                this->items.sort(compare);
+                // stable sorting in the order of the iteration
+                std::reverse(items.begin(), items.end());
+                std::stable_sort(items.begin(), items.end(), compare);
+                std::reverse(items.begin(), items.end());
+            }
+
+            std::size_t bytes() const
+            {
+                return items.capacity() * sizeof(cell_item *) +
+                       category_ids.capacity() * sizeof(category_id);
             }
 
             friend chart;
 
         private:
             bool seen;
-            std::unordered_set<category_id> category_ids;
+            // sorted, and usually only a few categories are in a cell
+            std::vector<category_id> category_ids;
             cell_items items;
         };
 
-        chart(unsigned length, bool nbest)
+        // at most `beam` items are kept in each cell if it is not zero
+        chart(unsigned length, bool nbest, unsigned beam = 0)
             : length_(length),
               nbest_(nbest),
+              beam_(beam),
               chart_(new cell[length * length]),
               ending_cells_(new std::vector<cell *>[length + 1]),
               starting_cells_(new std::vector<cell *>[length + 1]) {}
@@ -162,7 +543,12 @@ namespace parsing
             if (!nbest_ && cell_.contains(item.cat))
                 return nullptr;
 
-            return &cell_.emplace(item);
+            if (beam_ > 0 && cell_.size() >= beam_)
+                return nullptr;
+
+            cell_item *result = items_.create(item);
+            cell_.add(result);
+            return result;
         }
 
         unsigned size() const
@@ -183,11 +569,35 @@ namespace parsing
             return ending_cells_[index];
         }
 
+        // the number of the items in the cells of each span length
+        void count_items(std::vector<unsigned long> &counts) const
+        {
+            counts.assign(length_, 0);
+            for (unsigned index = 0; index < length_ * length_; index++)
+                counts[index % length_] += chart_[index].size();
+        }
+
+        // adds the numbers of items and allocated blocks, and the bytes used by the chart
+        void add_memory_stats(memory_stats *stats) const
+        {
+            std::size_t bytes = items_.bytes() + length_ * length_ * sizeof(cell);
+            for (unsigned index = 0; index <= length_; index++)
+            {
+                for (auto cell_ : starting_cells_[index])
+                    bytes += cell_->bytes() + 2 * sizeof(cell *);
+            }
+            stats->num_items += items_.size();
+            stats->num_blocks += items_.num_blocks();
+            stats->chart_bytes += bytes;
+        }
+
     private:
         unsigned length_;
         bool nbest_;
+        unsigned beam_;
         cell *chart_;
         std::vector<cell *> *ending_cells_, *starting_cells_;
+        arena<cell_item> items_;
     };
 
     class matrix
@@ -249,9 +659,394 @@ namespace parsing
         }
     }
 
+    // upper bounds of the dependency scores of the words outside a span with the given head,
+    // which are tighter than the sum of the best scores of those words and the head by taking
+    // into account that no word depends on itself, that the head depends on a word outside
+    // the span (or the root), and that the words outside can depend only on the head
+    // among the words in the span. they are computed in O(length) and memoized per span and head.
+    class dependency_bounds
+    {
+    public:
+        // `dep_scores` is the (length, length + 1) matrix of the scores of the heads
+        // of the words (where the column 0 is the root)
+        dependency_bounds(const matrix &dep_scores, unsigned length)
+            : length_(length),
+              dep_scores_(dep_scores),
+              before_(length, length + 2),
+              after_(length, length + 2),
+              memo_(length * length)
+        {
+            float lowest = std::numeric_limits<float>::lowest();
+            for (unsigned word = 0; word < length; word++)
+            {
+                // the best scores in the columns before (and from) each column, except itself
+                before_(word, 0) = lowest;
+                for (unsigned column = 0; column <= length; column++)
+                    before_(word, column + 1) = std::max(
+                        before_(word, column), column == word + 1 ? lowest : dep_scores(word, column));
+                after_(word, length + 1) = lowest;
+                for (unsigned column = length + 1; column-- > 0;)
+                    after_(word, column) = std::max(
+                        after_(word, column + 1), column == word + 1 ? lowest : dep_scores(word, column));
+            }
+        }
+
+        float operator()(unsigned start, unsigned end, unsigned head)
+        {
+            // the bounds of a span are allocated when it is first seen
+            std::vector<float> &memo = memo_[start * length_ + end - 1];
+            if (memo.empty())
+                memo.assign(end - start, std::numeric_limits<float>::quiet_NaN());
+            float &memoized = memo[head - start];
+            if (!std::isnan(memoized))
+                return memoized;
+
+            // the columns of the words in the span are start + 1, ..., end
+            float bound = outside(head, start, end);
+            for (unsigned word = 0; word < length_; word++)
+            {
+                if (word == start)
+                {
+                    word = end - 1;
+                    continue;
+                }
+                bound += std::max(outside(word, start, end), dep_scores_(word, head + 1));
+            }
+            memoized = bound;
+            return bound;
+        }
+
+    private:
+        float outside(unsigned word, unsigned start, unsigned end) const
+        {
+            return std::max(before_(word, start + 1), after_(word, end + 1));
+        }
+
+        unsigned length_;
+        const matrix &dep_scores_;
+        matrix before_, after_;
+        std::vector<std::vector<float>> memo_;
+    };
+
+    // covers the sentence with the fewest items in the chart (preferring higher inside
+    // scores among the covers of the same size), where a word that no item covers is
+    // assigned the item in `leaves`. the items are returned from left to right.
+    std::vector<cell_item *> fragment_cover(
+        chart &chart_, std::vector<cell_item> &leaves, unsigned length)
+    {
+        struct state
+        {
+            unsigned num_fragments;
+            float score;
+            cell_item *item;
+        };
+
+        std::vector<state> best(length + 1, {UINT_MAX, 0.0, nullptr});
+        best[0].num_fragments = 0;
+
+        auto relax = [&](cell_item *item)
+        {
+            const state &from = best[item->start_of_span];
+            state &to = best[item->end_of_span()];
+            unsigned num_fragments = from.num_fragments + 1;
+            float score = from.score + item->in_score;
+            if (num_fragments < to.num_fragments ||
+                (num_fragments == to.num_fragments && score > to.score))
+                to = {num_fragments, score, item};
+        };
+
+        for (unsigned start = 0; start < length; start++)
+        {
+            bool covered = false;
+            for (auto cell_ : chart_.cells_starting_at(start))
+            {
+                cell_item *best_item = nullptr;
+                for (auto &item : *cell_)
+                {
+                    if (best_item == nullptr || item.in_score > best_item->in_score)
+                        best_item = &item;
+                }
+                if (best_item != nullptr)
+                {
+                    covered |= best_item->span_length == 1;
+                    relax(best_item);
+                }
+            }
+            if (!covered)
+                relax(&leaves[start]);
+        }
+
+        std::vector<cell_item *> results;
+        for (unsigned end = length; end > 0; end = best[end].item->start_of_span)
+            results.push_back(best[end].item);
+        std::reverse(results.begin(), results.end());
+        return results;
+    }
+
+    // the hypergraph of a search, whose nodes are the items in the chart (unique for each
+    // span and category), and the hyperedges coming into a node are the node item itself
+    // and the items of the same span and category popped later (alternatives).
+    // the k-best derivations are extracted lazily (Huang and Chiang, 2005, algorithm 3).
+    class hypergraph
+    {
+    public:
+        struct derivation
+        {
+            cell_item *edge;
+            unsigned ranks[2];
+            float score;
+        };
+
+        hypergraph() : num_candidates_(0) {}
+        hypergraph(const hypergraph &) = delete;
+
+        void add_alternative(cell_item *node, const cell_item &edge)
+        {
+            // the derivations of a node are scored by its head in those of the larger spans
+            if (edge.head_id != node->head_id)
+                return;
+            // a unary edge from a node derived from this one makes a cycle
+            if (edge.left != nullptr && edge.right == nullptr && unary_reachable(node, edge.left))
+                return;
+            alternatives_[node].push_back(edges_.create(edge));
+        }
+
+        // a goal item (`fin`), whose child is a node covering the sentence
+        void add_goal(cell_item *goal) { goals_.push_back(goal); }
+
+        // the k-th best derivation of `node` (nullptr for the goals), or nullptr if
+        // there are not so many. the results are invalid after adding edges until `reset`.
+        const derivation *kth_best(cell_item *node, unsigned k)
+        {
+            auto &derivations = derivations_[node];
+            if (!derivations.initialized)
+            {
+                derivations.initialized = true;
+                if (node == nullptr)
+                {
+                    for (auto goal : goals_)
+                        push_candidate(derivations, goal, 0, 0);
+                }
+                else
+                {
+                    push_candidate(derivations, node, 0, 0);
+                    auto it = alternatives_.find(node);
+                    if (it != alternatives_.end())
+                    {
+                        for (auto edge : it->second)
+                            push_candidate(derivations, edge, 0, 0);
+                    }
+                }
+            }
+
+            auto &found = derivations.found;
+            while (found.size() <= k)
+            {
+                if (!found.empty())
+                {
+                    derivation last = found.back().second;
+                    if (last.edge->left != nullptr)
+                        push_candidate(derivations, last.edge, last.ranks[0] + 1, last.ranks[1]);
+                    if (last.edge->right != nullptr)
+                        push_candidate(derivations, last.edge, last.ranks[0], last.ranks[1] + 1);
+                }
+                if (derivations.candidates.empty())
+                    break;
+                std::pop_heap(derivations.candidates.begin(), derivations.candidates.end(), compare);
+                found.push_back(derivations.candidates.back());
+                derivations.candidates.pop_back();
+            }
+            return k < found.size() ? &found[k].second : nullptr;
+        }
+
+        // builds the items of a derivation given by `kth_best`, where the `in_score`
+        // of each item (and the score of a goal item) is that of the derivation
+        cell_item *build(derivation derivation_)
+        {
+            cell_item item = *derivation_.edge;
+            item.in_score = derivation_.score;
+            if (item.left != nullptr)
+                item.left = build(*kth_best(item.left, derivation_.ranks[0]));
+            if (item.right != nullptr)
+                item.right = build(*kth_best(item.right, derivation_.ranks[1]));
+            return trees_.create(item);
+        }
+
+        void reset() { derivations_.clear(); }
+
+        void add_memory_stats(memory_stats *stats) const
+        {
+            stats->num_items += edges_.size() + trees_.size();
+            stats->num_blocks += edges_.num_blocks() + trees_.num_blocks();
+            stats->chart_bytes += edges_.bytes() + trees_.bytes();
+        }
+
+    private:
+        // ordered by the score, and then by the order of the candidates found
+        using candidate = std::pair<std::pair<float, long>, derivation>;
+
+        static bool compare(const candidate &x, const candidate &y) { return x.first < y.first; }
+
+        struct node_derivations
+        {
+            node_derivations() : initialized(false) {}
+
+            bool initialized;
+            std::vector<candidate> found;
+            // a max heap
+            std::vector<candidate> candidates;
+            std::set<std::tuple<cell_item *, unsigned, unsigned>> seen;
+        };
+
+        // whether `to` is `from` or derived from it only by unary edges (all in the same span)
+        bool unary_reachable(cell_item *from, cell_item *to) const
+        {
+            std::vector<cell_item *> stack = {to};
+            std::unordered_set<cell_item *> visited;
+            auto push_child = [&](const cell_item *edge)
+            {
+                if (edge->left != nullptr && edge->right == nullptr)
+                    stack.push_back(edge->left);
+            };
+            while (!stack.empty())
+            {
+                cell_item *node = stack.back();
+                stack.pop_back();
+                if (node == from)
+                    return true;
+                if (!visited.insert(node).second)
+                    continue;
+                push_child(node);
+                auto it = alternatives_.find(node);
+                if (it != alternatives_.end())
+                {
+                    for (auto edge : it->second)
+                        push_child(edge);
+                }
+            }
+            return false;
+        }
+
+        void push_candidate(
+            node_derivations &derivations, cell_item *edge, unsigned left_rank, unsigned right_rank)
+        {
+            if (!derivations.seen.emplace(edge, left_rank, right_rank).second)
+                return;
+
+            // the score relative to the best derivations of the children,
+            // so that the score of the edge item itself is kept exactly
+            float score = edge->in_score;
+            if (edge->left != nullptr)
+            {
+                auto left = kth_best(edge->left, left_rank);
+                if (left == nullptr)
+                    return;
+                score += left->score - edge->left->in_score;
+            }
+            if (edge->right != nullptr)
+            {
+                auto right = kth_best(edge->right, right_rank);
+                if (right == nullptr)
+                    return;
+                score += right->score - edge->right->in_score;
+            }
+            derivations.candidates.push_back(
+                {{score, -num_candidates_++}, {edge, {left_rank, right_rank}, score}});
+            std::push_heap(derivations.candidates.begin(), derivations.candidates.end(), compare);
+        }
+
+        long num_candidates_;
+        std::unordered_map<cell_item *, std::vector<cell_item *>> alternatives_;
+        std::vector<cell_item *> goals_;
+        std::unordered_map<cell_item *, node_derivations> derivations_;
+        arena<cell_item> edges_, trees_;
+    };
+
 } // namespace parsing
 
-typedef unsigned (*finalizer_type)(parsing::cell_item *, unsigned *, cache_type *cache, void *);
+typedef unsigned (*finalizer_type)(parsing::cell_item *, unsigned *, const cache_view *cache, void *);
+
+// a node of a derivation, whose children precede it in derivation_buffer::nodes.
+// `op` is an index of derivation_buffer::ops, or UINT_MAX for a leaf (`start` is its word).
+struct derivation_node
+{
+    unsigned cat;
+    unsigned op;
+    int left;
+    int right;
+    unsigned head;
+    unsigned start;
+    unsigned length;
+};
+
+// receives the derivations of a sentence from `flatten_derivation`
+struct derivation_buffer
+{
+    std::vector<derivation_node> nodes;
+    std::vector<unsigned> roots;
+    std::vector<float> scores;
+    // (op_string, op_symbol) of the combinators, which are kept across sentences
+    std::vector<std::pair<std::string, std::string>> ops;
+    std::unordered_map<std::string, unsigned> op_ids;
+
+    void clear()
+    {
+        nodes.clear();
+        roots.clear();
+        scores.clear();
+    }
+
+    unsigned op_id(const combinator_result &result)
+    {
+        std::string key = result.op_string + '\t' + result.op_symbol;
+        auto it = op_ids.find(key);
+        if (it != op_ids.end())
+            return it->second;
+        unsigned id = ops.size();
+        ops.emplace_back(result.op_string, result.op_symbol);
+        op_ids.emplace(key, id);
+        return id;
+    }
+};
+
+// a finalizer that appends the derivation of a goal item to `buffer` (derivation_buffer)
+unsigned flatten_derivation(
+    parsing::cell_item *item, unsigned *token_id, const cache_view *cache, void *buffer)
+{
+    auto out = static_cast<derivation_buffer *>(buffer);
+
+    if (item->fin)
+    {
+        out->scores.push_back(item->score());
+        out->roots.push_back(flatten_derivation(item->left, token_id, cache, buffer));
+        return out->roots.back();
+    }
+
+    derivation_node node = {
+        item->cat,
+        UINT_MAX,
+        -1,
+        -1,
+        item->head_id,
+        item->start_of_span,
+        item->span_length};
+
+    if (item->left != nullptr)
+    {
+        node.left = flatten_derivation(item->left, token_id, cache, buffer);
+        unsigned right_cat = UINT_MAX;
+        if (item->right != nullptr)
+        {
+            node.right = flatten_derivation(item->right, token_id, cache, buffer);
+            right_cat = item->right->cat;
+        }
+        auto &results = cache->at(std::make_pair(item->left->cat, right_cat));
+        node.op = out->op_id(results[item->rule_id]);
+    }
+
+    out->nodes.push_back(node);
+    return out->nodes.size() - 1;
+}
 
 struct config
 {
@@ -262,6 +1057,135 @@ struct config
     unsigned pruning_size;
     unsigned nbest;
     unsigned max_step;
+    // the limits below are disabled when they are zero
+    unsigned long max_agenda_size;
+    float timeout;
+    unsigned span_beam;
+    unsigned fallback;
+    unsigned heuristic;
+};
+
+// the estimate of the scores outside an item, which is used as the heuristic of A*
+enum heuristic_type : unsigned
+{
+    // the best tag and dependency scores of the words, independently of each other
+    default_heuristic = 0,
+    // parsing::dependency_bounds in place of the best dependency scores
+    tight_heuristic = 1,
+};
+
+// what parse_sentence gives to the finalizer when it fails to parse a sentence
+enum fallback_type : unsigned
+{
+    no_fallback = 0,
+    // the items covering the sentence with the fewest fragments in the chart
+    fragments_fallback = 1,
+    // the most probable supertag of each word
+    supertags_fallback = 2,
+};
+
+// the supertags of the words in a sentence given to the parser, where those of the i-th word
+// are cats[offsets[i]:offsets[i + 1]] in the descending order of their scores (and ids).
+struct supertag_candidates
+{
+    const unsigned *offsets;
+    const unsigned *cats;
+    const float *scores;
+};
+
+// a span of words given by a partial annotation of a sentence, whose items must have
+// `cat` (UINT_MAX for any category) when they combine with others or make a parse.
+// if `lexical`, the span is a word and `cat` is its supertag.
+struct span_constraint
+{
+    unsigned start;
+    unsigned length;
+    unsigned cat;
+    bool lexical;
+};
+
+struct sentence_constraints
+{
+    const span_constraint *spans;
+    unsigned size;
+};
+
+namespace parsing
+{
+    // looks up the constraints on spans, where no item can cross a constrained span
+    class span_constraints
+    {
+    public:
+        span_constraints(unsigned length, const sentence_constraints *constraints)
+            : length_(length), active_(constraints != nullptr && constraints->size > 0)
+        {
+            if (!active_)
+                return;
+
+            lexical_.assign(length, UINT_MAX);
+            crossing_.assign((length + 1) * (length + 1), false);
+            required_.assign((length + 1) * (length + 1), UINT_MAX);
+            for (unsigned i = 0; i < constraints->size; i++)
+            {
+                const span_constraint &span = constraints->spans[i];
+                unsigned end = span.start + span.length;
+                if (span.lexical)
+                {
+                    lexical_[span.start] = span.cat;
+                    continue;
+                }
+                required_[index(span.start, end)] = span.cat;
+                for (unsigned start_ = 0; start_ <= length; start_++)
+                {
+                    for (unsigned end_ = start_ + 1; end_ <= length; end_++)
+                    {
+                        if ((start_ < span.start && span.start < end_ && end_ < end) ||
+                            (span.start < start_ && start_ < end && end < end_))
+                            crossing_[index(start_, end_)] = true;
+                    }
+                }
+            }
+        }
+
+        bool crossing(unsigned start, unsigned end) const
+        {
+            return active_ && crossing_[index(start, end)];
+        }
+
+        // whether an item can combine with others or make a parse
+        bool fits(const cell_item &item) const
+        {
+            if (!active_)
+                return true;
+            unsigned cat = required_[index(item.start_of_span, item.end_of_span())];
+            return cat == UINT_MAX || cat == item.cat;
+        }
+
+        // the supertag given to a word, or UINT_MAX
+        unsigned lexical_category(unsigned token_id) const
+        {
+            return active_ ? lexical_[token_id] : UINT_MAX;
+        }
+
+    private:
+        unsigned index(unsigned start, unsigned end) const { return start * (length_ + 1) + end; }
+
+        unsigned length_;
+        bool active_;
+        std::vector<unsigned> lexical_;
+        std::vector<bool> crossing_;
+        std::vector<unsigned> required_;
+    };
+} // namespace parsing
+
+// the reason why parse_sentence returned
+enum parse_status : unsigned
+{
+    success = 0,
+    no_parse = 1,
+    max_step_reached = 2,
+    agenda_limit_reached = 3,
+    timed_out = 4,
 };
 
 unsigned parse_sentence(
@@ -274,35 +1198,55 @@ unsigned parse_sentence(
     finalizer_type finalizer_callback,
     scaffold_type scaffold,
     void *finalizer_args,
-    cache_type *cache,
-    config *config)
+    cache_view &cache,
+    config *config,
+    parsing::memory_stats *stats = nullptr,
+    const supertag_candidates *candidates = nullptr,
+    const sentence_constraints *constraints = nullptr,
+    parsing::search_stats *search = nullptr,
+    const parsing::combinable_index *combinable = nullptr)
 {
-    auto apply_binary_rules = [&](unsigned x, unsigned y)
+    auto start_time = std::chrono::steady_clock::now();
+    if (search != nullptr)
+        *search = {0, 0, 0, {0, 0, 0}, {0, 0, 0}, 0.0, 0.0, {}};
+
+    // the time in the callbacks is measured only when the statistics are collected
+    auto call = [&](void *callback, unsigned x, unsigned y, std::vector<combinator_result> &results)
     {
-        std::pair<unsigned, unsigned> key(x, y);
-        if (cache->count(key) == 0)
+        int code;
+        if (search != nullptr)
         {
-            std::vector<combinator_result> results;
-            if (scaffold(binary_callback, x, y, &results) == -1)
-                throw std::runtime_error(
-                    "some error has occurred in the callback Python function.");
-            cache->emplace(key, results);
+            auto call_start_time = std::chrono::steady_clock::now();
+            code = scaffold(callback, x, y, &results);
+            search->callback_seconds += std::chrono::duration<double>(
+                                            std::chrono::steady_clock::now() - call_start_time)
+                                            .count();
         }
-        return &cache->at(key);
+        else
+            code = scaffold(callback, x, y, &results);
+        if (code == -1)
+            throw std::runtime_error(
+                "some error has occurred in the callback Python function.");
+    };
+
+    auto call_binary = [&](const cache_view::key_type &key, std::vector<combinator_result> &results)
+    {
+        call(binary_callback, key.first, key.second, results);
+    };
+
+    auto call_unary = [&](const cache_view::key_type &key, std::vector<combinator_result> &results)
+    {
+        call(unary_callback, key.first, UINT_MAX, results);
+    };
+
+    auto apply_binary_rules = [&](unsigned x, unsigned y)
+    {
+        return cache.get({x, y}, call_binary, search ? &search->binary_lookups : nullptr);
     };
 
     auto apply_unary_rules = [&](unsigned x)
     {
-        std::pair<unsigned, unsigned> key(x, UINT_MAX);
-        if (cache->count(key) == 0)
-        {
-            std::vector<combinator_result> results;
-            if (scaffold(unary_callback, x, UINT_MAX, &results) == -1)
-                throw std::runtime_error(
-                    "some error has occurred in the callback Python function.");
-            cache->emplace(key, results);
-        }
-        return &cache->at(key);
+        return cache.get({x, UINT_MAX}, call_unary, search ? &search->unary_lookups : nullptr);
     };
 
     std::vector<float> best_tag_scores(length, 0);
@@ -315,67 +1259,185 @@ unsigned parse_sentence(
 
     std::priority_queue<parsing::cell_item> agenda;
 
-    std::vector<std::priority_queue<scored_category>> scored_cats(length);
-
     float dep_leaf_out_score = 0.0;
     for (unsigned token_id = 0; token_id < length; token_id++)
     {
-        for (unsigned category_id = 0; category_id < config->num_tags; category_id++)
-            scored_cats[token_id].emplace(tag_in_scores(token_id, category_id), category_id);
+        unsigned max_tag_id = tag_in_scores.argmax(token_id);
         unsigned max_id = dep_in_scores.argmax(token_id);
-        best_tag_scores[token_id] = scored_cats[token_id].top().first;
+        best_tag_scores[token_id] = tag_in_scores(token_id, max_tag_id);
         best_dep_scores[token_id] = dep_in_scores(token_id, max_id);
         dep_leaf_out_score += dep_in_scores(token_id, max_id);
     }
 
+    // a word given its supertag has only that one, whose score is taken as the best
+    // (or is the best one if it is not in the tag set)
+    parsing::span_constraints span_constraints(length, constraints);
+    std::vector<scored_category> lexical_leaves;
+    for (unsigned token_id = 0; token_id < length; token_id++)
+    {
+        unsigned cat = span_constraints.lexical_category(token_id);
+        if (cat == UINT_MAX)
+            continue;
+        if (cat < config->num_tags)
+            best_tag_scores[token_id] = tag_in_scores(token_id, cat);
+        lexical_leaves.emplace_back(best_tag_scores[token_id], cat);
+    }
+
     compute_outside_probabilities(best_tag_scores, length, tag_out_scores);
     compute_outside_probabilities(best_dep_scores, length, dep_out_scores);
 
+    std::unique_ptr<parsing::dependency_bounds> dep_bounds;
+    if (config->heuristic == tight_heuristic)
+        dep_bounds.reset(new parsing::dependency_bounds(dep_in_scores, length));
+
+    // the estimate of the scores outside a span of `head`
+    auto out_score_of = [&](unsigned start_of_span, unsigned end_of_span, unsigned head)
+    {
+        if (dep_bounds)
+            return tag_out_scores(start_of_span, end_of_span) + (*dep_bounds)(start_of_span, end_of_span, head);
+        if (end_of_span - start_of_span == 1)
+            return tag_out_scores(start_of_span, end_of_span) + dep_leaf_out_score;
+        return tag_out_scores(start_of_span, end_of_span) +
+               dep_out_scores(start_of_span, end_of_span) -
+               best_dep_scores[head];
+    };
+
+    auto push_leaf = [&](unsigned token_id, const scored_category &score_and_cat)
+    {
+        agenda.push(
+            {false,
+             score_and_cat.second,
+             nullptr,
+             nullptr,
+             score_and_cat.first,
+             out_score_of(token_id, token_id + 1, token_id),
+             token_id,
+             1,
+             token_id});
+    };
+
+    auto lexical_leaf = lexical_leaves.begin();
     for (unsigned token_id = 0; token_id < length; token_id++)
     {
-        float threshold = config->use_beta ? scored_cats[token_id].top().first * config->beta : std::numeric_limits<float>::lowest();
-        float out_score = tag_out_scores(token_id, token_id + 1) + dep_leaf_out_score;
+        if (span_constraints.lexical_category(token_id) != UINT_MAX)
+            push_leaf(token_id, *lexical_leaf++);
+    }
 
-        for (unsigned i = 0; i < config->pruning_size && scored_cats[token_id].size(); i++)
+    if (candidates != nullptr)
+    {
+        // the supertags are already pruned in the same way as below
+        for (unsigned token_id = 0; token_id < length; token_id++)
+        {
+            if (span_constraints.lexical_category(token_id) != UINT_MAX)
+                continue;
+            for (unsigned i = candidates->offsets[token_id]; i < candidates->offsets[token_id + 1]; i++)
+                push_leaf(token_id, {candidates->scores[i], candidates->cats[i]});
+        }
+    }
+    else
+    {
+        for (unsigned token_id = 0; token_id < length; token_id++)
         {
-            auto score_and_cat = scored_cats[token_id].top();
-            scored_cats[token_id].pop();
-            if (std::exp(score_and_cat.first) > threshold)
+            if (span_constraints.lexical_category(token_id) != UINT_MAX)
+                continue;
+            std::priority_queue<scored_category> scored_cats;
+            for (unsigned category_id = 0; category_id < config->num_tags; category_id++)
+                scored_cats.emplace(tag_in_scores(token_id, category_id), category_id);
+
+            float threshold = config->use_beta ? scored_cats.top().first * config->beta : std::numeric_limits<float>::lowest();
+
+            for (unsigned i = 0; i < config->pruning_size && scored_cats.size(); i++)
             {
-                agenda.push(
-                    {false,
-                     score_and_cat.second,
-                     nullptr,
-                     nullptr,
-                     score_and_cat.first,
-                     out_score,
-                     token_id,
-                     1,
-                     token_id});
+                auto score_and_cat = scored_cats.top();
+                scored_cats.pop();
+                if (std::exp(score_and_cat.first) > threshold)
+                    push_leaf(token_id, score_and_cat);
+                else
+                    break;
             }
-            else
-                break;
         }
     }
 
-    parsing::chart chart(length, config->nbest > 1);
-    parsing::chart goal(1, config->nbest > 1);
+    // for the n-best parsing, the items of the same span and category are still merged
+    // in the chart, and the derivations are extracted from the hypergraph of the search
+    bool lazy_kbest = config->nbest > 1;
+    parsing::hypergraph hypergraph;
+    parsing::chart chart(length, false, config->span_beam);
+    parsing::chart goal(1, lazy_kbest);
+
+    // the search goes on after the first parse until the agenda has no item that
+    // can make a derivation better than the current n-th best one.
+    // the n-th best is found again only when the steps since the first parse double.
+    float kth_best_score = std::numeric_limits<float>::lowest();
+    unsigned first_goal_step = 0, next_kth_best_step = 0;
+    auto keep_searching = [&](unsigned s)
+    {
+        if (goal.empty())
+            return true;
+        if (!lazy_kbest)
+            return false;
+        if (s >= next_kth_best_step)
+        {
+            hypergraph.reset();
+            auto kth_best = hypergraph.kth_best(nullptr, config->nbest - 1);
+            if (kth_best != nullptr)
+                kth_best_score = kth_best->score;
+            next_kth_best_step = s + std::max(16u, s - first_goal_step);
+        }
+        return agenda.top().score() >= kth_best_score;
+    };
 
-    for (unsigned s = 0; s < config->max_step && goal.size() < config->nbest && agenda.size(); s++)
+    parse_status status = no_parse;
+    std::size_t max_agenda_size = agenda.size();
+    unsigned long num_pops = 0;
+    for (unsigned s = 0; agenda.size() && keep_searching(s); s++)
     {
+        if (s >= config->max_step)
+        {
+            status = max_step_reached;
+            break;
+        }
+        if (config->max_agenda_size > 0 && agenda.size() > config->max_agenda_size)
+        {
+            status = agenda_limit_reached;
+            break;
+        }
+        // checking the clock at every step is costly
+        if (config->timeout > 0 && s % 256 == 0 &&
+            std::chrono::duration<float>(std::chrono::steady_clock::now() - start_time).count() > config->timeout)
+        {
+            status = timed_out;
+            break;
+        }
+
+        max_agenda_size = std::max(max_agenda_size, agenda.size());
         parsing::cell_item top_item = agenda.top();
         agenda.pop();
+        num_pops++;
         if (top_item.fin)
         {
-            goal.update(0, 0, top_item);
+            if (goal.empty())
+                first_goal_step = next_kth_best_step = s;
+            auto item = goal.update(0, 0, top_item);
+            if (lazy_kbest)
+                hypergraph.add_goal(item);
             continue;
         }
 
-        parsing::cell_item *item;
-        if ((item = chart.update(top_item.start_of_span, top_item.span_length - 1, top_item)) != nullptr)
+        parsing::cell_item *item = chart.update(top_item.start_of_span, top_item.span_length - 1, top_item);
+        if (item == nullptr)
         {
-
-            if (item->span_length == length && possible_root_cats.count(item->cat))
+            if (lazy_kbest)
+            {
+                auto node = chart(top_item.start_of_span, top_item.span_length - 1).find(top_item.cat);
+                if (node != nullptr)
+                    hypergraph.add_alternative(node, top_item);
+            }
+        }
+        else
+        {
+            bool item_fits = span_constraints.fits(*item);
+            if (item->span_length == length && possible_root_cats.count(item->cat) && item_fits)
             {
                 agenda.push(
                     {true,
@@ -412,9 +1474,14 @@ unsigned parse_sentence(
             {
                 for (auto &other : *cell)
                 {
+                    if (combinable != nullptr && !combinable->combinable(item->cat, other.cat))
+                        continue;
                     unsigned span_length = item->span_length + other.span_length;
                     unsigned start_of_span = item->start_of_span;
                     unsigned end_of_span = start_of_span + span_length;
+                    if (!item_fits || !span_constraints.fits(other) ||
+                        span_constraints.crossing(start_of_span, end_of_span))
+                        continue;
 
                     for (auto &rule_result : *apply_binary_rules(item->cat, other.cat))
                     {
@@ -422,9 +1489,7 @@ unsigned parse_sentence(
                         auto child = rule_result.head_is_left ? &other : item;
                         float dep_score = dep_in_scores(child->head_id, head->head_id + 1);
                         float in_score = item->in_score + other.in_score + dep_score;
-                        float out_score = tag_out_scores(start_of_span, end_of_span) +
-                                          dep_out_scores(start_of_span, end_of_span) -
-                                          best_dep_scores[head->head_id];
+                        float out_score = out_score_of(start_of_span, end_of_span, head->head_id);
                         agenda.push(
                             {false,
                              rule_result.cat_id,
@@ -443,9 +1508,14 @@ unsigned parse_sentence(
             {
                 for (auto &other : *cell)
                 {
+                    if (combinable != nullptr && !combinable->combinable(other.cat, item->cat))
+                        continue;
                     unsigned span_length = item->span_length + other.span_length;
                     unsigned start_of_span = other.start_of_span;
                     unsigned end_of_span = start_of_span + span_length;
+                    if (!item_fits || !span_constraints.fits(other) ||
+                        span_constraints.crossing(start_of_span, end_of_span))
+                        continue;
 
                     for (auto &rule_result : *apply_binary_rules(other.cat, item->cat))
                     {
@@ -453,9 +1523,7 @@ unsigned parse_sentence(
                         auto child = rule_result.head_is_left ? item : &other;
                         float dep_score = dep_in_scores(child->head_id, head->head_id + 1);
                         float in_score = item->in_score + other.in_score + dep_score;
-                        float out_score = tag_out_scores(start_of_span, end_of_span) +
-                                          dep_out_scores(start_of_span, end_of_span) -
-                                          best_dep_scores[head->head_id];
+                        float out_score = out_score_of(start_of_span, end_of_span, head->head_id);
                         agenda.push(
                             {false,
                              rule_result.cat_id,
@@ -473,16 +1541,266 @@ unsigned parse_sentence(
         }
     }
 
+    if (stats != nullptr)
+    {
+        chart.add_memory_stats(stats);
+        goal.add_memory_stats(stats);
+        hypergraph.add_memory_stats(stats);
+        stats->agenda_size = max_agenda_size;
+    }
+
+    // the time taken to extract the parses is not included
+    if (search != nullptr)
+    {
+        search->pops = num_pops;
+        search->pushes = num_pops + agenda.size();
+        search->peak_agenda_size = max_agenda_size;
+        chart.count_items(search->chart_items);
+        search->seconds = std::chrono::duration<double>(
+                              std::chrono::steady_clock::now() - start_time)
+                              .count();
+    }
+
     if (goal.size() == 0)
-        return 1;
+    {
+        if (config->fallback == no_fallback)
+            return status;
+
+        std::vector<parsing::cell_item> leaves;
+        for (unsigned token_id = 0; token_id < length; token_id++)
+        {
+            unsigned cat = tag_in_scores.argmax(token_id);
+            leaves.push_back(
+                {false,
+                 cat,
+                 nullptr,
+                 nullptr,
+                 tag_in_scores(token_id, cat),
+                 0.0,
+                 token_id,
+                 1,
+                 token_id});
+        }
+
+        std::vector<parsing::cell_item *> fragments;
+        if (config->fallback == fragments_fallback)
+            fragments = parsing::fragment_cover(chart, leaves, length);
+        else
+        {
+            for (auto &leaf : leaves)
+                fragments.push_back(&leaf);
+        }
+
+        // each fragment is given to the finalizer in the same way as a parse
+        for (auto fragment : fragments)
+        {
+            parsing::cell_item root = {
+                true,
+                fragment->cat,
+                fragment,
+                nullptr,
+                fragment->in_score,
+                0.0,
+                fragment->start_of_span,
+                fragment->span_length,
+                fragment->head_id,
+                fragment->rule_id};
+            unsigned token_id = fragment->start_of_span;
+            finalizer_callback(&root, &token_id, &cache, finalizer_args);
+        }
+        return status;
+    }
+
+    if (lazy_kbest)
+    {
+        hypergraph.reset();
+        for (unsigned k = 0; k < config->nbest; k++)
+        {
+            auto kth_best = hypergraph.kth_best(nullptr, k);
+            if (kth_best == nullptr)
+                break;
+            unsigned token_id = 0;
+            finalizer_callback(hypergraph.build(*kth_best), &token_id, &cache, finalizer_args);
+        }
+        return success;
+    }
 
     parsing::chart::cell &cell = goal(0, 0);
     cell.sort();
     for (auto &item : cell)
     {
         unsigned token_id = 0;
-        finalizer_callback(&item, &token_id, cache, finalizer_args);
+        finalizer_callback(&item, &token_id, &cache, finalizer_args);
     }
 
-    return 0;
+    return success;
+}
+
+unsigned parse_sentence(
+    float *tag_scores,
+    float *dep_scores,
+    unsigned length,
+    const std::unordered_set<unsigned> &possible_root_cats,
+    void *binary_callback,
+    void *unary_callback,
+    finalizer_type finalizer_callback,
+    scaffold_type scaffold,
+    void *finalizer_args,
+    cache_type *cache,
+    config *config,
+    parsing::memory_stats *stats = nullptr,
+    const supertag_candidates *candidates = nullptr,
+    const sentence_constraints *constraints = nullptr,
+    parsing::search_stats *search = nullptr,
+    const parsing::combinable_index *combinable = nullptr)
+{
+    cache_view view(cache);
+    return parse_sentence(
+        tag_scores, dep_scores, length, possible_root_cats, binary_callback, unary_callback,
+        finalizer_callback, scaffold, finalizer_args, view, config, stats, candidates,
+        constraints, search, combinable);
+}
+
+// a sentence given to parse_sentences, whose `status` and `stats` are set by it
+// (and `search`, if `collect_search_stats`)
+// the members have initializers, as the sentences are declared (without initialization)
+// and filled in by Cython, which leaves the outputs `status`, `stats` and `search` unset
+struct sentence
+{
+    float *tag_scores = nullptr;
+    float *dep_scores = nullptr;
+    unsigned length = 0;
+    supertag_candidates candidates = {};
+    sentence_constraints constraints = {};
+    void *finalizer_args = nullptr;
+    unsigned status = 0;
+    parsing::memory_stats stats = {};
+    bool collect_search_stats = false;
+    parsing::search_stats search = {};
+};
+
+// called by parse_sentences with the numbers of the parsed sentences and of all the sentences,
+// which returns -1 if an error has occurred in it
+typedef int (*progress_type)(void *progress_callback, unsigned done, unsigned total);
+
+// parses the whole document in C++, and calls `progress` (if not null) when a sentence is done,
+// at most once in `progress_interval` seconds except for the last sentence.
+// with `num_threads` > 1, the sentences are parsed in as many threads, each taking the next
+// sentence in the order of `sentences` when it gets free. the threads share `cache`,
+// which is only read while they run, and the results missing in it are added after
+// all the sentences are parsed. `scaffold`, `finalizer_callback` and `progress` must be safe
+// to call from the threads then.
+void parse_sentences(
+    std::vector<sentence> &sentences,
+    const std::unordered_set<unsigned> &possible_root_cats,
+    void *binary_callback,
+    void *unary_callback,
+    finalizer_type finalizer_callback,
+    scaffold_type scaffold,
+    cache_type *cache,
+    config *config,
+    unsigned num_threads,
+    const parsing::combinable_index *combinable = nullptr,
+    progress_type progress = nullptr,
+    void *progress_callback = nullptr,
+    float progress_interval = 1.0)
+{
+    std::atomic<unsigned> next_sentence(0);
+    std::atomic<bool> failed(false);
+    std::vector<std::exception_ptr> errors(std::max(num_threads, 1u));
+
+    std::mutex progress_mutex;
+    unsigned num_done = 0;
+    auto last_progress = std::chrono::steady_clock::now();
+    auto report_progress = [&]()
+    {
+        std::lock_guard<std::mutex> lock(progress_mutex);
+        num_done++;
+        auto now = std::chrono::steady_clock::now();
+        if (num_done < sentences.size() &&
+            std::chrono::duration<float>(now - last_progress).count() < progress_interval)
+            return;
+        last_progress = now;
+        if (progress(progress_callback, num_done, sentences.size()) == -1)
+            throw std::runtime_error(
+                "some error has occurred in the progress callback.");
+    };
+
+    auto work = [&](unsigned thread_id, cache_view &view)
+    {
+        try
+        {
+            for (unsigned i = next_sentence++; i < sentences.size() && !failed; i = next_sentence++)
+            {
+                sentence &sentence_ = sentences[i];
+                sentence_.stats = {0, 0, 0, 0};
+                sentence_.status = parse_sentence(
+                    sentence_.tag_scores,
+                    sentence_.dep_scores,
+                    sentence_.length,
+                    possible_root_cats,
+                    binary_callback,
+                    unary_callback,
+                    finalizer_callback,
+                    scaffold,
+                    sentence_.finalizer_args,
+                    view,
+                    config,
+                    &sentence_.stats,
+                    &sentence_.candidates,
+                    &sentence_.constraints,
+                    sentence_.collect_search_stats ? &sentence_.search : nullptr,
+                    combinable);
+                if (progress != nullptr)
+                    report_progress();
+            }
+        }
+        catch (...)
+        {
+            errors[thread_id] = std::current_exception();
+            failed = true;
+        }
+    };
+
+    if (num_threads <= 1)
+    {
+        // the cache is updated directly
+        cache_view view(cache);
+        work(0, view);
+    }
+    else
+    {
+        std::mutex mutex;
+        cache_type pending;
+        std::vector<cache_stats> stats(num_threads, {0, 0, 0});
+        auto work_in_thread = [&](unsigned thread_id)
+        {
+            cache_type local;
+            cache_view view(cache, &local, &pending, &mutex, &stats[thread_id]);
+            work(thread_id, view);
+        };
+
+        std::vector<std::thread> threads;
+        for (unsigned thread_id = 1; thread_id < num_threads; thread_id++)
+            threads.emplace_back(work_in_thread, thread_id);
+        work_in_thread(0);
+        for (auto &thread : threads)
+            thread.join();
+
+        cache->reserve(cache->size() + pending.size());
+        pending.for_each([&](const cache_type::key_type &key, const cache_type::results_type &results)
+                         { cache->emplace(key, results); });
+        for (auto &thread_stats : stats)
+        {
+            cache->stats.hits += thread_stats.hits;
+            cache->stats.misses += thread_stats.misses;
+            cache->stats.probes += thread_stats.probes;
+        }
+    }
+
+    for (auto &error : errors)
+    {
+        if (error)
+            std::rethrow_exception(error);
+    }
 }
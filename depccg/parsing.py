@@ -1,24 +1,58 @@
-from typing import Callable, List, Dict, Union, Tuple
-from multiprocessing import Pool
+from typing import Callable, List, Dict, Union, Tuple, Optional, Any, TextIO
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.pool import AsyncResult
+from multiprocessing.shared_memory import SharedMemory
 import numpy
+from tqdm import tqdm
 import depccg._parsing
-import time
+import json
 import math
-from depccg.types import Token, CombinatorResult, ScoringResult
+from depccg.types import Token, CombinatorResult, ScoringResult, ParseStatus, SearchStats
 from depccg.tree import ScoredTree
 from depccg.cat import Category
+from depccg.utils import SpanInfo
+from depccg.grammar import grammar_spec_of
+from depccg.grammar.cache import CombinatorCache, grammar_fingerprint_of
 
 
-def _chunks(list_, num_chunks):
-    splits = math.ceil(len(list_) / max(num_chunks, 1))
-    for i in range(0, len(list_), splits):
-        yield list_[i:i + splits]
+def _work_units(lengths, num_processes, max_unit_size):
+    """split sentence indices into small units for dynamic scheduling.
+    since parsing time grows super-linearly with the length of a sentence,
+    the longest sentences are dispatched first so that they do not end up
+    in the last unit that one worker is left to process alone.
+    """
+    unit_size = max(
+        1, min(max_unit_size, math.ceil(len(lengths) / (num_processes * 4)))
+    )
+    order = sorted(range(len(lengths)), key=lambda index: -lengths[index])
+    for i in range(0, len(order), unit_size):
+        yield order[i:i + unit_size]
+
 
+def _pack_scores(score_results):
+    """copy the score matrices of all the sentences into one float32 array
+    in shared memory, where the tag scores and then the dependency scores of
+    the i-th sentence start at offsets[i] (counted in elements).
+    """
+    offsets = numpy.zeros(len(score_results) + 1, dtype=numpy.int64)
+    for index, (tag_scores, dep_scores) in enumerate(score_results):
+        offsets[index + 1] = offsets[index] + tag_scores.size + dep_scores.size
 
-def _binarize(indices, length):
-    result = numpy.ones(length, dtype=numpy.bool)
-    result[indices] = 0
-    return result
+    itemsize = numpy.dtype(numpy.float32).itemsize
+    memory = SharedMemory(create=True, size=max(int(offsets[-1]) * itemsize, 1))
+    arena = numpy.ndarray(offsets[-1], dtype=numpy.float32, buffer=memory.buf)
+    try:
+        for offset, (tag_scores, dep_scores) in zip(offsets, score_results):
+            tag_end = offset + tag_scores.size
+            arena[offset:tag_end] = tag_scores.ravel()
+            arena[tag_end:tag_end + dep_scores.size] = dep_scores.ravel()
+    except BaseException:
+        del arena
+        memory.close()
+        memory.unlink()
+        raise
+    del arena
+    return memory, offsets
 
 
 def _type_check(doc, score_results, categories):
@@ -66,35 +100,336 @@ def _type_check(doc, score_results, categories):
     return doc, score_results
 
 
+class CategoryFilter(object):
+    """a category dictionary compiled for a supertag set, which is built once
+    and applied to many documents.
+
+    Args:
+        categories (List[Category]): the supertag set of the scores to be filtered
+        category_dict (Dict[str, List[Category]]): words and the only categories allowed for them
+    """
+
+    def __init__(
+        self,
+        categories: List[Category],
+        category_dict: Dict[str, List[Category]],
+    ) -> None:
+        category_ids = {
+            cat: index for index, cat in enumerate(categories)
+        }
+        self.categories = categories
+        self.word_ids = {
+            word: index for index, word in enumerate(category_dict)
+        }
+        # the last row is for the words not in the dictionary
+        self.masks = numpy.zeros(
+            (len(category_dict) + 1, len(categories)), dtype=bool
+        )
+        self.masks[:-1] = True
+        for word, cats in category_dict.items():
+            self.masks[self.word_ids[word], [category_ids[cat] for cat in cats]] = False
+
+    def __call__(
+        self,
+        doc: List[List[Token]],
+        score_results: List[ScoringResult],
+        large_negative_value: float = -10e+32,
+    ) -> None:
+        """set `large_negative_value` to the scores of the categories that are
+        not allowed for the words in the dictionary, in place.
+        """
+        unknown = len(self.word_ids)
+        word_ids = numpy.array(
+            [
+                self.word_ids.get(token.word, unknown)
+                for tokens in doc
+                for token in tokens
+            ],
+            dtype=numpy.int64,
+        )
+
+        offset = 0
+        for tokens, (tag_scores, _) in zip(doc, score_results):
+            sentence_word_ids = word_ids[offset:offset + len(tokens)]
+            offset += len(tokens)
+            indices = numpy.nonzero(sentence_word_ids != unknown)[0]
+            if len(indices) > 0:
+                tag_scores[indices] = numpy.where(
+                    self.masks[sentence_word_ids[indices]],
+                    large_negative_value,
+                    tag_scores[indices],
+                )
+
+
 def apply_category_filters(
     doc: Union[Token, List[List[Token]]],
     score_results: Union[ScoringResult, List[ScoringResult]],
     categories: List[Category],
-    category_dict: Dict[str, List[Category]],
+    category_dict: Union[Dict[str, List[Category]], CategoryFilter],
     large_negative_value: float = -10e+32,
 ) -> Union[Tuple[List[Token], ScoringResult], Tuple[List[List[Token]], List[ScoringResult]]]:
+    """filter out the categories not in the category dictionary from the scores.
+    pass a CategoryFilter as `category_dict` to avoid compiling the dictionary every time.
+    """
 
     doc, score_results = _type_check(doc, score_results, categories)
 
-    category_ids = {
-        cat: index for index, cat in enumerate(categories)
+    if not isinstance(category_dict, CategoryFilter):
+        category_dict = CategoryFilter(categories, category_dict)
+    elif (
+        category_dict.categories is not categories
+        and category_dict.categories != categories
+    ):
+        raise RuntimeError(
+            'the CategoryFilter is built for a different list of categories.'
+        )
+
+    category_dict(doc, score_results, large_negative_value)
+    return doc, score_results
+
+
+def _parser_kwargs(
+    categories: List[Category],
+    binary_fun: Callable[[Category, Category], List[CombinatorResult]],
+    unary_fun: Callable[[Category], List[CombinatorResult]],
+    unary_penalty: float = 0.1,
+    beta: float = 0.00001,
+    use_beta: bool = True,
+    pruning_size: int = 50,
+    nbest: int = 1,
+    max_step: int = 10000000,
+    max_length: int = 250,
+    max_agenda_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+    span_beam: Optional[int] = None,
+    fallback: Optional[str] = None,
+    heuristic: str = 'default',
+    native_grammar: bool = False,
+    combinator_cache: Optional[str] = None,
+    num_threads: int = 1,
+) -> Dict[str, Any]:
+
+    kwargs = {
+        'num_tags': len(categories),
+        'unary_penalty': unary_penalty,
+        'beta': beta,
+        'use_beta': use_beta,
+        'pruning_size': pruning_size,
+        'nbest': nbest,
+        'max_step': max_step,
+        'max_length': max_length,
+        'max_agenda_size': max_agenda_size,
+        'timeout': timeout,
+        'span_beam': span_beam,
+        'fallback': fallback,
+        'heuristic': heuristic,
+        'num_threads': num_threads,
     }
 
-    category_dict = {
-        word: _binarize(
-            [category_ids[cat] for cat in cats],
-            score_results[0].tag_scores.shape[1]
+    if native_grammar:
+        # the combinators are run in C++ without calling back `binary_fun` and `unary_fun`
+        kwargs['native_grammar'] = tuple(grammar_spec_of(binary_fun, unary_fun))
+
+    if combinator_cache is not None:
+        # path to a CombinatorCache, which is memory-mapped and loaded in each process.
+        # it is verified here as well, as the errors in the workers' initializers are lost
+        CombinatorCache.load(combinator_cache).verify(
+            grammar_fingerprint_of(categories, binary_fun, unary_fun)
         )
-        for word, cats in category_dict.items()
-    }
+        kwargs['combinator_cache'] = str(combinator_cache)
 
-    for tokens, (tag_scores, _) in zip(doc, score_results):
-        for index, token in enumerate(tokens):
-            if token.word in category_dict:
-                tag_scores[index, category_dict[token.word]
-                           ] = large_negative_value
+    return kwargs
 
-    return doc, score_results
+
+_worker_parser = None
+
+
+def _init_worker(args, kwargs):
+    global _worker_parser
+    _worker_parser = depccg._parsing.Parser(*args, **kwargs)
+
+
+def _parse_in_worker(doc, score_results, return_status, constraints, return_stats):
+    return _worker_parser.parse_doc(
+        doc,
+        score_results,
+        return_status=return_status,
+        constraints=constraints,
+        return_stats=return_stats,
+    )
+
+
+def _parse_unit_in_worker(unit):
+    indices, lengths, arena_name, offsets, constraints, return_stats = unit
+    memory = SharedMemory(name=arena_name)
+    arena = None
+    try:
+        # the trees are built in the main process, which has the tokens
+        arena = numpy.frombuffer(memory.buf, dtype=numpy.float32)
+        results, statuses, *stats = _worker_parser.parse_packed(
+            arena,
+            offsets,
+            lengths,
+            return_status=True,
+            constraints=constraints,
+            return_stats=return_stats,
+        )
+    finally:
+        # the array must be released before closing the shared memory,
+        # also when parsing fails, or the error is masked by a BufferError
+        del arena
+        memory.close()
+    return indices, results, statuses, stats[0] if return_stats else None
+
+
+class ParserPool(object):
+    """a pool of worker processes, each of which keeps a `depccg._parsing.Parser`
+    (the categories, the grammar and the cache of combinator results) alive across calls.
+    This avoids setting up the parser and starting from an empty cache every time
+    many documents are parsed with the same grammar (e.g., in a server).
+
+    Args:
+        categories (List[Category]): the supertag set of the scores given to `map` and `submit`
+        root_categories (List[Category]): categories allowed at the root of a tree
+        binary_fun, unary_fun: combinators (see `run`)
+        processes (int, optional): the number of worker processes. Defaults to 2.
+        max_unit_size (int, optional): the maximum number of sentences sent to a worker
+        at a time in `map`. Defaults to 16.
+        other keyword arguments are the parsing configuration (see `run`)
+
+    The pool must be shut down by `close`, or used in a `with` statement.
+    """
+
+    def __init__(
+        self,
+        categories: List[Category],
+        root_categories: List[Category],
+        binary_fun: Callable[[Category, Category], List[CombinatorResult]],
+        unary_fun: Callable[[Category], List[CombinatorResult]],
+        processes: int = 2,
+        max_unit_size: int = 16,
+        **kwargs,
+    ) -> None:
+        self.categories = categories
+        self.processes = processes
+        self.max_unit_size = max_unit_size
+        args = (categories, binary_fun, unary_fun, root_categories)
+        # the workers must share the resource tracker with this process, which
+        # otherwise regards the shared memory used in `map` as leaked by them
+        resource_tracker.ensure_running()
+        self._pool = Pool(
+            processes,
+            initializer=_init_worker,
+            initargs=(
+                args,
+                _parser_kwargs(categories, binary_fun, unary_fun, **kwargs),
+            ),
+        )
+
+    def submit(
+        self,
+        doc: List[List[Token]],
+        score_results: List[ScoringResult],
+        return_status: bool = False,
+        constraints: Optional[List[Optional[List[SpanInfo]]]] = None,
+        return_stats: bool = False,
+    ) -> AsyncResult:
+        """parse `doc` in one of the workers asynchronously.
+        `get()` of the returned object gives the results as in `run`.
+        """
+        doc, score_results = _type_check(doc, score_results, self.categories)
+        return self._pool.apply_async(
+            _parse_in_worker,
+            args=(doc, score_results, return_status, constraints, return_stats),
+        )
+
+    def map(
+        self,
+        doc: Union[List[Token], List[List[Token]]],
+        score_results: Union[ScoringResult, List[ScoringResult]],
+        return_status: bool = False,
+        return_derivations: bool = False,
+        constraints: Optional[List[Optional[List[SpanInfo]]]] = None,
+        return_stats: bool = False,
+        progress: Optional[Callable[[int, int], Any]] = None,
+    ) -> Union[List[List[ScoredTree]], Tuple[List[List[ScoredTree]], List[ParseStatus]]]:
+        """parse `doc` by distributing it over the workers, and return the results
+        in the order of the input sentences. The sentences are sent to idle workers
+        in small units of at most `max_unit_size` sentences, the longest first,
+        and `progress(done, total)` is called when the results of a unit come back.
+
+        The score matrices are not pickled but packed into shared memory,
+        which the workers parse directly (see `Parser.parse_packed`), and the workers
+        send back the derivations as flat arrays (see `Derivations`), from which
+        the trees are built here.
+        """
+        doc, score_results = _type_check(doc, score_results, self.categories)
+        memory, offsets = _pack_scores(score_results)
+        units = (
+            (
+                indices,
+                [len(doc[index]) for index in indices],
+                memory.name,
+                [int(offsets[index]) for index in indices],
+                None if constraints is None else [constraints[index] for index in indices],
+                return_stats,
+            )
+            for indices in _work_units(
+                [len(tokens) for tokens in doc],
+                self.processes,
+                self.max_unit_size,
+            )
+        )
+
+        results = [None] * len(doc)
+        statuses = [None] * len(doc)
+        stats = [None] * len(doc)
+        num_done = 0
+        try:
+            for indices, unit_results, unit_statuses, unit_stats in self._pool.imap_unordered(
+                _parse_unit_in_worker, units
+            ):
+                for position, index in enumerate(indices):
+                    unit_results[position].tokens = doc[index]
+                    results[index] = unit_results[position]
+                    statuses[index] = unit_statuses[position]
+                    if return_stats:
+                        stats[index] = unit_stats[position]
+                num_done += len(indices)
+                if progress is not None:
+                    progress(num_done, len(doc))
+        finally:
+            memory.close()
+            memory.unlink()
+
+        if not return_derivations:
+            results = [derivations.scored_trees() for derivations in results]
+
+        outputs = (results,)
+        if return_status:
+            outputs += (statuses,)
+        if return_stats:
+            outputs += (stats,)
+        return outputs if len(outputs) > 1 else results
+
+    def close(self) -> None:
+        """wait for the submitted tasks to finish and stop the workers."""
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self) -> None:
+        """stop the workers immediately, discarding unfinished tasks."""
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self) -> 'ParserPool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
 
 
 def run(
@@ -111,59 +446,172 @@ def run(
     nbest: int = 1,
     max_step: int = 10000000,
     max_length: int = 250,
+    max_agenda_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+    span_beam: Optional[int] = None,
+    fallback: Optional[str] = None,
+    heuristic: str = 'default',
     processes: int = 2,
     max_chunk_size: int = 20,
-) -> List[List[ScoredTree]]:
+    native_grammar: bool = False,
+    combinator_cache: Optional[str] = None,
+    num_threads: int = 1,
+    pool: Optional[ParserPool] = None,
+    return_status: bool = False,
+    return_derivations: bool = False,
+    constraints: Optional[List[Optional[List[SpanInfo]]]] = None,
+    return_stats: bool = False,
+    progress: Optional[Callable[[int, int], Any]] = None,
+) -> Union[List[List[ScoredTree]], Tuple[List[List[ScoredTree]], List[ParseStatus]]]:
+    """parse sentences with the A* algorithm.
+
+    When `nbest` > 1, the items of the same span and category are merged in the chart
+    as in the 1-best search, and the n-best derivations are extracted lazily
+    from the hypergraph of the search, which goes on until no item in the agenda
+    can make a better derivation than the n-th best one.
+
+    When `max_agenda_size` (the number of items in the agenda), `timeout` (seconds per
+    sentence) or `max_step` is exceeded, the parser gives up the sentence,
+    and `span_beam` limits the number of items kept in each span of the chart.
+    If `return_status` is True, the ParseStatus of each sentence, which tells
+    the limit that made it fail, is returned together with the results.
+    If `return_stats` is True, the SearchStats of each sentence (e.g., the numbers
+    of the agenda pops and the cache misses, and the time spent in the combinators)
+    are also returned after them (see `write_stats`).
+
+    A sentence that fails is given a tree of the "FAILED" word by default.
+    When `fallback` is "fragments", it is given instead the fewest items in the chart
+    covering the sentence, and when it is "supertags", the most probable supertags,
+    which are joined into a tree with the `fragment` rule (see `Derivations.scored_trees`).
+
+    The A* search is guided by an estimate of the scores outside each item. By default
+    it is the sum of the best tag and dependency scores of the words outside the span
+    (and of the head). With `heuristic="tight"`, the dependency part takes it into account
+    that the words outside can only depend on the head of the span, which depends on
+    a word outside it, and that no word depends on itself. This estimate is still
+    admissible, so the best parse is still found, and far fewer items are expanded
+    in long sentences at the cost of computing it for each span and head.
+
+    With `num_threads` > 1, the sentences given to each process are parsed in as many
+    threads (use `processes=1` to parse all of them in this process), which share
+    one cache of combinator results. The Python combinators are called from the threads
+    one at a time, so it scales with `native_grammar`.
+
+    The whole document is parsed in C++, which calls `progress(done, total)`
+    (e.g., a `ProgressBar`) with the numbers of the parsed sentences from time to time.
+
+    If `return_derivations` is True, the n-best derivations of each sentence are
+    returned as a `Derivations` object instead of ScoredTree's, which keeps them
+    in flat arrays and builds the trees only on demand.
+
+    `constraints` gives each sentence (or None for unconstrained ones) the spans
+    read from its partial annotation by `depccg.utils.read_partial_tree`.
+    The parser then only builds trees that have a constituent over each bracketed span
+    (of the category if it is given) and the annotated categories at the words.
+    """
 
     doc, score_results = _type_check(doc, score_results, categories)
 
-    args = (
-        categories,
-        binary_fun,
-        unary_fun,
-        root_categories
-    )
+    if pool is not None:
+        # the parsing configuration of the pool is used
+        return pool.map(
+            doc,
+            score_results,
+            return_status=return_status,
+            return_derivations=return_derivations,
+            constraints=constraints,
+            return_stats=return_stats,
+            progress=progress,
+        )
 
     kwargs = {
-        'num_tags': score_results[0][0].shape[1],
         'unary_penalty': unary_penalty,
         'beta': beta,
         'use_beta': use_beta,
         'pruning_size': pruning_size,
         'nbest': nbest,
         'max_step': max_step,
-        'max_length': max_length
+        'max_length': max_length,
+        'max_agenda_size': max_agenda_size,
+        'timeout': timeout,
+        'span_beam': span_beam,
+        'fallback': fallback,
+        'heuristic': heuristic,
+        'native_grammar': native_grammar,
+        'combinator_cache': combinator_cache,
+        'num_threads': num_threads,
     }
 
-    if len(doc) <= max_chunk_size:
+    if len(doc) <= max_chunk_size or processes <= 1:
+        parser = depccg._parsing.Parser(
+            categories,
+            binary_fun,
+            unary_fun,
+            root_categories,
+            **_parser_kwargs(categories, binary_fun, unary_fun, **kwargs),
+        )
+        return parser.parse_doc(
+            doc,
+            score_results,
+            return_status=return_status,
+            return_derivations=return_derivations,
+            constraints=constraints,
+            return_stats=return_stats,
+            progress=progress,
+        )
 
-        results = depccg._parsing.run(
+    with ParserPool(
+        categories,
+        root_categories,
+        binary_fun,
+        unary_fun,
+        processes=processes,
+        **kwargs,
+    ) as pool:
+        return pool.map(
             doc,
             score_results,
-            *args,
-            **kwargs,
+            return_status=return_status,
+            return_derivations=return_derivations,
+            constraints=constraints,
+            return_stats=return_stats,
+            progress=progress,
         )
 
-    else:
-        chunks = _chunks(list(zip(doc, score_results)), processes)
-        with Pool(processes) as pool:
-            tasks = []
-            for chunk_index, chunk in enumerate(chunks):
-                doc_, score_results_ = zip(*chunk)
-                task = pool.apply_async(
-                    depccg._parsing.run,
-                    args=(list(doc_), list(score_results_)) + args,
-                    kwds={**kwargs, 'process_id': chunk_index},
-                )
-                tasks.append(task)
 
-            while not all(task.ready() for task in tasks):
-                time.sleep(1)
+class ProgressBar(object):
+    """a `progress` callback of `run` that shows the progress with tqdm.
+    The keyword arguments are given to `tqdm`, which is made anew for each call of `run`.
+    """
+
+    def __init__(self, **kwargs) -> None:
+        self.kwargs = kwargs
+        self._bar = None
+
+    def __call__(self, done: int, total: int) -> None:
+        if self._bar is None:
+            self._bar = tqdm(total=total, **self.kwargs)
+        self._bar.update(done - self._bar.n)
+        if done >= total:
+            self._bar.close()
+            self._bar = None
 
-            results = [
-                result
-                for task in tasks
-                for result in task.get()
-            ]
 
-    return results
+def write_stats(
+    file: TextIO,
+    stats: List[SearchStats],
+    doc: Optional[List[List[Token]]] = None,
+    start_index: int = 0,
+    indices: Optional[List[int]] = None,
+) -> None:
+    """write the SearchStats returned by `run` to `file` in JSON lines,
+    with the index of each sentence (from `start_index`) and its words if `doc` is given.
+    When the sentences are a subset of a larger document (e.g., the deduplicated ones),
+    `indices` gives their positions in that document, which are written instead.
+    """
+    for index, sentence_stats in enumerate(stats):
+        json_dict = {'index': start_index + (index if indices is None else indices[index])}
+        if doc is not None:
+            json_dict['sentence'] = ' '.join(token.word for token in doc[index])
+        json_dict.update(sentence_stats.to_json())
+        print(json.dumps(json_dict), file=file)
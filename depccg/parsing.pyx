@@ -5,13 +5,17 @@ from libcpp.vector cimport vector
 from libcpp.utility cimport pair
 from libcpp.unordered_set cimport unordered_set
 from libcpp.unordered_map cimport unordered_map
+from libc.string cimport memcpy
 cimport numpy as np
 import copy
+import numpy
 
-from tqdm import tqdm
-from depccg.tree import Tree, ScoredTree
+from depccg.tree import Derivations
 from depccg.cat import Category
-from depccg.types import ScoringResult
+from depccg.types import ScoringResult, CombinatorResult, ParseStatus, SearchStats
+from depccg.grammar import GrammarSpec, grammar_spec_of, seen_rule_classes
+from depccg.grammar.cache import CombinatorCache, grammar_fingerprint
+from depccg.utils import prune_supertags
 
 cdef extern from "<limits>":
     cdef unsigned UINT_MAX
@@ -32,6 +36,12 @@ cdef extern from "depccg/parsing.h" namespace "parsing":
 
         float score()
 
+    cdef struct memory_stats:
+        unsigned long num_items
+        unsigned long num_blocks
+        unsigned long chart_bytes
+        unsigned long agenda_size
+
 
 cdef extern from "depccg/parsing.h":
     cdef struct combinator_result:
@@ -41,11 +51,54 @@ cdef extern from "depccg/parsing.h":
         string op_string
         string op_symbol
 
-    ctypedef unordered_map[pair[unsigned, unsigned], vector[combinator_result]] cache_type
+    cdef struct cache_stats:
+        unsigned long hits
+        unsigned long misses
+        unsigned long probes
+
+
+cdef extern from "depccg/parsing.h" namespace "parsing":
+    cdef struct search_stats:
+        unsigned long pops
+        unsigned long pushes
+        unsigned long peak_agenda_size
+        cache_stats binary_lookups
+        cache_stats unary_lookups
+        double callback_seconds
+        double seconds
+        vector[unsigned long] chart_items
+
+
+cdef extern from "depccg/parsing.h" namespace "parsing":
+    cdef cppclass combinable_index:
+        void build(
+            const vector[unsigned] &left_classes,
+            const vector[unsigned] &right_classes,
+            const vector[pair[unsigned, unsigned]] &pairs,
+        ) except +
+        size_t size()
+
+
+cdef extern from "depccg/parsing.h":
+
+    cdef cppclass cache_type:
+        cache_stats stats
+        size_t size()
+        size_t capacity()
+        void reserve(size_t size) except +
+        void set_unary_table(const vector[vector[combinator_result]] &table) except +
+        size_t unary_table_size()
+        const vector[combinator_result] *emplace(
+            const pair[unsigned, unsigned] &key,
+            const vector[combinator_result] &results,
+        ) except +
 
-    ctypedef int (*scaffold_type)(void *callback_func, unsigned x, unsigned y, vector[combinator_result] *results) except -1
+    ctypedef int (*scaffold_type)(void *callback_func, unsigned x, unsigned y, vector[combinator_result] *results) nogil except -1
 
-    ctypedef unsigned (*finalizer_type)(cell_item *, unsigned *, cache_type *cache, void *)
+    cdef cppclass cache_view:
+        pass
+
+    ctypedef unsigned (*finalizer_type)(cell_item *, unsigned *, const cache_view *cache, void *)
 
     cdef struct config:
         unsigned num_tags
@@ -55,19 +108,148 @@ cdef extern from "depccg/parsing.h":
         unsigned pruning_size
         unsigned nbest
         unsigned max_step
+        unsigned long max_agenda_size
+        float timeout
+        unsigned span_beam
+        unsigned fallback
+        unsigned heuristic
+
+    cdef struct supertag_candidates:
+        const unsigned *offsets
+        const unsigned *cats
+        const float *scores
+
+    cdef struct span_constraint:
+        unsigned start
+        unsigned length
+        unsigned cat
+        bint lexical
+
+    cdef struct sentence_constraints:
+        const span_constraint *spans
+        unsigned size
 
-    cdef unsigned parse_sentence(
-        float *tag_scores,
-        float *dep_scores,
-        unsigned length,
+    cdef struct derivation_node:
+        unsigned cat
+        unsigned op
+        int left
+        int right
+        unsigned head
+        unsigned start
+        unsigned length
+
+    cdef cppclass derivation_buffer:
+        vector[derivation_node] nodes
+        vector[unsigned] roots
+        vector[float] scores
+        vector[pair[string, string]] ops
+        void clear()
+
+    cdef unsigned flatten_derivation(cell_item *, unsigned *, const cache_view *cache, void *)
+
+    ctypedef int (*progress_type)(void *progress_callback, unsigned done, unsigned total) except -1
+
+    cdef struct sentence:
+        float *tag_scores
+        float *dep_scores
+        unsigned length
+        supertag_candidates candidates
+        sentence_constraints constraints
+        void *finalizer_args
+        unsigned status
+        memory_stats stats
+        bint collect_search_stats
+        search_stats search
+
+    cdef void parse_sentences(
+        vector[sentence] &sentences,
         const unordered_set[unsigned] &possible_root_cats,
         void *binary_callback,
         void *unary_callback,
         finalizer_type finalizer_callback,
         scaffold_type scaffold,
-        void *finalizer_args,
         cache_type *cache,
-        config *config) except +
+        config *config,
+        unsigned num_threads,
+        const combinable_index *combinable,
+        progress_type progress,
+        void *progress_callback,
+        float progress_interval) nogil except +
+
+
+cdef extern from "depccg/grammar.h" namespace "grammar":
+    cdef cppclass grammar:
+        bint use_seen_rules
+        unsigned intern(const string &text) except +
+        string to_string(unsigned id) except +
+        unsigned size()
+        void add_seen_rule(const string &x, const string &y) except +
+        void add_unary_rule(const string &x, const string &y) except +
+        void apply_binary_rules(unsigned x, unsigned y, vector[combinator_result] *results) except +
+        void apply_unary_rules(unsigned x, vector[combinator_result] *results) except +
+
+    grammar *make_grammar(const string &lang) except +
+
+    int apply_rules(void *grammar, unsigned x, unsigned y, vector[combinator_result] *results) nogil except -1
+
+
+cdef class NativeGrammar:
+    """
+    combinators implemented in C++ (depccg/grammar.h).
+    the ids of categories are assigned in the order they are added by `add` or
+    produced by the combinators, and `NativeGrammar[id]` gives its Category object.
+    """
+    cdef grammar *c_grammar
+    cdef list categories
+
+    def __cinit__(self, str lang, object seen_rules, list unary_rules):
+        self.c_grammar = make_grammar(lang.encode('utf-8'))
+        self.categories = []
+        if seen_rules is not None:
+            self.c_grammar.use_seen_rules = True
+            for x, y in seen_rules:
+                self.c_grammar.add_seen_rule(x.encode('utf-8'), y.encode('utf-8'))
+        for x, y in unary_rules:
+            self.c_grammar.add_unary_rule(x.encode('utf-8'), y.encode('utf-8'))
+
+    def __dealloc__(self):
+        del self.c_grammar
+
+    def add(self, cat) -> int:
+        return self.c_grammar.intern(str(cat).encode('utf-8'))
+
+    def __len__(self):
+        return self.c_grammar.size()
+
+    def __getitem__(self, unsigned index):
+        while len(self.categories) <= index:
+            self.categories.append(
+                Category.parse(
+                    self.c_grammar.to_string(len(self.categories)).decode('utf-8')
+                )
+            )
+        return self.categories[index]
+
+    cdef list _to_python(self, vector[combinator_result] &results):
+        return [
+            CombinatorResult(
+                cat=self[result.cat_id],
+                op_string=result.op_string.decode('utf-8'),
+                op_symbol=result.op_symbol.decode('utf-8'),
+                head_is_left=result.head_is_left,
+            )
+            for result in results
+        ]
+
+    def apply_binary_rules(self, x, y) -> List[CombinatorResult]:
+        cdef vector[combinator_result] results
+        self.c_grammar.apply_binary_rules(self.add(x), self.add(y), &results)
+        return self._to_python(results)
+
+    def apply_unary_rules(self, x) -> List[CombinatorResult]:
+        cdef vector[combinator_result] results
+        self.c_grammar.apply_unary_rules(self.add(x), &results)
+        return self._to_python(results)
 
 
 cdef int scaffold(
@@ -75,7 +257,7 @@ cdef int scaffold(
     unsigned x,
     unsigned y,
     vector[combinator_result] *results,
-) except -1:
+) except -1 with gil:
     cdef list py_results
     cdef cat_id, rule_id
     cdef bint head_is_left
@@ -92,6 +274,73 @@ cdef int scaffold(
     return 0;
 
 
+cdef int report_progress(void *progress_callback, unsigned done, unsigned total) except -1 with gil:
+    (<object>progress_callback)(done, total)
+    return 0
+
+
+cdef warm_up_cache(cache_type *c_cache, str path, object add_category, object fingerprint):
+    """
+    fill the cache with the entries of a CombinatorCache saved in `path`.
+    `add_category` maps a category string to its id used in this parser,
+    and `fingerprint` is the `grammar_fingerprint` of its grammar and categories.
+    """
+    cache = CombinatorCache.load(path)
+    cache.verify(fingerprint)
+    cdef vector[unsigned] ids = [add_category(cat) for cat in cache.categories]
+    cdef vector[pair[string, string]] ops = [
+        (op_string.encode('utf-8'), op_symbol.encode('utf-8'))
+        for op_string, op_symbol in cache.ops
+    ]
+    cdef const unsigned[:] lefts = cache.keys['left']
+    cdef const unsigned[:] rights = cache.keys['right']
+    cdef const unsigned[:] starts = cache.keys['start']
+    cdef const unsigned[:] ends = cache.keys['end']
+    cdef const unsigned[:] cats = cache.results['cat']
+    cdef const unsigned[:] op_ids = cache.results['op']
+    cdef const unsigned char[:] heads = cache.results['head_is_left']
+    cdef pair[unsigned, unsigned] key
+    cdef vector[combinator_result] results
+    cdef combinator_result c_result
+    cdef unsigned i, j
+
+    c_cache.reserve(c_cache.size() + lefts.shape[0])
+    for i in range(lefts.shape[0]):
+        key.first = ids[lefts[i]]
+        key.second = UINT_MAX if rights[i] == UINT_MAX else ids[rights[i]]
+        results.clear()
+        for j in range(starts[i], ends[i]):
+            c_result.cat_id = ids[cats[j]]
+            c_result.rule_id = j - starts[i]
+            c_result.head_is_left = heads[j]
+            c_result.op_string = ops[op_ids[j]].first
+            c_result.op_symbol = ops[op_ids[j]].second
+            results.push_back(c_result)
+        c_cache.emplace(key, results)
+
+
+_fallback_types = {None: 0, 'fragments': 1, 'supertags': 2}
+
+_heuristic_types = {'default': 0, 'tight': 1}
+
+
+cdef object _search_stats(search_stats &c_search, unsigned length, object status):
+    return SearchStats(
+        length,
+        status,
+        c_search.pops,
+        c_search.pushes,
+        c_search.peak_agenda_size,
+        list(c_search.chart_items),
+        c_search.binary_lookups.hits,
+        c_search.binary_lookups.misses,
+        c_search.unary_lookups.hits,
+        c_search.unary_lookups.misses,
+        c_search.callback_seconds,
+        c_search.seconds,
+    )
+
+
 cdef init_config(config *c_config, dict kwargs):
     c_config.num_tags = kwargs['num_tags']
     c_config.unary_penalty = kwargs.pop('unary_penalty', 0.1)
@@ -100,197 +349,545 @@ cdef init_config(config *c_config, dict kwargs):
     c_config.pruning_size = kwargs.pop('pruning_size', 50)
     c_config.nbest = kwargs.pop('nbest', 1)
     c_config.max_step = kwargs.pop('max_step', 10000000)
-
-
-cdef unsigned retrieve_tree(
-    cell_item *item,
-    unsigned *token_id,
-    cache_type *cache,
-    void *c_kwargs,
-):
+    c_config.max_agenda_size = kwargs.pop('max_agenda_size', None) or 0
+    c_config.timeout = kwargs.pop('timeout', None) or 0
+    c_config.span_beam = kwargs.pop('span_beam', None) or 0
+    fallback = kwargs.pop('fallback', None)
+    if fallback not in _fallback_types:
+        raise RuntimeError(f'unsupported fallback type: {fallback}')
+    c_config.fallback = _fallback_types[fallback]
+    heuristic = kwargs.pop('heuristic', 'default')
+    if heuristic not in _heuristic_types:
+        raise RuntimeError(f'unsupported heuristic: {heuristic}')
+    c_config.heuristic = _heuristic_types[heuristic]
+
+
+cdef class Parser:
     """
-    retrieve (n-best) parsing results from cell_item.
-    they are placed in kwargs['stack']
+    A* parser that keeps the categories, the grammar and the cache of the results of
+    combinators across calls of `parse_doc`, so that they are set up only once
+    and the cache stays warm for the following documents.
+
+    the combinators are `apply_binary_rules` and `apply_unary_rules` in Python,
+    or the ones in C++ when `native_grammar` (the tuple of depccg.grammar.GrammarSpec)
+    is given. `combinator_cache` is the path to a CombinatorCache loaded beforehand.
+    `num_threads` is the number of threads parsing the sentences given to `parse_doc`,
+    which share the cache (with the Python combinators, the threads call them
+    one at a time taking the GIL, so the native grammar scales better).
+    other keyword arguments are the parsing configuration (see `init_config`).
     """
-    cdef pair[unsigned, unsigned] key
-    cdef object kwargs = <object>c_kwargs
-
-    if item.fin:
-        kwargs['scores'].append(item.score())
-        return retrieve_tree(item.left, token_id, cache, c_kwargs)
-
-    cat = kwargs['categories'][item.cat]
-    stack = kwargs['stack']
-    if item.left == NULL and item.right == NULL:
-        stack.append(
-            Tree.make_terminal(kwargs['tokens'][token_id[0]], cat)
-        )
-        token_id[0] += 1
-        return item.cat
-    else:
-        child_cat = retrieve_tree(item.left, token_id, cache, c_kwargs)
-        kwargs = <object>c_kwargs
-        if item.right == NULL:
-            child = stack.pop()
-            key.first = child_cat
-            key.second = -1
-            combinator_result = cache[0][key][item.rule_id]
-            stack.append(
-                Tree.make_unary(
-                    cat,
-                    child,
-                    combinator_result.op_string.decode('utf-8'),
-                    combinator_result.op_symbol.decode('utf-8'),
-                )
+    cdef cache_type c_cache
+    cdef combinable_index c_combinable
+    cdef config c_config
+    cdef unordered_set[unsigned] c_possible_root_cat
+    cdef object max_length
+    cdef unsigned num_threads
+    cdef object categories
+    cdef object add_category
+    cdef object binary_callback
+    cdef object unary_callback
+    cdef NativeGrammar grammar
+    cdef scaffold_type c_scaffold
+    cdef derivation_buffer c_derivations
+    cdef dict _memory_stats
+
+    def __init__(
+        self,
+        list categories,
+        apply_binary_rules,
+        apply_unary_rules,
+        object possible_root_cats,
+        native_grammar=None,
+        combinator_cache=None,
+        **kwargs
+    ):
+        if len(set(categories)) != len(categories):
+            raise RuntimeError(
+                'argument `categories` cannot contain duplicate elements.'
             )
-            return item.cat
-        right_child_cat = retrieve_tree(item.right, token_id, cache, c_kwargs)
-        key.first = child_cat
-        key.second = right_child_cat
-        kwargs = <object>c_kwargs
-        right = stack.pop()
-        left = stack.pop()
-        combinator_result = cache[0][key][item.rule_id]
-        stack.append(
-            Tree.make_binary(
-                cat,
-                left,
-                right,
-                combinator_result.op_string.decode('utf-8'),
-                combinator_result.op_symbol.decode('utf-8'),
+
+        if native_grammar is not None:
+            self._init_native(categories, native_grammar)
+            grammar_spec = GrammarSpec(*native_grammar)
+        else:
+            self._init_python(categories, apply_binary_rules, apply_unary_rules)
+            try:
+                grammar_spec = grammar_spec_of(apply_binary_rules, apply_unary_rules)
+            except RuntimeError:
+                grammar_spec = None
+
+        for cat in possible_root_cats:
+            self.c_possible_root_cat.insert(self.add_category(cat))
+
+        kwargs.setdefault('num_tags', len(categories))
+        self.max_length = kwargs.pop('max_length', None)
+        self.num_threads = kwargs.pop('num_threads', None) or 1
+        init_config(&self.c_config, kwargs)
+
+        if combinator_cache is not None:
+            warm_up_cache(
+                &self.c_cache,
+                combinator_cache,
+                self.add_category,
+                None if grammar_spec is None else grammar_fingerprint(grammar_spec, categories),
             )
-        )
-        return item.cat
 
+        self._init_unary_table()
 
-def run(
-    list doc,
-    list scoring_results,
-    list categories,
-    apply_binary_rules,
-    apply_unary_rules,
-    object possible_root_cats,
-    process_id=0,
-    **kwargs
-) -> List[ScoredTree]:
+        if grammar_spec is not None:
+            self._init_combinable(grammar_spec)
 
-    def failed():
-        return [
-            ScoredTree(
-                tree=Tree.make_terminal("FAILED", Category.parse("NP")),
-                score=-float('inf')
-            )
-        ]
+        self.reset_memory_stats()
 
-    if len(set(categories)) != len(categories):
-        raise RuntimeError(
-            'argument `categories` cannot contain duplicate elements.'
-        )
+    def _init_python(self, list categories, apply_binary_rules, apply_unary_rules):
+        categories_ = copy.copy(categories)
 
-    categories_ = copy.copy(categories)
-
-    category_ids = {
-        category: index
-        for index, category in enumerate(categories_)
-    }
-
-    def maybe_add_and_get(cat):
-        if cat not in category_ids:
-            categories_.append(cat)
-            category_ids[cat] = len(category_ids)
-        if len(categories_) >= UINT_MAX:
-            raise RuntimeError('too many categories')
-        return category_ids[cat]
-
-    def binary_callback(x_id, y_id):
-        x, y = categories_[x_id], categories_[y_id]
-
-        results = []
-        for rule_id, result in enumerate(apply_binary_rules(x, y)):
-            cat_id = maybe_add_and_get(result.cat)
-            results.append((cat_id, rule_id, result))
-        return results
-
-    def unary_callback(x_id, _):
-        x = categories_[x_id]
-
-        results = []
-        for rule_id, result in enumerate(apply_unary_rules(x)):
-            cat_id = maybe_add_and_get(result.cat)
-            results.append((cat_id, rule_id, result))
-        return results
-
-    cdef list tokens
-    cdef np.ndarray[float, ndim=2, mode='c'] tag_scores
-    cdef np.ndarray[float, ndim=2, mode='c'] dep_scores
-    cdef float *c_tag_scores
-    cdef float *c_dep_scores
-    cdef unsigned length, status
-    cdef unordered_set[unsigned] c_possible_root_cat
-    cdef cache_type c_cache
-    cdef config c_config
-    init_config(&c_config, kwargs)
-
-    cdef unsigned cat_id
-    for cat in possible_root_cats:
-        cat_id = maybe_add_and_get(cat)
-        c_possible_root_cat.insert(cat_id)
-
-    all_results = []
-    iter_ = tqdm(
-        list(zip(doc, scoring_results)),
-        desc=f'#{process_id:>2} ',
-        position=process_id
-    )
-    for tokens, (tag_scores, dep_scores) in iter_:
-        c_tag_scores = <float*>tag_scores.data
-        c_dep_scores = <float*>dep_scores.data
-        length = len(tokens)
-
-        if (
-            'max_length' in kwargs
-            and len(tokens) > kwargs['max_length']
-        ):
-            all_results.append(failed())
-            continue
-
-        results = []
-        scores = []
-        finalizer_args = {
-            'categories': categories_,
-            'tokens': tokens,
-            'stack': results,
-            'scores': scores,
+        category_ids = {
+            category: index
+            for index, category in enumerate(categories_)
         }
 
-        status = parse_sentence(
-            c_tag_scores,
-            c_dep_scores,
-            length,
-            c_possible_root_cat,
-            <void*>binary_callback,
-            <void*>unary_callback,
-            retrieve_tree,
-            scaffold,
-            <void*>finalizer_args,
-            &c_cache,
-            &c_config,
+        def maybe_add_and_get(cat):
+            if not isinstance(cat, Category):
+                cat = Category.parse(cat)
+            if cat not in category_ids:
+                categories_.append(cat)
+                category_ids[cat] = len(category_ids)
+            if len(categories_) >= UINT_MAX:
+                raise RuntimeError('too many categories')
+            return category_ids[cat]
+
+        def binary_callback(x_id, y_id):
+            x, y = categories_[x_id], categories_[y_id]
+
+            results = []
+            for rule_id, result in enumerate(apply_binary_rules(x, y)):
+                cat_id = maybe_add_and_get(result.cat)
+                results.append((cat_id, rule_id, result))
+            return results
+
+        def unary_callback(x_id, _):
+            x = categories_[x_id]
+
+            results = []
+            for rule_id, result in enumerate(apply_unary_rules(x)):
+                cat_id = maybe_add_and_get(result.cat)
+                results.append((cat_id, rule_id, result))
+            return results
+
+        self.categories = categories_
+        self.add_category = maybe_add_and_get
+        self.binary_callback = binary_callback
+        self.unary_callback = unary_callback
+        self.c_scaffold = scaffold
+
+    def _init_native(self, list categories, tuple native_grammar_spec):
+        self.grammar = NativeGrammar(*native_grammar_spec)
+
+        for index, cat in enumerate(categories):
+            if self.grammar.add(cat) != index:
+                raise RuntimeError(
+                    'failed to register categories to the native grammar.'
+                )
+
+        self.categories = self.grammar
+        self.add_category = self.grammar.add
+        self.c_scaffold = apply_rules
+
+    cdef _init_unary_table(self):
+        """
+        apply the unary rules to the categories known so far and to their results repeatedly,
+        and give the results to the cache as a table by the category ids, which is read
+        in the search without calling the rules or hashing.
+        """
+        cdef vector[vector[combinator_result]] table
+        # the categories produced by the rules are added to the end
+        while table.size() < len(self.categories):
+            table.push_back(vector[combinator_result]())
+            if self.grammar is not None:
+                # called directly so that the errors of the grammar are raised with their messages
+                self.grammar.c_grammar.apply_unary_rules(table.size() - 1, &table.back())
+            else:
+                self.c_scaffold(
+                    <void*>self.unary_callback, table.size() - 1, UINT_MAX, &table.back()
+                )
+        self.c_cache.set_unary_table(table)
+
+    def _init_combinable(self, object grammar_spec):
+        """
+        index the pairs of the categories known so far that can combine by the seen rules,
+        so that the other pairs are skipped in the search without looking up the cache.
+        """
+        classes = seen_rule_classes(
+            grammar_spec,
+            [self.categories[index] for index in range(len(self.categories))],
+        )
+        if classes is None:
+            return
+        left_classes, right_classes, pairs = classes
+        self.c_combinable.build(
+            [UINT_MAX if left < 0 else left for left in left_classes],
+            [UINT_MAX if right < 0 else right for right in right_classes],
+            pairs,
         )
 
-        if status > 0:
-            all_results.append(failed())
-            continue
+    @property
+    def combinable_size(self) -> int:
+        """the number of the categories in the index of the pairs that can combine"""
+        return self.c_combinable.size()
+
+    @property
+    def unary_table_size(self) -> int:
+        """the number of the categories in the table of the results of the unary rules"""
+        return self.c_cache.unary_table_size()
+
+    @property
+    def cache_size(self) -> int:
+        return self.c_cache.size()
+
+    @property
+    def cache_stats(self) -> dict:
+        """
+        the numbers of the lookups in the cache of combinator results that found
+        the results (`hits`) or not (`misses`) and of the slots examined in them (`probes`),
+        and the numbers of the entries (`size`) and the slots (`capacity`) of the cache.
+        """
+        return {
+            'size': self.c_cache.size(),
+            'capacity': self.c_cache.capacity(),
+            'hits': self.c_cache.stats.hits,
+            'misses': self.c_cache.stats.misses,
+            'probes': self.c_cache.stats.probes,
+        }
 
-        if len(results) != len(scores):
-            raise RuntimeError(
-                'unexpected behavior occured during parsing'
+    @property
+    def memory_stats(self) -> dict:
+        """
+        the memory usage in the sentences parsed since the last `reset_memory_stats`:
+        the total numbers of chart items and of blocks allocated for them,
+        and the maximum bytes used by a chart and the maximum size of an agenda.
+        """
+        return dict(self._memory_stats)
+
+    def reset_memory_stats(self):
+        self._memory_stats = {
+            'sentences': 0,
+            'chart_items': 0,
+            'chart_blocks': 0,
+            'peak_chart_bytes': 0,
+            'peak_agenda_size': 0,
+        }
+
+    cdef _update_memory_stats(self, memory_stats &c_stats):
+        stats = self._memory_stats
+        stats['sentences'] += 1
+        stats['chart_items'] += c_stats.num_items
+        stats['chart_blocks'] += c_stats.num_blocks
+        stats['peak_chart_bytes'] = max(stats['peak_chart_bytes'], c_stats.chart_bytes)
+        stats['peak_agenda_size'] = max(stats['peak_agenda_size'], c_stats.agenda_size)
+
+    cdef object _derivations(self, derivation_buffer *buffer, list tokens, bint fragments):
+        """
+        copy the derivations in `buffer` into a Derivations object,
+        whose categories and ops are only the ones used in them.
+        """
+        cdef unsigned num_nodes = buffer.nodes.size()
+        nodes = numpy.empty(num_nodes, dtype=Derivations.NODE_DTYPE)
+        cdef unsigned char[:] view = nodes.view(numpy.uint8)
+        if num_nodes > 0:
+            memcpy(
+                &view[0],
+                buffer.nodes.data(),
+                num_nodes * sizeof(derivation_node),
             )
 
-        all_results.append(
+        cat_ids, nodes['cat'] = numpy.unique(nodes['cat'], return_inverse=True)
+        internal = nodes['op'] != Derivations.LEAF
+        op_ids, nodes['op'][internal] = numpy.unique(
+            nodes['op'][internal], return_inverse=True
+        )
+        return Derivations(
+            nodes,
+            numpy.array(buffer.roots, dtype=numpy.uint32),
+            numpy.array(buffer.scores, dtype=numpy.float32),
+            [self.categories[cat_id] for cat_id in cat_ids.tolist()],
             [
-                ScoredTree(tree=tree, score=score)
-                for tree, score in zip(results, scores)
-            ]
+                (
+                    buffer.ops[op_id].first.decode('utf-8'),
+                    buffer.ops[op_id].second.decode('utf-8'),
+                )
+                for op_id in op_ids.tolist()
+            ],
+            tokens=tokens,
+            fragments=fragments,
+        )
+
+    def parse_doc(
+        self,
+        list doc,
+        list scoring_results,
+        bint return_status=False,
+        bint return_derivations=False,
+        list constraints=None,
+        bint return_stats=False,
+        object progress=None,
+        float progress_interval=1.0,
+    ):
+        """
+        parse sentences and return the lists of n-best ScoredTree's.
+        if `return_status`, the ParseStatus of each sentence is also returned.
+        if `return_stats`, the SearchStats of each sentence is also returned (last).
+        if `return_derivations`, the Derivations of each sentence is returned instead
+        of the trees, which are built by its `scored_trees`.
+        with `num_threads` > 1, the sentences are parsed in threads releasing the GIL.
+        `constraints` is a list of the SpanInfo's of the sentences (or None) given by
+        partial annotations (see `depccg.utils.read_partial_tree`), which the parses obey.
+        `progress(done, total)` is called with the numbers of the parsed sentences
+        at most once in `progress_interval` seconds (and when all are done).
+        """
+        results, statuses, stats = self._parse(
+            [tag_scores for tag_scores, _ in scoring_results],
+            [dep_scores for _, dep_scores in scoring_results],
+            [len(tokens) for tokens in doc],
+            constraints,
+            return_stats,
+            progress,
+            progress_interval,
+        )
+        for tokens, derivations in zip(doc, results):
+            derivations.tokens = tokens
+        if not return_derivations:
+            results = [derivations.scored_trees() for derivations in results]
+        return self._outputs(results, statuses, stats, return_status, return_stats)
+
+    def parse_packed(
+        self,
+        np.ndarray[float, ndim=1, mode='c'] scores,
+        offsets,
+        lengths,
+        bint return_status=False,
+        list constraints=None,
+        bint return_stats=False,
+        object progress=None,
+        float progress_interval=1.0,
+    ):
+        """
+        parse a whole document given in one float32 array `scores`, where the tag scores
+        and then the dependency scores of the i-th sentence of `lengths[i]` words start
+        at `offsets[i]` (see `depccg.parsing._pack_scores`), and return the Derivations
+        of the sentences, which are not given their tokens. the other arguments are
+        the same as `parse_doc`.
+        """
+        cdef unsigned num_tags = self.c_config.num_tags
+        tag_scores, dep_scores = [], []
+        for offset, length in zip(offsets, lengths):
+            tag_end = offset + length * num_tags
+            tag_scores.append(scores[offset:tag_end].reshape(length, num_tags))
+            dep_scores.append(scores[tag_end:tag_end + length * (length + 1)])
+        results, statuses, stats = self._parse(
+            tag_scores,
+            dep_scores,
+            [int(length) for length in lengths],
+            constraints,
+            return_stats,
+            progress,
+            progress_interval,
         )
+        return self._outputs(results, statuses, stats, return_status, return_stats)
+
+    cdef tuple _parse(
+        self,
+        list tag_scores,
+        list dep_scores,
+        list lengths,
+        list constraints,
+        bint return_stats,
+        object progress,
+        float progress_interval,
+    ):
+        cdef np.ndarray[float, ndim=1, mode='c'] sentence_dep_scores
+        cdef np.ndarray[float, ndim=2, mode='c'] sentence_tag_scores
+        cdef void *c_binary_callback
+        cdef void *c_unary_callback
+        cdef supertag_candidates c_candidates
+        cdef const unsigned[:] candidate_offsets
+        cdef const unsigned[:] candidate_cats
+        cdef const float[:] candidate_scores
+        cdef unsigned word_offset = 0
+        cdef unsigned index, length
+        cdef vector[sentence] c_sentences
+        cdef vector[sentence] ordered
+        cdef vector[unsigned] c_indices
+        cdef vector[derivation_buffer] c_buffers
+        cdef sentence c_sentence
+        cdef vector[vector[span_constraint]] c_spans
+        cdef progress_type c_progress = NULL
+
+        if self.grammar is not None:
+            c_binary_callback = <void*>self.grammar.c_grammar
+            c_unary_callback = <void*>self.grammar.c_grammar
+        else:
+            c_binary_callback = <void*>self.binary_callback
+            c_unary_callback = <void*>self.unary_callback
+
+        num_sentences = len(lengths)
+        if num_sentences == 0:
+            return [], [], []
+
+        if constraints is not None and len(constraints) != num_sentences:
+            raise RuntimeError(
+                'the numbers of sentences and constraints are different.'
+            )
+
+        # the supertags of all the sentences are pruned at once
+        candidate_offsets, candidate_cats, candidate_scores = prune_supertags(
+            tag_scores,
+            self.c_config.pruning_size,
+            self.c_config.beta,
+            self.c_config.use_beta,
+        )
+        # to avoid taking the address of an empty array
+        if candidate_cats.shape[0] == 0:
+            candidate_cats = numpy.zeros(1, dtype=numpy.uint32)
+            candidate_scores = numpy.zeros(1, dtype=numpy.float32)
+        c_candidates.cats = &candidate_cats[0]
+        c_candidates.scores = &candidate_scores[0]
+
+        # the buffers and the constraints must not move once their addresses are taken
+        c_buffers.resize(num_sentences)
+        c_spans.resize(num_sentences)
+        for index in range(num_sentences):
+            length = lengths[index]
+            c_candidates.offsets = &candidate_offsets[word_offset]
+            word_offset += length
+            if self.max_length is not None and length > self.max_length:
+                continue
+
+            sentence_tag_scores = tag_scores[index]
+            sentence_dep_scores = dep_scores[index].reshape(-1)
+            c_sentence.tag_scores = <float*>sentence_tag_scores.data
+            c_sentence.dep_scores = <float*>sentence_dep_scores.data
+            c_sentence.length = length
+            c_sentence.candidates = c_candidates
+            c_sentence.constraints.size = 0
+            if constraints is not None and constraints[index] is not None:
+                self._set_constraints(&c_spans[index], constraints[index], length)
+                c_sentence.constraints.spans = c_spans[index].data()
+                c_sentence.constraints.size = c_spans[index].size()
+            c_sentence.finalizer_args = <void*>&c_buffers[index]
+            c_sentence.collect_search_stats = return_stats
+            c_sentences.push_back(c_sentence)
+            c_indices.push_back(index)
+
+        if progress is not None:
+            c_progress = report_progress
+
+        if self.num_threads > 1:
+            # the longest sentences first, so that the threads finish at about the same time
+            indices = list(c_indices)
+            order = sorted(
+                range(len(indices)),
+                key=lambda position: -lengths[indices[position]],
+            )
+            ordered = c_sentences
+            for position in range(len(order)):
+                c_sentences[position] = ordered[order[position]]
+                c_indices[position] = indices[order[position]]
+
+        with nogil:
+            parse_sentences(
+                c_sentences,
+                self.c_possible_root_cat,
+                c_binary_callback,
+                c_unary_callback,
+                flatten_derivation,
+                self.c_scaffold,
+                &self.c_cache,
+                &self.c_config,
+                self.num_threads,
+                &self.c_combinable,
+                c_progress,
+                <void*>progress,
+                progress_interval,
+            )
+
+        results = [None] * num_sentences
+        statuses = [ParseStatus.TOO_LONG] * num_sentences
+        stats = [None] * num_sentences if return_stats else []
+        for position in range(c_sentences.size()):
+            index = c_indices[position]
+            self._update_memory_stats(c_sentences[position].stats)
+            statuses[index] = ParseStatus(c_sentences[position].status)
+            results[index] = self._derivations(
+                &c_buffers[index], None, c_sentences[position].status > 0
+            )
+            if return_stats:
+                stats[index] = _search_stats(
+                    c_sentences[position].search, lengths[index], statuses[index]
+                )
 
-    return all_results
+        for index in range(num_sentences):
+            if results[index] is None:
+                results[index] = self._derivations(&c_buffers[index], None, False)
+                if return_stats:
+                    stats[index] = SearchStats(
+                        lengths[index], ParseStatus.TOO_LONG,
+                        0, 0, 0, [], 0, 0, 0, 0, 0.0, 0.0,
+                    )
+        return results, statuses, stats
+
+    cdef _outputs(self, list results, list statuses, list stats, bint return_status, bint return_stats):
+        outputs = (results,)
+        if return_status:
+            outputs += (statuses,)
+        if return_stats:
+            outputs += (stats,)
+        return outputs if len(outputs) > 1 else results
+
+    cdef _set_constraints(self, vector[span_constraint] *spans, list span_infos, unsigned length):
+        cdef span_constraint c_span
+        for span_info in span_infos:
+            start = span_info.idx
+            # `end_idx` of a SpanInfo of brackets is the number of the words in it
+            span_length = 1 if span_info.end_idx is None else span_info.end_idx
+            # checked before assigned to the unsigned fields, which reject negative values
+            if start < 0 or span_length <= 0 or start + span_length > length:
+                raise RuntimeError(f'invalid span in the constraints: {span_info}')
+            c_span.start = start
+            c_span.lexical = span_info.end_idx is None
+            c_span.length = span_length
+            c_span.cat = UINT_MAX if span_info.cat is None \
+                else self.add_category(span_info.cat)
+            spans.push_back(c_span)
+
+
+def run(
+    list doc,
+    list scoring_results,
+    list categories,
+    apply_binary_rules,
+    apply_unary_rules,
+    object possible_root_cats,
+    return_status=False,
+    return_derivations=False,
+    constraints=None,
+    return_stats=False,
+    progress=None,
+    **kwargs
+):
+    parser = Parser(
+        categories,
+        apply_binary_rules,
+        apply_unary_rules,
+        possible_root_cats,
+        **kwargs
+    )
+    return parser.parse_doc(
+        doc,
+        scoring_results,
+        return_status=return_status,
+        return_derivations=return_derivations,
+        constraints=constraints,
+        return_stats=return_stats,
+        progress=progress,
+    )
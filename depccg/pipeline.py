@@ -0,0 +1,244 @@
+from typing import (
+    Callable, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional,
+    TextIO, Tuple, TypeVar, Any
+)
+from collections import OrderedDict
+import queue
+import threading
+
+from depccg.types import Token
+
+T = TypeVar('T')
+
+_END = object()
+
+
+class _Failure(object):
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def read_chunks(file: TextIO, chunk_size: int) -> Iterator[List[str]]:
+    """read non-empty lines from `file` lazily, in lists of at most `chunk_size` lines.
+
+    Args:
+        file (TextIO): input stream
+        chunk_size (int): the maximum number of lines in a chunk
+
+    Yields:
+        List[str]: stripped lines
+    """
+    if chunk_size <= 0:
+        raise RuntimeError('chunk_size must be a positive integer')
+
+    chunk = []
+    for line in file:
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def run_pipeline(
+    source: Iterable[T],
+    stages: List[Callable[[Any], Any]],
+    queue_size: int = 2,
+) -> Iterator[Any]:
+    """apply `stages` one after another to each item of `source`,
+    running every stage in its own thread so that consecutive items are processed
+    concurrently (e.g., a chunk is supertagged while the previous one is being parsed).
+
+    Every stage is connected to the next one by a queue of at most `queue_size` items,
+    which bounds the number of items held in memory at a time.
+    Since each stage processes items one by one, the results are yielded
+    in the order of `source`. If a stage raises an exception,
+    it is re-raised here and the rest of the items are not processed.
+
+    Args:
+        source (Iterable[T]): input items, which are consumed lazily
+        stages (List[Callable[[Any], Any]]): functions applied in this order
+        queue_size (int, optional): capacity of the queues between stages. Defaults to 2.
+
+    Yields:
+        Any: the output of the last stage for each input item
+    """
+    if queue_size <= 0:
+        raise RuntimeError('queue_size must be a positive integer')
+
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            put(queues[0], _Failure(e))
+            return
+        put(queues[0], _END)
+
+    def work(stage, input_queue, output_queue):
+        while not stop.is_set():
+            try:
+                item = input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _END or isinstance(item, _Failure):
+                put(output_queue, item)
+                return
+            try:
+                item = stage(item)
+            except BaseException as e:
+                put(output_queue, _Failure(e))
+                return
+            if not put(output_queue, item):
+                return
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads.extend(
+        threading.Thread(
+            target=work,
+            args=(stage, queues[index], queues[index + 1]),
+            daemon=True,
+        )
+        for index, stage in enumerate(stages)
+    )
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+class DedupPlan(NamedTuple):
+    keys: List[Hashable]
+    indices: List[int]
+    found: Dict[Hashable, Any]
+
+
+class Deduplicator(object):
+    """process each distinct sentence of a document only once.
+
+    `split` tells which sentences of a document have to be processed, i.e.,
+    the first occurrence of each sentence that is not in the cache, and `merge`
+    fans the results of those sentences back out to all the sentences in the input order.
+    Sentences are identified by their tokens (with all their attributes),
+    their constraints if any, and `config`, the configuration of the supertagger
+    and the parser that the results depend on.
+
+    When `cache_size` > 0, the results of at most as many sentences are kept
+    across documents (e.g., the chunks in --stream mode), discarding the least
+    recently used ones. `split` and `merge` can be called from different threads.
+
+    Args:
+        config (Hashable, optional): the configuration of the supertagger and the parser
+        cache_size (int, optional): the number of results kept across documents.
+        Defaults to 0.
+    """
+
+    def __init__(self, config: Hashable = None, cache_size: int = 0) -> None:
+        if cache_size < 0:
+            raise RuntimeError('cache_size must be a non-negative integer')
+        self.config = config
+        self.cache_size = cache_size
+        self.sentences = 0
+        self.duplicates = 0
+        self.cache_hits = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, tokens: List[Token], constraints: Optional[List[Any]] = None) -> Hashable:
+        return (
+            self.config,
+            tuple(tuple(sorted(token.items())) for token in tokens),
+            None if constraints is None else tuple(constraints),
+        )
+
+    def split(
+        self,
+        doc: List[List[Token]],
+        constraints: Optional[List[Optional[List[Any]]]] = None,
+    ) -> DedupPlan:
+        """find the sentences in `doc` to be processed.
+
+        Returns:
+            DedupPlan: the keys of all the sentences, the indices of those to be processed
+            and the results found in the cache, which are kept here so that they
+            survive until `merge` even if they are evicted in the meantime.
+        """
+        keys = [
+            self.key(tokens, None if constraints is None else constraints[index])
+            for index, tokens in enumerate(doc)
+        ]
+        indices = []
+        found = {}
+        with self._lock:
+            for index, key in enumerate(keys):
+                if key in found:
+                    self.duplicates += 1
+                elif key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+                    self.cache_hits += 1
+                else:
+                    found[key] = None
+                    indices.append(index)
+            self.sentences += len(keys)
+        for index in indices:
+            del found[keys[index]]
+        return DedupPlan(keys, indices, found)
+
+    def merge(self, plan: DedupPlan, results: List[Any]) -> List[Any]:
+        """return the results of all the sentences given those of `plan.indices`."""
+        assert len(results) == len(plan.indices)
+        found = dict(plan.found)
+        for index, result in zip(plan.indices, results):
+            found[plan.keys[index]] = result
+        if self.cache_size > 0:
+            with self._lock:
+                for index, result in zip(plan.indices, results):
+                    self._cache[plan.keys[index]] = result
+                    self._cache.move_to_end(plan.keys[index])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [found[key] for key in plan.keys]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """the numbers of the sentences seen so far, of the duplicates within documents
+        and of those found in the cache, and the ratio of the last two to the first."""
+        with self._lock:
+            return {
+                'sentences': self.sentences,
+                'duplicates': self.duplicates,
+                'cache_hits': self.cache_hits,
+                'hit_rate': (
+                    (self.duplicates + self.cache_hits) / self.sentences
+                    if self.sentences > 0 else 0.0
+                ),
+            }
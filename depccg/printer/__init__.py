@@ -41,6 +41,7 @@ def to_string(
     nbest_trees: List[Union[List[ScoredTree], ScoredTree]],
     format: str = 'auto',
     semantic_templates: Optional[str] = None,
+    start_index: int = 1,
 ) -> str:
     """convert parsing results into one string representation
 
@@ -52,6 +53,8 @@ def to_string(
         'json', 'ptb', 'jigg_xml', 'jigg_xml_ccg2lambda', 'ccg2lambda', 'prolog'.
         semantic_templates (Optional[str], optional): semantic template used for
         obtaining semantic formula using ccg2lambda. Defaults to None.
+        start_index (int, optional): ID of the first sentence, which is used in formats
+        other than the XML ones, 'html' and 'prolog'. Defaults to 1.
 
     Raises:
         KeyError: if the format option is not supported, this error occurs.
@@ -113,7 +116,7 @@ def to_string(
 
     elif format == 'json':
         results = {}
-        for sentence_index, trees in enumerate(nbest_trees, 1):
+        for sentence_index, trees in enumerate(nbest_trees, start_index):
             results[sentence_index] = []
             for tree, log_prob in trees:
                 tree_dict = json_of(tree)
@@ -128,7 +131,7 @@ def to_string(
             _, formulas_list = ccg2lambda.parse(
                 jigg_xml, str(templates), ncores=1
             )
-            for sentence_index, (trees, formulas) in enumerate(zip(nbest_trees, formulas_list), 1):
+            for sentence_index, (trees, formulas) in enumerate(zip(nbest_trees, formulas_list), start_index):
                 for (tree, log_prob), formula in zip(trees, formulas):
                     print(header.format(sentence_index, log_prob), file=file)
                     print(formula, file=file)
@@ -142,7 +145,7 @@ def to_string(
         )
 
     with StringIO() as file:
-        for sentence_index, trees in enumerate(nbest_trees, 1):
+        for sentence_index, trees in enumerate(nbest_trees, start_index):
             for tree, log_prob in trees:
                 print(header.format(sentence_index, log_prob), file=file)
                 print(formatter(tree), file=file)
@@ -154,6 +157,7 @@ def print_(
     nbest_trees: List[Union[List[ScoredTree], ScoredTree]],
     format: str = 'auto',
     semantic_templates: Optional[str] = None,
+    start_index: int = 1,
     **kwargs,
 ) -> None:
     """print parsing results into one string representation
@@ -166,6 +170,7 @@ def print_(
         'json', 'ptb', 'jigg_xml', 'jigg_xml_ccg2lambda', 'ccg2lambda', 'prolog'.
         semantic_templates (Optional[str], optional): semantic template used for
         obtaining semantic formula using ccg2lambda. Defaults to None.
+        start_index (int, optional): ID of the first sentence. Defaults to 1.
 
     other keyword arguments for Python 'print' function are also available.
 
@@ -178,6 +183,7 @@ def print_(
             nbest_trees,
             format=format,
             semantic_templates=semantic_templates,
+            start_index=start_index,
         ),
         **kwargs,
     )
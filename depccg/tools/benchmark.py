@@ -0,0 +1,327 @@
+from typing import List, Tuple, Dict, Any, Optional
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+
+import numpy
+
+from depccg.cat import Category
+from depccg.grammar import ja
+from depccg.types import Token, ScoringResult
+from depccg.utils import read_weights
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT_CATEGORIES = {
+    'en': 'S[dcl]|S[wq]|S[q]|S[qem]|NP',
+    'ja': '|'.join(str(cat) for cat in ja._possible_root_categories),
+}
+
+# the measures compared with a baseline, and whether a larger value is better
+COMPARED_MEASURES = {
+    'sentences_per_second': True,
+    'p50_seconds': False,
+    'p99_seconds': False,
+}
+
+Bucket = Tuple[str, List[List[Token]], List[ScoringResult]]
+
+
+def synthetic_inputs(
+    num_tags: int,
+    length: int,
+    num_sentences: int,
+    peak: float = 4.0,
+    seed: int = 0,
+) -> Tuple[List[List[Token]], List[ScoringResult]]:
+    """make sentences of `length` words with random log probabilities,
+    where one random supertag of each word is boosted by `peak`.
+    """
+    random = numpy.random.RandomState(seed)
+
+    def log_softmax(x):
+        x = x - x.max(axis=1, keepdims=True)
+        return x - numpy.log(numpy.exp(x).sum(axis=1, keepdims=True))
+
+    doc, score_results = [], []
+    for _ in range(num_sentences):
+        tag_scores = random.randn(length, num_tags)
+        tag_scores[numpy.arange(length), random.randint(num_tags, size=length)] += peak
+        dep_scores = random.randn(length, length + 1)
+        doc.append([Token.of_word(f'w{index}') for index in range(length)])
+        score_results.append(
+            ScoringResult(
+                numpy.ascontiguousarray(log_softmax(tag_scores), dtype=numpy.float32),
+                numpy.ascontiguousarray(log_softmax(dep_scores), dtype=numpy.float32),
+            )
+        )
+    return doc, score_results
+
+
+def synthetic_buckets(
+    num_tags: int,
+    lengths: List[int],
+    peaks: List[float],
+    num_sentences: int,
+    seed: int = 0,
+) -> List[Bucket]:
+    """a bucket of synthetic sentences for each pair of a length and a peak
+    (see `synthetic_inputs`), in the ascending order of the lengths.
+    """
+    return [
+        (
+            f'length={length},peak={peak:g}',
+            *synthetic_inputs(num_tags, length, num_sentences, peak=peak, seed=seed),
+        )
+        for length in sorted(lengths)
+        for peak in peaks
+    ]
+
+
+def recorded_buckets(
+    score_results: List[ScoringResult],
+    bucket_size: int = 10,
+) -> List[Bucket]:
+    """the supertagger outputs (e.g., read by `read_weights`) grouped into buckets
+    of the sentence lengths in ranges of `bucket_size` words, in the ascending order.
+    """
+    buckets = {}
+    for scores in score_results:
+        length = scores.tag_scores.shape[0]
+        buckets.setdefault((length - 1) // bucket_size, []).append(scores)
+    return [
+        (
+            f'length={index * bucket_size + 1}-{(index + 1) * bucket_size}',
+            [
+                [Token.of_word(f'w{i}') for i in range(scores.tag_scores.shape[0])]
+                for scores in bucket
+            ],
+            bucket,
+        )
+        for index, bucket in sorted(buckets.items())
+    ]
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def benchmark(
+    parser,
+    buckets: List[Bucket],
+    warm_up: bool = False,
+) -> List[Dict[str, Any]]:
+    """parse the sentences of each bucket with `parser` (depccg._parsing.Parser),
+    and report the throughput, the latency (the time of the search for a sentence),
+    the steps (agenda pops), the allocation of chart items and the peak memory.
+    the peak RSS is that of this process so far, so the buckets should be in ascending
+    order of the lengths. if `warm_up`, all the buckets are parsed once beforehand,
+    so that the cache of combinator results is not measured cold.
+    """
+    if warm_up:
+        for _, doc, score_results in buckets:
+            parser.parse_doc(doc, score_results)
+
+    reports = []
+    for name, doc, score_results in buckets:
+        parser.reset_memory_stats()
+        start = time.perf_counter()
+        results, stats = parser.parse_doc(doc, score_results, return_stats=True)
+        elapsed = time.perf_counter() - start
+        memory_stats = parser.memory_stats
+        seconds = [sentence_stats.seconds for sentence_stats in stats]
+        steps = [sentence_stats.pops for sentence_stats in stats]
+        reports.append(
+            {
+                'bucket': name,
+                'sentences': len(doc),
+                'failed': sum(
+                    1 for trees in results if trees[0].score == -float('inf')
+                ),
+                'sentences_per_second': len(doc) / elapsed,
+                'p50_seconds': float(numpy.percentile(seconds, 50)),
+                'p99_seconds': float(numpy.percentile(seconds, 99)),
+                'mean_steps': float(numpy.mean(steps)),
+                'p99_steps': float(numpy.percentile(steps, 99)),
+                'chart_items_per_sentence': memory_stats['chart_items'] / len(doc),
+                'peak_chart_bytes': memory_stats['peak_chart_bytes'],
+                'peak_agenda_size': memory_stats['peak_agenda_size'],
+                'peak_rss_bytes': peak_rss_bytes(),
+            }
+        )
+        logger.info(f'done with {name}')
+    return reports
+
+
+def compare_reports(
+    reports: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    tolerance: float = 0.1,
+) -> List[str]:
+    """compare `reports` with those of `baseline` in the same buckets,
+    and return the descriptions of the measures worse by more than `tolerance` (ratio).
+    """
+    baseline = {report['bucket']: report for report in baseline}
+    regressions = []
+    for report in reports:
+        if report['bucket'] not in baseline:
+            logger.warning(f'no baseline for {report["bucket"]}')
+            continue
+        for measure, larger_is_better in COMPARED_MEASURES.items():
+            value, base_value = report[measure], baseline[report['bucket']][measure]
+            ratio = value / base_value if base_value > 0 else 1.0
+            if (ratio < 1 - tolerance) if larger_is_better else (ratio > 1 + tolerance):
+                regressions.append(
+                    f'{report["bucket"]}: {measure} {value:.6g} (baseline {base_value:.6g})'
+                )
+    return regressions
+
+
+def main(args):
+    from depccg.allennlp.utils import read_params
+    from depccg.instance_models import MODELS
+    from depccg.lang import set_global_language_to
+    from depccg.parsing import _parser_kwargs
+    import depccg._parsing
+
+    set_global_language_to(args.lang)
+    config_path = args.config or MODELS[args.lang].config
+    apply_binary_rules, apply_unary_rules, _, categories = read_params(
+        config_path,
+        disable_category_dictionary=True,
+    )
+    root_categories = [
+        Category.parse(category)
+        for category in (
+            args.root_cats or DEFAULT_ROOT_CATEGORIES[args.lang]
+        ).split('|')
+    ]
+
+    if args.weights is not None:
+        # the scores are over the categories of the recorded supertagger
+        score_results, categories = read_weights(args.weights)
+        buckets = recorded_buckets(score_results, args.bucket_size)
+    else:
+        buckets = synthetic_buckets(
+            len(categories), args.lengths, args.peaks, args.sentences, seed=args.seed
+        )
+
+    parser = depccg._parsing.Parser(
+        categories,
+        apply_binary_rules,
+        apply_unary_rules,
+        root_categories,
+        **_parser_kwargs(
+            categories,
+            apply_binary_rules,
+            apply_unary_rules,
+            nbest=args.nbest,
+            max_step=args.max_step,
+            max_length=max(len(tokens) for _, doc, _ in buckets for tokens in doc),
+            native_grammar=args.native_grammar,
+            combinator_cache=args.combinator_cache,
+        )
+    )
+
+    reports = benchmark(parser, buckets, warm_up=args.warm_up)
+    for report in reports:
+        print(json.dumps(report))
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare_reports(reports, json.load(f), args.tolerance)
+        for regression in regressions:
+            logger.warning(f'regression in {regression}')
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        'benchmark the A* parser on synthetic or recorded inputs')
+    parser.add_argument(
+        'lang',
+        choices=['en', 'ja'])
+    parser.add_argument(
+        '-c',
+        '--config',
+        help='json config file specifying the set of unary rules used, etc.')
+    parser.add_argument(
+        '--root-cats',
+        default=None,
+        help='"|" separated list of categories allowed at the root of a tree')
+    parser.add_argument(
+        '--weights',
+        default=None,
+        help=('a file of recorded supertagger outputs in the format of `read_weights`,'
+              ' parsed instead of synthetic inputs'))
+    parser.add_argument(
+        '--bucket-size',
+        type=int,
+        default=10,
+        help='range of the sentence lengths in a bucket of the recorded inputs')
+    parser.add_argument(
+        '--lengths',
+        nargs='+',
+        type=int,
+        default=[10, 20, 40],
+        help='sentence lengths of the synthetic inputs')
+    parser.add_argument(
+        '--peaks',
+        nargs='+',
+        type=float,
+        default=[4.0],
+        help=('how much the log probability of one supertag of each word'
+              ' is boosted in the synthetic inputs'))
+    parser.add_argument(
+        '--sentences',
+        type=int,
+        default=20,
+        help='number of synthetic sentences in each bucket')
+    parser.add_argument(
+        '--nbest',
+        type=int,
+        default=1)
+    parser.add_argument(
+        '--max-step',
+        type=int,
+        default=100000)
+    parser.add_argument(
+        '--native-grammar',
+        action='store_true')
+    parser.add_argument(
+        '--combinator-cache',
+        default=None)
+    parser.add_argument(
+        '--warm-up',
+        action='store_true',
+        help='parse all the inputs once before measuring')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0)
+    parser.add_argument(
+        '--save-baseline',
+        default=None,
+        help='file to save the reports to, to be compared with later by --baseline')
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        help='file of saved reports, which fails the benchmark if it is worse by --tolerance')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.1,
+        help='allowed ratio of the slowdown from the baseline')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    main(args)
@@ -1,5 +1,6 @@
 from depccg.lang import get_global_language
-from typing import NamedTuple, List, Iterator, Union
+from typing import NamedTuple, List, Iterator, Union, Tuple, Optional
+import numpy
 from depccg.cat import Category
 from depccg.grammar import guess_combinator_by_triplet, en, ja
 from depccg.types import Token
@@ -69,6 +70,22 @@ class Tree(object):
     ) -> 'Tree':
         return Tree(cat, [child], op_string, op_symbol)
 
+    @staticmethod
+    def _make_unchecked(
+        cat: Category,
+        children: Union[List['Tree'], List[Token]],
+        op_string: str,
+        op_symbol: str,
+    ) -> 'Tree':
+        # skips the assertions in __init__ for trees built from the parser outputs
+        tree = Tree.__new__(Tree)
+        tree.cat = cat
+        tree.children = children
+        tree.op_string = op_string
+        tree.op_symbol = op_symbol
+        tree.head_is_left = True
+        return tree
+
     @staticmethod
     def of_nltk_tree(tree) -> 'Tree':
 
@@ -176,6 +193,106 @@ class ScoredTree(NamedTuple):
     score: float
 
 
+class Derivations(object):
+    """n-best derivations of a sentence output by the parser, kept in flat arrays
+    until `Tree` objects are needed (they are cheap to pickle between processes).
+
+    Args:
+        nodes (numpy.ndarray): array of NODE_DTYPE, where the children of a node precede it.
+        `cat` and `op` index `categories` and `ops` (`op` of a leaf is LEAF and
+        `start` is the index of its token), and `left` and `right` index `nodes` (-1 if none).
+        roots (numpy.ndarray): the root node of each derivation
+        scores (numpy.ndarray): the log probability of each derivation
+        categories (List[Category]): categories appearing in the derivations
+        ops (List[Tuple[str, str]]): pairs of (op_string, op_symbol)
+        tokens (Optional[List[Token]]): tokens of the sentence
+        fragments (bool): if True, the derivations are the fragments of a failed parse,
+        which are joined into a tree
+    """
+
+    NODE_DTYPE = numpy.dtype(
+        [
+            ('cat', '<u4'),
+            ('op', '<u4'),
+            ('left', '<i4'),
+            ('right', '<i4'),
+            ('head', '<u4'),
+            ('start', '<u4'),
+            ('length', '<u4'),
+        ]
+    )
+
+    LEAF = numpy.iinfo(numpy.uint32).max
+
+    def __init__(
+        self,
+        nodes: numpy.ndarray,
+        roots: numpy.ndarray,
+        scores: numpy.ndarray,
+        categories: List[Category],
+        ops: List[Tuple[str, str]],
+        tokens: Optional[List[Token]] = None,
+        fragments: bool = False,
+    ) -> None:
+        self.nodes = nodes
+        self.roots = roots
+        self.scores = scores
+        self.categories = categories
+        self.ops = ops
+        self.tokens = tokens
+        self.fragments = fragments
+
+    def __len__(self) -> int:
+        return len(self.roots)
+
+    def tree(self, index: int = 0) -> Tree:
+        """build the `index`-th derivation as a Tree object"""
+        root = int(self.roots[index])
+        # the nodes of a derivation are contiguous and end with its root
+        start = 0 if index == 0 else int(self.roots[index - 1]) + 1
+        trees = {}
+        for node_id in range(start, root + 1):
+            cat_id, op_id, left, right, _, token_id, _ = self.nodes[node_id]
+            cat = self.categories[cat_id]
+            if op_id == self.LEAF:
+                tree = Tree._make_unchecked(
+                    cat, [self.tokens[token_id]], 'lex', '<lex>'
+                )
+            else:
+                op_string, op_symbol = self.ops[op_id]
+                children = [trees.pop(left)] if right < 0 \
+                    else [trees.pop(left), trees.pop(right)]
+                tree = Tree._make_unchecked(cat, children, op_string, op_symbol)
+            trees[node_id] = tree
+        return trees[root]
+
+    def scored_trees(self) -> List['ScoredTree']:
+        """build all the derivations as ScoredTree objects.
+        a tree of a "FAILED" word is given if there are no derivations, and
+        the fragments are joined from left to right with nodes of the `fragment` rule,
+        each of which takes the category of its left child.
+        """
+        if len(self) == 0:
+            return [
+                ScoredTree(
+                    tree=Tree.make_terminal("FAILED", Category.parse("NP")),
+                    score=-float('inf')
+                )
+            ]
+
+        trees = [self.tree(index) for index in range(len(self))]
+        if not self.fragments:
+            return [
+                ScoredTree(tree=tree, score=score)
+                for tree, score in zip(trees, self.scores.tolist())
+            ]
+
+        tree = trees[0]
+        for fragment in trees[1:]:
+            tree = Tree.make_binary(tree.cat, tree, fragment, 'fragment', '<frag>')
+        return [ScoredTree(tree=tree, score=sum(self.scores.tolist()))]
+
+
 class ParseResult(NamedTuple):
     sentence_index: int
     tree_index: int
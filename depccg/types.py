@@ -1,5 +1,6 @@
-from typing import Optional, NamedTuple, Callable, List
+from typing import Optional, NamedTuple, Callable, List, Dict, Any
 from pathlib import Path
+from enum import IntEnum
 import re
 import numpy
 
@@ -75,6 +76,53 @@ ApplyBinaryRules = Callable[..., List[CombinatorResult]]
 ApplyUnaryRules = Callable[..., List[CombinatorResult]]
 
 
+class ParseStatus(IntEnum):
+    """the result of parsing a sentence, which tells the limit that stopped the parser
+    if it failed (the values are the ones returned by `parse_sentence` in parsing.h).
+    """
+    SUCCESS = 0
+    NO_PARSE = 1
+    MAX_STEP = 2
+    AGENDA_LIMIT = 3
+    TIMEOUT = 4
+    TOO_LONG = 5
+
+
+class SearchStats(NamedTuple):
+    """the statistics of the A* search for a sentence. `chart_items` is the number of
+    the items in the chart by the span length (from one), `callback_seconds` the time
+    spent in the combinators (i.e., the cache misses) and `seconds` that of the whole
+    search. all the numbers are zero for a sentence not parsed for being too long.
+    """
+    length: int
+    status: ParseStatus
+    pops: int
+    pushes: int
+    peak_agenda_size: int
+    chart_items: List[int]
+    binary_cache_hits: int
+    binary_cache_misses: int
+    unary_cache_hits: int
+    unary_cache_misses: int
+    callback_seconds: float
+    seconds: float
+
+    @property
+    def max_step_reached(self) -> bool:
+        return self.status == ParseStatus.MAX_STEP
+
+    @property
+    def max_length_reached(self) -> bool:
+        return self.status == ParseStatus.TOO_LONG
+
+    def to_json(self) -> Dict[str, Any]:
+        json_dict = self._asdict()
+        json_dict['status'] = self.status.name
+        json_dict['max_step_reached'] = self.max_step_reached
+        json_dict['max_length_reached'] = self.max_length_reached
+        return json_dict
+
+
 class GrammarConfig(NamedTuple):
     apply_binary_rules: ApplyBinaryRules
     apply_unary_rules: ApplyUnaryRules
@@ -1,6 +1,12 @@
-from typing import Dict, Union
+from typing import Dict, Union, Tuple, Optional
 from depccg.cat import Category, Atom, Feature
 
+# the paths (e.g., ('left', 'right')) to the functors in a pattern and their slashes
+# (None for "|", which matches any slash)
+_Slashes = Tuple[Tuple[Tuple[str, ...], Optional[str]], ...]
+# the meta variables in a pattern and the paths to them, in the order of the scan
+_Variables = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
 
 class Unification(object):
     """This performs unification on category variables.
@@ -45,6 +51,17 @@ class Unification(object):
             )
         self.done = True
 
+        pattern = _patterns.get((self.meta_x, self.meta_y))
+        if pattern is None:
+            pattern = _patterns.setdefault(
+                (self.meta_x, self.meta_y),
+                UnificationPattern(self.meta_x, self.meta_y),
+            )
+        self.success = pattern.matches(x, y) and self._unify(pattern, x, y)
+        return self.success
+
+    def _unify(self, pattern: 'UnificationPattern', x: Category, y: Category) -> bool:
+
         def scan_deep(s: Category, v: str, index: int, results: Dict[str, Feature]):
             if s.is_functor:
                 index = scan_deep(s.left, v, index, results)
@@ -53,37 +70,21 @@ class Unification(object):
             results[f'{v}{index}'] = s.feature
             return index + 1
 
-        def scan(s: Category, t: Category, results: Dict[str, Feature]) -> bool:
+        def scan(
+            s: Category, variables: _Variables, results: Dict[str, Feature]
+        ) -> None:
             # collect categories corresponding to meta variables
-            if s.is_atomic:
-                if s.base in self.cats and not (t ^ self.cats[s.base]):
-                    return False
-                self.cats[s.base] = t
-
-            if (
-                s.is_functor and t.is_functor and (
-                    s.slash == t.slash or '|' in (s.slash, t.slash))
-            ):
-                return (
-                    scan(s.left, t.left, results) and scan(
-                        s.right, t.right, results)
-                )
-            elif s.is_atomic and t.is_functor:
-                scan_deep(t, s.base, 0, results)
-                return True
-            elif s.is_atomic and t.is_atomic:
-                if t.feature is not None:
-                    results[s.base] = t.feature
-                return True
-            return False  # s.is_functor and t.is_atomic
-
-        self.success = (
-            scan(self.meta_x, x, self.x_features) and scan(
-                self.meta_y, y, self.y_features)
-        )
-
-        if not self.success:
-            return False
+            for var, path in variables:
+                t = _walk(s, path)
+                self.cats[var] = t
+                if t.is_functor:
+                    scan_deep(t, var, 0, results)
+                elif t.feature is not None:
+                    results[var] = t.feature
+
+        scan(x, pattern.x_variables, self.x_features)
+        scan(y, pattern.y_variables, self.y_features)
+        self.success = True
 
         # meta variables such as a, b, c, d, etc.
         meta_vars = set(self.x_features.keys()) & set(self.y_features.keys())
@@ -129,3 +130,97 @@ class Unification(object):
         if key not in self.cats:
             raise KeyError(f'meta category `{key}` has not been observed.')
         return rec(self.cats[key])
+
+
+def _walk(x: Category, path: Tuple[str, ...]) -> Category:
+    for child in path:
+        x = getattr(x, child)
+    return x
+
+
+def _compile(meta: Category) -> Tuple[_Slashes, _Variables]:
+    slashes, variables = [], []
+
+    def rec(s: Category, path: Tuple[str, ...]) -> None:
+        if s.is_functor:
+            slashes.append((path, None if s.slash == '|' else s.slash))
+            rec(s.left, path + ('left',))
+            rec(s.right, path + ('right',))
+        else:
+            variables.append((s.base, path))
+
+    rec(meta, ())
+    return tuple(slashes), tuple(variables)
+
+
+class UnificationPattern(object):
+    """Patterns of `Unification` compiled once, to be matched against many pairs.
+    Calling it returns a successful Unification object or None, the same as the one by
+    `Unification(meta_x, meta_y)(x, y)`. The pairs whose shapes or slashes do not fit
+    the patterns are rejected without making any object.
+    Usage:
+    >>> forward_application = UnificationPattern("a/b", "b")
+    >>> uni = forward_application(Category.parse("S[X]/NP[X]"), Category.parse("NP[mod]"))
+    >>> uni["a"]
+    S[mod]
+    """
+
+    def __init__(
+        self,
+        meta_x: Union[str, Category],
+        meta_y: Union[str, Category],
+    ) -> None:
+        self.meta_x = (
+            Category.parse(meta_x) if isinstance(meta_x, str) else meta_x
+        )
+        self.meta_y = (
+            Category.parse(meta_y) if isinstance(meta_y, str) else meta_y
+        )
+        self.x_slashes, self.x_variables = _compile(self.meta_x)
+        self.y_slashes, self.y_variables = _compile(self.meta_y)
+        # pairs of paths in x or y (0 or 1) to the same meta variable,
+        # where the categories must be of the same shape
+        occurrences = [
+            (var, (index, path))
+            for index, variables in enumerate((self.x_variables, self.y_variables))
+            for var, path in variables
+        ]
+        self.repeated = tuple(
+            (first, second)
+            for i, (var, first) in enumerate(occurrences)
+            for other, second in occurrences[i + 1:]
+            if var == other
+        )
+
+    def matches(self, x: Category, y: Category) -> bool:
+        """whether the shapes of `x` and `y` fit the patterns,
+        which is necessary for the unification to succeed."""
+        for path, slash in self.x_slashes:
+            t = _walk(x, path)
+            if not t.is_functor or not (
+                slash is None or t.slash == slash or t.slash == '|'
+            ):
+                return False
+        for path, slash in self.y_slashes:
+            t = _walk(y, path)
+            if not t.is_functor or not (
+                slash is None or t.slash == slash or t.slash == '|'
+            ):
+                return False
+        for (i, first), (j, second) in self.repeated:
+            if not (_walk((x, y)[i], first) ^ _walk((x, y)[j], second)):
+                return False
+        return True
+
+    def __call__(self, x: Category, y: Category) -> Optional[Unification]:
+        if not self.matches(x, y):
+            return None
+        uni = Unification(self.meta_x, self.meta_y)
+        uni.done = True
+        if uni._unify(self, x, y):
+            return uni
+        return None
+
+
+# patterns compiled for Unification objects
+_patterns: Dict[Tuple[Category, Category], UnificationPattern] = {}
@@ -163,3 +163,62 @@ def read_weights(filename, file_type='json'):
         )
 
     return scores, categories
+
+
+def prune_supertags(
+    tag_scores: List[numpy.ndarray],
+    pruning_size: int,
+    beta: float = 0.00001,
+    use_beta: bool = True,
+) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """select the supertags given to the A* parser for all the words in a document at once.
+    for each word, the `pruning_size` most probable categories are taken in the descending
+    order of (score, category id), stopping at the first one whose probability does not
+    exceed beta times the best score (the same as the parser does without this pre-pass).
+
+    Args:
+        tag_scores (List[numpy.ndarray]): float32 log probabilities of the sentences
+        pruning_size (int): the maximum number of supertags for a word
+        beta (float, optional): beta value. Defaults to 0.00001.
+        use_beta (bool, optional): whether to prune by beta. Defaults to True.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]: (offsets, cats, scores),
+        where the supertags of the i-th word of the document (counted over sentences)
+        are cats[offsets[i]:offsets[i + 1]] with their scores.
+    """
+    scores = numpy.concatenate(tag_scores, axis=0)
+    num_words, num_tags = scores.shape
+    size = min(pruning_size, num_tags)
+    rows = numpy.arange(num_words)[:, None]
+
+    if size < num_tags:
+        cats = numpy.argpartition(scores, num_tags - size, axis=1)[:, num_tags - size:]
+        # a category with the same score as the k-th one may be left out in favor of
+        # a larger id. such words are sorted fully (this rarely happens).
+        kth_scores = scores[rows, cats].min(axis=1)
+        ties = numpy.nonzero((scores >= kth_scores[:, None]).sum(axis=1) > size)[0]
+        for word in ties:
+            order = numpy.lexsort((-numpy.arange(num_tags), -scores[word]))
+            cats[word] = order[:size]
+    else:
+        cats = numpy.broadcast_to(numpy.arange(num_tags), (num_words, num_tags))
+
+    cat_scores = scores[rows, cats]
+    order = numpy.lexsort((-cats, -cat_scores), axis=1)
+    cats = cats[rows, order]
+    cat_scores = cat_scores[rows, order]
+
+    if use_beta and size > 0:
+        threshold = cat_scores[:, :1] * numpy.float32(beta)
+        keep = numpy.logical_and.accumulate(numpy.exp(cat_scores) > threshold, axis=1)
+    else:
+        keep = numpy.ones(cat_scores.shape, dtype=bool)
+
+    offsets = numpy.zeros(num_words + 1, dtype=numpy.uint32)
+    numpy.cumsum(keep.sum(axis=1), out=offsets[1:])
+    return (
+        offsets,
+        numpy.ascontiguousarray(cats[keep], dtype=numpy.uint32),
+        numpy.ascontiguousarray(cat_scores[keep], dtype=numpy.float32),
+    )
@@ -92,8 +92,8 @@ ext_modules = [
         'depccg._parsing',
         ['depccg/parsing.pyx'],
         language='c++',
-        extra_compile_args=COMPILE_OPTIONS,
-        extra_link_args=LINK_OPTIONS,
+        extra_compile_args=COMPILE_OPTIONS + ['-pthread'],
+        extra_link_args=LINK_OPTIONS + ['-pthread'],
         include_dirs=[numpy.get_include(), '.', 'depccg'],
     )
 ]
@@ -0,0 +1,91 @@
+from functools import partial
+import pytest
+
+import depccg._parsing
+from depccg.cat import Category
+from depccg.grammar import en
+from depccg.grammar.cache import CombinatorCache, grammar_fingerprint_of
+
+categories = [
+    Category.parse(category)
+    for category in [
+        'NP', 'N', 'NP[nb]/N', '(S[dcl]\\NP)/NP', 'S[dcl]\\NP', ',', 'conj'
+    ]
+]
+
+unary_rules = {
+    Category.parse('N'): [Category.parse('NP')],
+    Category.parse('NP'): [Category.parse('S[X]/(S[X]\\NP)')],
+}
+
+apply_unary_rules = partial(en.apply_unary_rules, unary_rules=unary_rules)
+
+
+def test_build_and_load(tmp_path):
+    cache = CombinatorCache.build(
+        categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        meta={'lang': 'en'},
+    )
+    cache.save(tmp_path / 'cache')
+    loaded = CombinatorCache.load(tmp_path / 'cache')
+
+    assert loaded.meta == {'lang': 'en'}
+    assert len(loaded) == len(cache)
+    for x in categories:
+        for y in categories:
+            assert loaded.get(x, y) == en.apply_binary_rules(x, y)
+        assert loaded.get(x) == apply_unary_rules(x)
+
+    # categories produced by the rules are also looked up in unary rules
+    assert loaded.get(Category.parse('S[dcl]')) == []
+    assert loaded.get(Category.parse('S[q]')) is None
+
+
+def test_fingerprint(tmp_path):
+    apply_binary_rules = partial(en.apply_binary_rules)
+    cache = CombinatorCache.build(categories, apply_binary_rules, apply_unary_rules)
+    cache.save(tmp_path / 'cache')
+    loaded = CombinatorCache.load(tmp_path / 'cache')
+
+    assert loaded.fingerprint is not None
+    loaded.verify(
+        grammar_fingerprint_of(categories[::-1], apply_binary_rules, apply_unary_rules)
+    )
+    depccg._parsing.Parser(
+        categories,
+        apply_binary_rules,
+        apply_unary_rules,
+        [Category.parse('S[dcl]')],
+        combinator_cache=str(tmp_path / 'cache'),
+    )
+
+    other_unary_rules = partial(en.apply_unary_rules, unary_rules={})
+    with pytest.raises(RuntimeError):
+        loaded.verify(
+            grammar_fingerprint_of(categories, apply_binary_rules, other_unary_rules)
+        )
+    with pytest.raises(RuntimeError):
+        depccg._parsing.Parser(
+            categories,
+            apply_binary_rules,
+            other_unary_rules,
+            [Category.parse('S[dcl]')],
+            combinator_cache=str(tmp_path / 'cache'),
+        )
+    with pytest.raises(RuntimeError):
+        loaded.verify(
+            grammar_fingerprint_of(categories[1:], apply_binary_rules, apply_unary_rules)
+        )
+    # the caches of other rules cannot be verified
+    with pytest.raises(RuntimeError):
+        loaded.verify(None)
+    with pytest.raises(RuntimeError):
+        depccg._parsing.Parser(
+            categories,
+            en.apply_binary_rules,
+            apply_unary_rules,
+            [Category.parse('S[dcl]')],
+            combinator_cache=str(tmp_path / 'cache'),
+        )
@@ -0,0 +1,76 @@
+import pytest
+
+from depccg.cat import Category
+from depccg.grammar import en, ja
+
+_parsing = pytest.importorskip('depccg._parsing')
+
+en_rules = [
+    tuple(Category.parse(category) for category in text.strip().split(' '))
+    for text in open('tests/grammar/rules.txt')
+]
+
+ja_rules = [
+    tuple(Category.parse(category) for category in text.strip().split(' '))
+    for text in open('tests/grammar/rules.ja.txt')
+]
+
+
+@pytest.fixture(scope='module')
+def en_grammar():
+    return _parsing.NativeGrammar('en', None, [])
+
+
+@pytest.fixture(scope='module')
+def ja_grammar():
+    return _parsing.NativeGrammar('ja', None, [])
+
+
+@pytest.mark.parametrize("x, y, _", en_rules)
+def test_binary_rule_en(en_grammar, x, y, _):
+    assert en_grammar.apply_binary_rules(x, y) == en.apply_binary_rules(x, y)
+
+
+@pytest.mark.parametrize("_, x, y", ja_rules)
+def test_binary_rule_ja(ja_grammar, _, x, y):
+    assert ja_grammar.apply_binary_rules(x, y) == ja.apply_binary_rules(x, y)
+
+
+def test_seen_rules():
+    x, y = Category.parse('NP[nb]/N'), Category.parse('N')
+    seen_rules = {(Category.parse('NP/N'), Category.parse('N'))}
+    grammar = _parsing.NativeGrammar(
+        'en', [(str(x), str(y)) for x, y in seen_rules], []
+    )
+    assert (
+        grammar.apply_binary_rules(x, y)
+        == en.apply_binary_rules(x, y, seen_rules)
+    )
+    assert grammar.apply_binary_rules(y, x) == []
+
+
+def test_unary_rules():
+    unary_rules = {
+        Category.parse('NP'): [
+            Category.parse('S[X]/(S[X]\\NP)'),
+            Category.parse('(S[X]\\NP)\\((S[X]\\NP)/NP)'),
+        ],
+        Category.parse('N'): [Category.parse('NP')],
+    }
+    grammar = _parsing.NativeGrammar(
+        'en',
+        None,
+        [(str(x), str(y)) for x, ys in unary_rules.items() for y in ys],
+    )
+    for x in [Category.parse('NP'), Category.parse('N'), Category.parse('PP')]:
+        assert (
+            grammar.apply_unary_rules(x)
+            == en.apply_unary_rules(x, unary_rules)
+        )
+
+
+def test_category_ids(en_grammar):
+    cat = Category.parse('(S[dcl]\\NP)/NP')
+    index = en_grammar.add(cat)
+    assert en_grammar.add(cat) == index
+    assert en_grammar[index] == cat
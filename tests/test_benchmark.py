@@ -0,0 +1,47 @@
+from functools import partial
+
+import pytest
+
+from depccg.cat import Category
+from depccg.grammar import en
+from depccg.tools.benchmark import (
+    synthetic_buckets, recorded_buckets, benchmark, compare_reports
+)
+
+_parsing = pytest.importorskip('depccg._parsing')
+
+categories = [
+    Category.parse(category)
+    for category in ['NP', 'N', '(S[dcl]\\NP)/NP', 'S[dcl]\\NP', 'NP[nb]/N']
+]
+
+
+def test_benchmark():
+    parser = _parsing.Parser(
+        categories,
+        en.apply_binary_rules,
+        partial(en.apply_unary_rules, unary_rules={}),
+        [Category.parse('S[dcl]')],
+    )
+    buckets = synthetic_buckets(len(categories), [5, 2], [1.0, 4.0], 3)
+    assert [name for name, _, _ in buckets] == [
+        'length=2,peak=1', 'length=2,peak=4', 'length=5,peak=1', 'length=5,peak=4'
+    ]
+    score_results = [scores for _, _, bucket in buckets for scores in bucket]
+    buckets = recorded_buckets(score_results, bucket_size=3)
+    assert [(name, len(doc)) for name, doc, _ in buckets] == [
+        ('length=1-3', 6), ('length=4-6', 6)
+    ]
+
+    reports = benchmark(parser, buckets, warm_up=True)
+    assert [report['sentences'] for report in reports] == [6, 6]
+    for report in reports:
+        assert report['p99_seconds'] >= report['p50_seconds'] > 0
+        assert report['mean_steps'] > 0
+
+    assert compare_reports(reports, reports) == []
+    slower = [dict(report, sentences_per_second=report['sentences_per_second'] / 2)
+              for report in reports]
+    regressions = compare_reports(slower, reports)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('length=1-3: sentences_per_second')
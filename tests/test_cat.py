@@ -112,3 +112,35 @@ def test_parse_marked_ja_categries():
         parse_with_dependency("(S[mod=nm,form=da,fin=f]{I1}\\NP[case=ga,mod=nm,fin=f]{I2}){I1}_I1(I2,_,_,_)", is_leaf=True) == Category.parse(
             "S[mod=nm,form=da,fin=f]\\NP[case=ga,mod=nm,fin=f]")
     )
+
+
+def test_interning():
+    x = Category.parse("(S[dcl]\\NP)/NP")
+    assert x is Category.parse("(S[dcl]\\NP)/NP")
+    assert x is Functor(Atom("S", UnaryFeature("dcl")) | Atom("NP"), '/', Atom("NP"))
+    assert Atom("NP") is Atom("NP", UnaryFeature()) is Atom(base="NP")
+    assert x.right is x.left.right
+    assert hash(x) == hash(Category.parse("(S[dcl]\\NP)/NP"))
+    assert x.clear_features('dcl') is Category.parse("(S\\NP)/NP")
+    assert x != Category.parse("(S[dcl]\\NP)\\NP")
+
+
+def test_pickle_interned():
+    import copy
+    import pickle
+    x = Category.parse("(NP[case=nc,mod=X1,fin=X2]/NP[case=nc,mod=X1,fin=X2])\\NP")
+    assert pickle.loads(pickle.dumps(x)) is x
+    assert copy.deepcopy(x) is x
+
+
+def test_interning_releases():
+    import gc
+    from depccg.cat import _interned, _parse_cached, PARSE_CACHE_SIZE
+    assert _parse_cached.cache_info().maxsize == PARSE_CACHE_SIZE
+    size = len(_interned)
+    x = Functor(Atom("NP", UnaryFeature("unused")), '/', Atom("N", UnaryFeature("unused")))
+    assert len(_interned) > size
+    assert x is Functor(Atom("NP", UnaryFeature("unused")), '/', Atom("N", UnaryFeature("unused")))
+    del x
+    gc.collect()
+    assert len(_interned) == size
@@ -0,0 +1,497 @@
+from functools import partial
+import io
+import json
+import pickle
+
+import numpy
+import pytest
+
+from depccg.cat import Category
+from depccg.grammar import en
+from depccg.tree import Derivations
+from depccg.types import Token, ScoringResult, ParseStatus
+from depccg.utils import read_partial_tree, SpanInfo
+
+_parsing = pytest.importorskip('depccg._parsing')
+import depccg.parsing  # noqa: E402
+
+categories = [
+    Category.parse(category)
+    for category in ['NP', 'N', '(S[dcl]\\NP)/NP', 'S[dcl]\\NP', 'NP[nb]/N']
+]
+
+root_categories = [Category.parse('S[dcl]')]
+
+apply_unary_rules = partial(
+    en.apply_unary_rules,
+    unary_rules={Category.parse('N'): [Category.parse('NP')]},
+)
+
+
+def make_input(words, tags):
+    tag_scores = numpy.full(
+        (len(words), len(categories)), numpy.log(0.1), dtype=numpy.float32
+    )
+    for index, tag in enumerate(tags):
+        tag_scores[index, categories.index(Category.parse(tag))] = numpy.log(0.6)
+    dep_scores = numpy.full(
+        (len(words), len(words) + 1), numpy.log(0.3), dtype=numpy.float32
+    )
+    return [Token.of_word(word) for word in words], ScoringResult(tag_scores, dep_scores)
+
+
+def make_doc():
+    inputs = [
+        make_input(['John', 'loves', 'Mary'], ['NP', '(S[dcl]\\NP)/NP', 'NP']),
+        make_input(['a', 'dog', 'runs'], ['NP[nb]/N', 'N', 'S[dcl]\\NP']),
+        make_input(['Mary', 'runs'], ['NP', 'S[dcl]\\NP']),
+    ] * 3
+    doc, score_results = zip(*inputs)
+    return list(doc), list(score_results)
+
+
+def tree_string(tree):
+    if tree.is_leaf:
+        return f'({tree.cat} {tree.word})'
+    children = ' '.join(tree_string(child) for child in tree.children)
+    return f'({tree.cat} {tree.op_string} {children})'
+
+
+def tree_strings(results):
+    return [
+        [(tree_string(tree), tree.cat, score) for tree, score in trees]
+        for trees in results
+    ]
+
+
+def test_parser_reuse():
+    doc, score_results = make_doc()
+    parser = _parsing.Parser(
+        categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        root_categories,
+    )
+    first = tree_strings(parser.parse_doc(doc, score_results))
+    cache_size = parser.cache_size
+    assert cache_size > 0
+    assert all(trees[0][1] == Category.parse('S[dcl]') for trees in first)
+
+    stats = parser.cache_stats
+    assert stats['misses'] == cache_size == stats['size'] <= stats['capacity'] // 2
+
+    assert tree_strings(parser.parse_doc(doc, score_results)) == first
+    assert parser.cache_size == cache_size
+    assert parser.cache_stats['misses'] == stats['misses']
+    assert parser.cache_stats['hits'] > stats['hits']
+    assert parser.cache_stats['probes'] >= parser.cache_stats['hits'] + stats['misses']
+
+
+def test_parser_pool():
+    doc, score_results = make_doc()
+    expected = tree_strings(
+        depccg.parsing.run(
+            doc,
+            score_results,
+            categories,
+            root_categories,
+            en.apply_binary_rules,
+            apply_unary_rules,
+        )
+    )
+    with depccg.parsing.ParserPool(
+        categories,
+        root_categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        processes=2,
+    ) as pool:
+        for _ in range(2):
+            results = depccg.parsing.run(
+                doc,
+                score_results,
+                categories,
+                root_categories,
+                en.apply_binary_rules,
+                apply_unary_rules,
+                pool=pool,
+            )
+            assert tree_strings(results) == expected
+        assert tree_strings(pool.submit(doc[:1], score_results[:1]).get()) \
+            == expected[:1]
+
+
+def test_work_units():
+    lengths = [3, 10, 1, 7, 5, 2, 8]
+    units = list(depccg.parsing._work_units(lengths, 1, 2))
+    assert units == [[1, 6], [3, 4], [0, 5], [2]]
+    assert sorted(index for unit in units for index in unit) == list(range(7))
+    assert list(depccg.parsing._work_units(lengths, 2, 16)) == [[1], [6], [3], [4], [0], [5], [2]]
+
+
+def test_parse_packed():
+    doc, score_results = make_doc()
+    parser = _parsing.Parser(
+        categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        root_categories,
+    )
+    expected = tree_strings(parser.parse_doc(doc, score_results))
+    memory, offsets = depccg.parsing._pack_scores(score_results)
+    try:
+        arena = numpy.frombuffer(memory.buf, dtype=numpy.float32)
+        progress = []
+        results, statuses = parser.parse_packed(
+            arena,
+            offsets[:-1],
+            [len(tokens) for tokens in doc],
+            return_status=True,
+            progress=lambda done, total: progress.append((done, total)),
+            progress_interval=0.0,
+        )
+        del arena
+    finally:
+        memory.close()
+        memory.unlink()
+    assert progress == [(index + 1, len(doc)) for index in range(len(doc))]
+    assert statuses == [ParseStatus.SUCCESS] * len(doc)
+    for tokens, derivations in zip(doc, results):
+        assert derivations.tokens is None
+        derivations.tokens = tokens
+    assert tree_strings([derivations.scored_trees() for derivations in results]) == expected
+
+
+def test_parse_unit_error(monkeypatch):
+    doc, score_results = make_doc()
+    parser = _parsing.Parser(
+        categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        root_categories,
+    )
+    monkeypatch.setattr(depccg.parsing, '_worker_parser', parser)
+    memory, offsets = depccg.parsing._pack_scores(score_results)
+    constraints = [[SpanInfo(None, 0, len(doc[0]) + 1)]] + [None] * (len(doc) - 1)
+    try:
+        # the error of the parser is not masked by the one of closing the shared memory
+        with pytest.raises(RuntimeError, match='invalid span'):
+            depccg.parsing._parse_unit_in_worker((
+                list(range(len(doc))),
+                [len(tokens) for tokens in doc],
+                memory.name,
+                [int(offset) for offset in offsets[:-1]],
+                constraints,
+                False,
+            ))
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def test_memory_stats():
+    doc, score_results = make_doc()
+    parser = _parsing.Parser(
+        categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        root_categories,
+    )
+    parser.parse_doc(doc, score_results)
+    stats = parser.memory_stats
+    assert stats['sentences'] == len(doc)
+    assert stats['chart_items'] > 0 and stats['chart_blocks'] > 0
+    assert stats['peak_chart_bytes'] > 0 and stats['peak_agenda_size'] > 0
+    parser.reset_memory_stats()
+    assert parser.memory_stats['chart_items'] == 0
+
+
+@pytest.mark.parametrize('kwargs, expected', [
+    ({}, ParseStatus.SUCCESS),
+    ({'max_step': 1}, ParseStatus.MAX_STEP),
+    ({'max_agenda_size': 1}, ParseStatus.AGENDA_LIMIT),
+    ({'max_length': 2}, ParseStatus.TOO_LONG),
+])
+def test_parse_status(kwargs, expected):
+    doc, score_results = make_doc()
+    results, statuses = depccg.parsing.run(
+        doc[:1],
+        score_results[:1],
+        categories,
+        root_categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        return_status=True,
+        **kwargs,
+    )
+    assert statuses == [expected]
+    assert (results[0][0].score == -float('inf')) == (expected != ParseStatus.SUCCESS)
+
+
+@pytest.mark.parametrize('fallback', ['fragments', 'supertags'])
+def test_fallback(fallback):
+    doc, score_results = make_doc()
+    results, statuses = depccg.parsing.run(
+        doc[:3],
+        score_results[:3],
+        categories,
+        root_categories,
+        en.apply_binary_rules,
+        apply_unary_rules,
+        max_step=2,
+        fallback=fallback,
+        return_status=True,
+    )
+    for tokens, trees, status in zip(doc, results, statuses):
+        assert status == ParseStatus.MAX_STEP
+        tree, score = trees[0]
+        assert score > -float('inf')
+        assert [leaf.word for leaf in tree.leaves] == [token.word for token in tokens]
+
+
+def test_category_filter():
+    doc, score_results = make_doc()
+    category_dict = {
+        'John': [Category.parse('NP')],
+        'loves': [Category.parse('(S[dcl]\\NP)/NP'), Category.parse('S[dcl]\\NP')],
+    }
+    category_filter = depccg.parsing.CategoryFilter(categories, category_dict)
+    expected = [scores.tag_scores.copy() for scores in score_results]
+    for tokens, tag_scores in zip(doc, expected):
+        for index, token in enumerate(tokens):
+            if token.word in category_dict:
+                for cat_id, cat in enumerate(categories):
+                    if cat not in category_dict[token.word]:
+                        tag_scores[index, cat_id] = -1.0
+
+    depccg.parsing.apply_category_filters(
+        doc, score_results, categories, category_filter, large_negative_value=-1.0
+    )
+    for scores, tag_scores in zip(score_results, expected):
+        assert numpy.array_equal(scores.tag_scores, tag_scores)
+
+
+def test_derivations():
+    doc, score_results = make_doc()
+    kwargs = dict(nbest=3, max_chunk_size=4)
+    args = (categories, root_categories, en.apply_binary_rules, apply_unary_rules)
+    expected = tree_strings(depccg.parsing.run(doc, score_results, *args, **kwargs))
+    for max_chunk_size in [4, 20]:
+        results = depccg.parsing.run(
+            doc,
+            score_results,
+            *args,
+            nbest=3,
+            max_chunk_size=max_chunk_size,
+            return_derivations=True,
+        )
+        results = pickle.loads(pickle.dumps(results))
+        for tokens, derivations in zip(doc, results):
+            assert derivations.nodes.dtype == Derivations.NODE_DTYPE
+            root = derivations.nodes[derivations.roots[0]]
+            assert (root['start'], root['length']) == (0, len(tokens))
+            derivations.tokens = tokens
+        assert tree_strings(
+            [derivations.scored_trees() for derivations in results]
+        ) == expected
+
+
+def test_nbest():
+    doc, score_results = make_doc()
+    args = (categories, root_categories, en.apply_binary_rules, apply_unary_rules)
+    best = tree_strings(depccg.parsing.run(doc, score_results, *args))
+    for nbest in [2, 5]:
+        results = tree_strings(
+            depccg.parsing.run(doc, score_results, *args, nbest=nbest)
+        )
+        assert sum(len(trees) for trees in results) > len(doc)
+        for trees, (best_tree,) in zip(results, best):
+            assert len(trees) <= nbest
+            assert trees[0] == best_tree
+            assert len({tree for tree, _, _ in trees}) == len(trees)
+            assert all(
+                score >= next_score
+                for (_, _, score), (_, _, next_score) in zip(trees, trees[1:])
+            )
+
+
+def test_nbest_unary_alternative():
+    # the leaf N of "John" is popped after NP, and makes the second best NP by the unary rule
+    tokens, scores = make_input(['John', 'runs'], ['NP', 'S[dcl]\\NP'])
+    scores.tag_scores[0, categories.index(Category.parse('N'))] = numpy.log(0.3)
+    args = (categories, root_categories, en.apply_binary_rules, apply_unary_rules)
+    [trees] = tree_strings(depccg.parsing.run([tokens], [scores], *args, nbest=3))
+    assert [tree for tree, _, _ in trees[:2]] == [
+        '(S[dcl] ba (NP John) (S[dcl]\\NP runs))',
+        '(S[dcl] ba (NP lex (N John)) (S[dcl]\\NP runs))',
+    ]
+    assert trees[1][2] == pytest.approx(
+        trees[0][2] - numpy.log(0.6) + numpy.log(0.3) - 0.1
+    )
+
+
+@pytest.mark.parametrize('nbest', [1, 3])
+def test_num_threads(nbest):
+    doc, score_results = make_doc()
+    args = (categories, root_categories, en.apply_binary_rules, apply_unary_rules)
+    expected, expected_statuses = depccg.parsing.run(
+        doc, score_results, *args, nbest=nbest, max_length=2, return_status=True
+    )
+    results, statuses = depccg.parsing.run(
+        doc,
+        score_results,
+        *args,
+        nbest=nbest,
+        max_length=2,
+        num_threads=3,
+        processes=1,
+        return_status=True,
+    )
+    assert tree_strings(results) == tree_strings(expected)
+    assert statuses == expected_statuses
+
+
+def test_constraints():
+    args = (categories, root_categories, en.apply_binary_rules, apply_unary_rules)
+    words, tags = ['John', 'loves', 'Mary'], ['NP', '(S[dcl]\\NP)/NP', 'N']
+    tokens, scores = make_input(words, tags)
+    expected = depccg.parsing.run([tokens], [scores], *args)
+    (best_tree, best_score), = expected[0]
+    assert [leaf.cat for leaf in best_tree.leaves][2] == Category.parse('N')
+
+    constraints = [
+        read_partial_tree('John <S[dcl]\\NP loves NP|Mary >')[1],
+        read_partial_tree('<X John loves > Mary')[1],
+        None,
+    ]
+    results, statuses = depccg.parsing.run(
+        [tokens] * 3,
+        [scores] * 3,
+        *args,
+        return_status=True,
+        constraints=constraints,
+    )
+    tree, score = results[0][0]
+    assert [leaf.cat for leaf in tree.leaves][2] == Category.parse('NP')
+    assert tree.children[1].cat == Category.parse('S[dcl]\\NP')
+    assert score < best_score
+    # "John loves" is only a constituent with far less probable supertags
+    tree, score = results[1][0]
+    assert statuses[1] == ParseStatus.SUCCESS
+    assert ' '.join(leaf.word for leaf in tree.children[0].leaves) == 'John loves'
+    assert score < best_score
+    assert tree_strings(results[2:]) == tree_strings(expected)
+
+    for span_infos in [
+        read_partial_tree('<X a b c d >')[1],
+        [SpanInfo(None, -1, 2)],
+        [SpanInfo(Category.parse('NP'), -1)],
+        [SpanInfo(None, 0, -1)],
+    ]:
+        with pytest.raises(RuntimeError, match='invalid span'):
+            depccg.parsing.run([tokens], [scores], *args, constraints=[span_infos])
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'num_threads': 2, 'processes': 1}, {'max_chunk_size': 4}])
+def test_search_stats(kwargs):
+    doc, score_results = make_doc()
+    args = (categories, root_categories, en.apply_binary_rules, apply_unary_rules)
+    expected = tree_strings(depccg.parsing.run(doc, score_results, *args))
+    results, statuses, stats = depccg.parsing.run(
+        doc, score_results, *args, max_length=2, return_status=True, return_stats=True, **kwargs
+    )
+    assert tree_strings(results)[2] == expected[2]
+    assert [sentence_stats.status for sentence_stats in stats] == statuses
+    for tokens, sentence_stats in zip(doc, stats):
+        assert sentence_stats.length == len(tokens)
+        if sentence_stats.max_length_reached:
+            assert sentence_stats.pops == 0 and sentence_stats.chart_items == []
+            continue
+        assert sentence_stats.pushes >= sentence_stats.pops >= len(tokens)
+        assert len(sentence_stats.chart_items) == len(tokens)
+        assert sentence_stats.chart_items[-1] > 0
+        assert sentence_stats.binary_cache_hits + sentence_stats.binary_cache_misses > 0
+
+    file = io.StringIO()
+    depccg.parsing.write_stats(file, stats, doc, start_index=1)
+    lines = [json.loads(line) for line in file.getvalue().splitlines()]
+    assert [line['index'] for line in lines] == list(range(1, len(doc) + 1))
+    assert lines[0]['sentence'] == 'John loves Mary'
+    assert lines[0]['status'] == 'TOO_LONG' and lines[0]['max_length_reached']
+
+    file = io.StringIO()
+    indices = [2 * index for index in range(len(doc))]
+    depccg.parsing.write_stats(file, stats, doc, start_index=1, indices=indices)
+    lines = [json.loads(line) for line in file.getvalue().splitlines()]
+    assert [line['index'] for line in lines] == [index + 1 for index in indices]
+
+
+def test_tight_heuristic():
+    doc, score_results = make_doc()
+    args = (categories, root_categories, en.apply_binary_rules, apply_unary_rules)
+    expected, expected_stats = depccg.parsing.run(
+        doc, score_results, *args, return_stats=True
+    )
+    results, stats = depccg.parsing.run(
+        doc, score_results, *args, heuristic='tight', return_stats=True
+    )
+    assert tree_strings(results) == tree_strings(expected)
+    assert all(
+        sentence_stats.pops <= expected_sentence_stats.pops
+        for sentence_stats, expected_sentence_stats in zip(stats, expected_stats)
+    )
+
+    with pytest.raises(RuntimeError):
+        depccg.parsing.run(doc, score_results, *args, heuristic='unknown')
+
+
+@pytest.mark.parametrize('native_grammar', [False, True])
+def test_combinable_index(native_grammar):
+    doc, score_results = make_doc()
+    seen_rules = {
+        (Category.parse(x).clear_features('X', 'nb'), Category.parse(y).clear_features('X', 'nb'))
+        for x, y in [('NP[nb]/N', 'N'), ('(S[dcl]\\NP)/NP', 'NP'), ('NP', 'S[dcl]\\NP')]
+    }
+    apply_binary_rules = partial(en.apply_binary_rules, seen_rules=seen_rules)
+    kwargs = depccg.parsing._parser_kwargs(
+        categories, apply_binary_rules, apply_unary_rules, native_grammar=native_grammar
+    )
+    parser = _parsing.Parser(
+        categories, apply_binary_rules, apply_unary_rules, root_categories, **kwargs
+    )
+    # the rules are not known to the parser through a function other than the partial one
+    unindexed = _parsing.Parser(
+        categories, lambda x, y: apply_binary_rules(x, y), apply_unary_rules, root_categories
+    )
+    assert parser.combinable_size == len(categories) + len(root_categories)
+    assert unindexed.combinable_size == 0
+
+    results = tree_strings(parser.parse_doc(doc, score_results))
+    assert results == tree_strings(unindexed.parse_doc(doc, score_results))
+    assert all(trees[0][1] == Category.parse('S[dcl]') for trees in results)
+    assert parser.cache_stats['misses'] < unindexed.cache_stats['misses']
+
+
+@pytest.mark.parametrize('native_grammar', [False, True])
+def test_unary_table(native_grammar):
+    doc, score_results = make_doc()
+    type_raising = partial(
+        en.apply_unary_rules,
+        unary_rules={
+            Category.parse('N'): [Category.parse('NP')],
+            Category.parse('NP'): [Category.parse('S[X]/(S[X]\\NP)')],
+        },
+    )
+    apply_binary_rules = partial(en.apply_binary_rules)
+    kwargs = depccg.parsing._parser_kwargs(
+        categories, apply_binary_rules, type_raising, native_grammar=native_grammar
+    )
+    parser = _parsing.Parser(
+        categories, apply_binary_rules, type_raising, root_categories, **kwargs
+    )
+    # including the category made by the rules from NP
+    assert parser.unary_table_size == len(categories) + len(root_categories) + 1
+    results, stats = parser.parse_doc(doc, score_results, return_stats=True)
+    assert all(trees[0].tree.cat == Category.parse('S[dcl]') for trees in results)
+    assert all(sentence_stats.unary_cache_misses == 0 for sentence_stats in stats)
+    assert sum(sentence_stats.unary_cache_hits for sentence_stats in stats) > 0
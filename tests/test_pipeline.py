@@ -0,0 +1,59 @@
+import io
+import random
+import time
+
+import pytest
+from depccg.pipeline import Deduplicator, read_chunks, run_pipeline
+from depccg.types import Token
+
+
+def test_read_chunks():
+    file = io.StringIO('a b\n\n c \nd\ne\n')
+    assert list(read_chunks(file, 2)) == [['a b', 'c'], ['d', 'e']]
+    file = io.StringIO('a\nb\nc')
+    assert list(read_chunks(file, 2)) == [['a', 'b'], ['c']]
+
+
+def test_run_pipeline_keeps_order():
+    def slow_double(x):
+        time.sleep(random.random() * 0.01)
+        return x * 2
+
+    results = run_pipeline(
+        range(50), [slow_double, lambda x: x + 1], queue_size=1
+    )
+    assert list(results) == [x * 2 + 1 for x in range(50)]
+
+
+def test_run_pipeline_raises():
+    def fail(x):
+        if x == 3:
+            raise ValueError('failed')
+        return x
+
+    results = []
+    with pytest.raises(ValueError):
+        for result in run_pipeline(range(10), [fail, lambda x: x]):
+            results.append(result)
+    assert results == [0, 1, 2]
+
+
+def test_deduplicator():
+    def make_doc(sentences):
+        return [[Token.of_word(word) for word in sentence.split()] for sentence in sentences]
+
+    deduplicator = Deduplicator(cache_size=2)
+    doc = make_doc(['a b', 'c', 'a b', 'd', 'c'])
+    plan = deduplicator.split(doc)
+    assert plan.indices == [0, 1, 3]
+    results = deduplicator.merge(plan, ['A B', 'C', 'D'])
+    assert results == ['A B', 'C', 'A B', 'D', 'C']
+
+    # "a b" has been evicted, and "c" is found only without the constraints
+    doc = make_doc(['c', 'a b', 'd', 'c'])
+    plan = deduplicator.split(doc, [[1], None, None, None])
+    assert plan.indices == [0, 1]
+    assert deduplicator.merge(plan, ['C1', 'A B']) == ['C1', 'A B', 'D', 'C']
+    assert deduplicator.stats == {
+        'sentences': 9, 'duplicates': 2, 'cache_hits': 2, 'hit_rate': 4 / 9
+    }
@@ -1,5 +1,5 @@
 from depccg.cat import Category
-from depccg.unification import Unification
+from depccg.unification import Unification, UnificationPattern
 import pytest
 
 
@@ -66,3 +66,30 @@ def test_japanese():
     assert uni["a"] == Category.parse("S[mod=nm,form=base,fin=f]")
     assert uni["b"] == Category.parse("S[mod=nm,form=base,fin=f]")
     assert uni["c"] == Category.parse("S[mod=nm,form=base,fin=f]")
+
+
+def test_pattern():
+    pattern = UnificationPattern("(b/c)|d", "a/b")
+    for x, y in [
+        ("(S[X]/NP[X])\\NP", "S[dcl]/S[dcl]"),
+        ("(S[X]/NP[X])/NP", "S[dcl]/S[dcl]"),
+        ("(NP/NP)\\NP", "S[dcl]/NP"),
+        ("(S[dcl]\\NP)\\NP", "S[dcl]/S[dcl]"),
+        ("NP\\NP", "S[dcl]/NP"),
+        ("(S[X]/NP[X])|NP", "NP"),
+    ]:
+        x, y = Category.parse(x), Category.parse(y)
+        uni = Unification("(b/c)|d", "a/b")
+        result = pattern(x, y)
+        assert pattern.matches(x, y) or result is None
+        assert uni(x, y) == (result is not None)
+        if result is not None:
+            assert result.cats == uni.cats
+            assert result.mapping == uni.mapping
+            assert result["a"] == uni["a"] and result["c"] == uni["c"]
+
+    # the pattern can be used any number of times
+    x = Category.parse("(S[X]/NP[X])\\NP")
+    y = Category.parse("S[dcl]/S[dcl]")
+    assert pattern(x, y)["a"] == "S[dcl]"
+    assert pattern(x, y)["c"] == "NP[dcl]"
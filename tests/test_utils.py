@@ -0,0 +1,46 @@
+import numpy
+import pytest
+
+from depccg.utils import prune_supertags
+
+
+def prune_one_by_one(scores, pruning_size, beta, use_beta):
+    # the selection made in parse_sentence with a priority queue per word
+    cats, cat_scores, lengths = [], [], []
+    for row in scores:
+        ranked = sorted(
+            range(len(row)), key=lambda cat: (row[cat], cat), reverse=True
+        )[:pruning_size]
+        threshold = row[ranked[0]] * numpy.float32(beta) if use_beta else -numpy.inf
+        selected = []
+        for cat in ranked:
+            if not numpy.exp(row[cat]) > threshold:
+                break
+            selected.append(cat)
+        cats.extend(selected)
+        cat_scores.extend(row[selected])
+        lengths.append(len(selected))
+    return numpy.cumsum([0] + lengths), cats, cat_scores
+
+
+@pytest.mark.parametrize('pruning_size', [1, 3, 10, 20])
+@pytest.mark.parametrize('use_beta', [True, False])
+def test_prune_supertags(pruning_size, use_beta):
+    random = numpy.random.RandomState(0)
+    tag_scores = [
+        numpy.log(random.dirichlet(numpy.ones(10), size=length)).astype(numpy.float32)
+        for length in [3, 1, 5]
+    ]
+    # ties with the k-th best score
+    tag_scores[0][0, [2, 5, 7]] = -0.5
+    tag_scores[2][1, :] = -1.0
+
+    offsets, cats, scores = prune_supertags(
+        tag_scores, pruning_size, beta=0.5, use_beta=use_beta
+    )
+    expected_offsets, expected_cats, expected_scores = prune_one_by_one(
+        numpy.concatenate(tag_scores), pruning_size, 0.5, use_beta
+    )
+    assert offsets.tolist() == expected_offsets.tolist()
+    assert cats.tolist() == expected_cats
+    assert scores.tolist() == expected_scores